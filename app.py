@@ -1,18 +1,192 @@
-from flask import Flask, request, jsonify, send_file, make_response
-import pandas as pd
-import openpyxl
-from openpyxl import load_workbook
+from flask import Flask, Request, Response, g, request, jsonify, send_file, make_response
 import os
-import re
 from datetime import datetime
 import tempfile
 import io
 import base64
 from werkzeug.utils import secure_filename
 import json
+import hashlib
+import gzip
+import zlib
+import logging
+import functools
+import zipfile
+import xml.etree.ElementTree as ET
+from sheet_reader import load_sheet_data_streaming
+from session_cache import WorkbookSessionCache
+from lookup_cache import LookupIndexCache
+from processing import (CONFIG_FIELDS, ProcessConfigError, WorkbookOpenError, load_catalog_tables,
+                        load_reference_tables, open_workbook_reader, parse_process_options, process_workbook)
+from text_normalize import clean_text, clean_sku
+from job_queue import JOB_DONE, JOB_FAILED, JobManager, JobQueueFull
+from result_store import XLSX_MIMETYPE, ZIP_MIMETYPE, ResultStore, ResultStoreFull
+from batch import BatchInputError, BatchTargets, run_batch
+from consistency import CONSISTENCY_LISTS, CursorError, check_workbook, decode_cursor, page
+from sheet_metadata import read_sheet_metadata
+from xlsx_patch import XlsxPatchError
+from metrics import MetricsRegistry, StageTimer
+from reference_files import ReferenceFileError, ReferenceFileReader, reference_format
+from reference_catalog import (CatalogConflict, CatalogError, CatalogNotFound, ReferenceCatalog, clean_changes,
+                               read_delta)
+
+class SpooledRequest(Request):
+    """multipart 上传的文件先写入内存缓冲，超过阈值后自动转存到匿名临时文件"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=app.config['UPLOAD_SPOOL_MAX_SIZE'], mode='rb+',
+                                             dir=app.config['SCRATCH_DIR'])
 
 app = Flask(__name__)
+app.request_class = SpooledRequest
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+# multipart 上传在内存中缓冲的最大字节数，超出部分写入临时文件
+app.config['UPLOAD_SPOOL_MAX_SIZE'] = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+# 上传和输出缓冲的转存文件、批量处理临时目录所在的目录，缺省为系统临时目录
+app.config['SCRATCH_DIR'] = os.environ.get('SCRATCH_DIR')
+
+# 会话缓存的内存预算和过期时间
+app.config['SESSION_CACHE_MAX_BYTES'] = int(os.environ.get('SESSION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['SESSION_TTL_SECONDS'] = int(os.environ.get('SESSION_TTL_SECONDS', 30 * 60))
+# 会话文件的共享目录和总容量，同一台机器上的工作进程都能按会话ID载入
+app.config['SESSION_STORE_DIR'] = os.environ.get('SESSION_STORE_DIR')
+app.config['SESSION_STORE_MAX_BYTES'] = int(os.environ.get('SESSION_STORE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# /api/upload 返回的会话ID对应的工作簿缓存：内容保存在共享目录中，解析结果缓存在各工作进程内
+session_cache = WorkbookSessionCache(app.config['SESSION_CACHE_MAX_BYTES'],
+                                     app.config['SESSION_TTL_SECONDS'],
+                                     app.config['SESSION_STORE_DIR'],
+                                     app.config['SESSION_STORE_MAX_BYTES'])
+
+# 参考表查找索引的磁盘缓存，按工作表部件CRC判断是否需要重新解析
+app.config['LOOKUP_CACHE_DIR'] = os.environ.get('LOOKUP_CACHE_DIR')
+app.config['LOOKUP_CACHE_MAX_ENTRIES'] = int(os.environ.get('LOOKUP_CACHE_MAX_ENTRIES', 64))
+lookup_index_cache = LookupIndexCache(app.config['LOOKUP_CACHE_DIR'],
+                                      app.config['LOOKUP_CACHE_MAX_ENTRIES'])
+
+# 一致性检查每页返回的SKU数量（默认值和上限）
+CONSISTENCY_PAGE_SIZE = 100
+CONSISTENCY_MAX_PAGE_SIZE = 1000
+
+# 处理结果存储：总容量、单个文件上限和保留时间
+app.config['RESULT_STORE_DIR'] = os.environ.get('RESULT_STORE_DIR')
+app.config['RESULT_STORE_MAX_BYTES'] = int(os.environ.get('RESULT_STORE_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['RESULT_MAX_FILE_BYTES'] = int(os.environ.get('RESULT_MAX_FILE_BYTES', 100 * 1024 * 1024))
+app.config['RESULT_TTL_SECONDS'] = int(os.environ.get('RESULT_TTL_SECONDS', 60 * 60))
+result_store = ResultStore(app.config['RESULT_STORE_DIR'], app.config['RESULT_STORE_MAX_BYTES'],
+                           app.config['RESULT_MAX_FILE_BYTES'], app.config['RESULT_TTL_SECONDS'])
+
+# 参考表目录的 SQLite 文件，同一台机器上的工作进程和任务进程共享
+app.config['CATALOG_PATH'] = os.environ.get('CATALOG_PATH')
+reference_catalog = ReferenceCatalog(app.config['CATALOG_PATH'])
+
+# 请求指标：按接口和阶段的延迟直方图、字节数和行数，由 /metrics 输出（每个工作进程独立）
+metrics = MetricsRegistry()
+
+# 结构化请求日志：每个请求一行 JSON，REQUEST_LOG=0 时关闭
+app.config['REQUEST_LOG'] = os.environ.get('REQUEST_LOG', '1') != '0'
+request_logger = logging.getLogger('excel_processor.requests')
+if not request_logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter('%(message)s'))
+    request_logger.addHandler(_log_handler)
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+
+# 异步任务：进程池大小、排队上限和任务状态保留时间
+app.config['JOB_DIR'] = os.environ.get('JOB_DIR')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 8))
+app.config['JOB_TTL_SECONDS'] = int(os.environ.get('JOB_TTL_SECONDS', 60 * 60))
+job_manager = JobManager(result_store, app.config['JOB_DIR'], app.config['JOB_WORKERS'],
+                         app.config['JOB_QUEUE_SIZE'], app.config['JOB_TTL_SECONDS'],
+                         app.config['LOOKUP_CACHE_DIR'], app.config['LOOKUP_CACHE_MAX_ENTRIES'],
+                         app.config['CATALOG_PATH'], metrics)
+
+def job_gauges():
+    stats = job_manager.stats()
+    return {
+        'job_workers': ("异步任务工作进程数", stats['workers']),
+        'jobs_running': ("正在处理的异步任务数", stats['running']),
+        'jobs_queued': ("排队中的异步任务数", stats['queued']),
+        'job_saturation': ("忙碌的异步任务工作进程比例", stats['saturation']),
+        'job_queue_saturation': ("异步任务排队位置的占用比例", stats['queue_saturation']),
+    }
+
+metrics.add_gauges(job_gauges)
+
+# JSON 响应的 gzip 压缩：小于 GZIP_MIN_SIZE 字节的响应不压缩
+app.config['GZIP_MIN_SIZE'] = int(os.environ.get('GZIP_MIN_SIZE', 1024))
+app.config['GZIP_LEVEL'] = int(os.environ.get('GZIP_LEVEL', 6))
+
+# 批量处理：进程池大小、目标工作簿个数和解压后总大小上限
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 100))
+app.config['BATCH_MAX_BYTES'] = int(os.environ.get('BATCH_MAX_BYTES', 500 * 1024 * 1024))
+
+# /api/process 的 binary 输出方式：响应体为 xlsx，统计信息放在响应头中（响应头 → 结果字段，None 为完整统计）
+BINARY_MIMETYPE = 'application/octet-stream'
+RESULT_HEADERS = {
+    'X-Processed-Rows': 'processed_rows',
+    'X-Found-Sku': 'found_sku',
+    'X-Found-Cost': 'found_cost',
+    'X-Process-Result': None,
+}
+
+# 请求计时：before_request 开始，after_request 写入 Server-Timing、日志和指标。
+# 该 after_request 最先注册，因此在压缩等其他 after_request 之后运行，记录的是实际发送的字节数
+@app.before_request
+def start_request_timer():
+    g.timer = StageTimer()
+    g.timer.bytes_in = request.content_length
+    metrics.enter()
+    g.metrics_entered = True
+
+@app.teardown_request
+def finish_request_timer(exc):
+    if g.pop('metrics_entered', False):
+        metrics.exit()
+
+def request_stage(name):
+    """在本次请求的计时中记录一个阶段：with request_stage('decode'): ..."""
+    return g.timer.stage(name)
+
+def timed_stage(name):
+    """把整个函数的耗时记为本次请求的一个阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@app.after_request
+def record_request_metrics(response):
+    timer = g.get('timer')
+    if timer is None:
+        return response
+    total = timer.elapsed()
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    # 流式响应的长度在发送完之前未知
+    timer.bytes_out = None if response.is_streamed else response.content_length
+    response.headers['Server-Timing'] = timer.server_timing(total)
+    metrics.observe(endpoint, response.status_code, total, timer)
+    if app.config['REQUEST_LOG']:
+        request_logger.info(json.dumps({
+            "event": "request",
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 3),
+            "stages": timer.to_dict(),
+            "bytes_in": timer.bytes_in,
+            "bytes_out": timer.bytes_out,
+            "rows": timer.rows,
+        }, ensure_ascii=False))
+    return response
 
 # 强制手动CORS处理，确保兼容性
 @app.after_request
@@ -23,6 +197,41 @@ def add_cors_headers(response):
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With, Accept, Origin'
     response.headers['Access-Control-Allow-Credentials'] = 'false'
     response.headers['Access-Control-Max-Age'] = '86400'
+    # 二进制结果的统计信息放在响应头中，浏览器端需要显式暴露才能读取
+    response.headers['Access-Control-Expose-Headers'] = ', '.join(('Content-Disposition', 'Server-Timing',
+                                                                   *RESULT_HEADERS))
+    return response
+
+# 按 Accept-Encoding 用 gzip 压缩的响应类型（文件下载本身已是压缩格式，不再压缩）
+GZIP_MIMETYPES = {'application/json', 'application/x-ndjson'}
+
+def gzip_stream(chunks, level):
+    """流式 gzip 压缩，压缩器缓冲满时才输出，不逐行刷新"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.after_request
+def compress_response(response):
+    """客户端接受 gzip 时压缩 JSON 和 NDJSON 响应"""
+    if (response.mimetype not in GZIP_MIMETYPES or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.status_code < 200
+            or 'gzip' not in request.accept_encodings):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        response.response = gzip_stream(response.iter_encoded(), app.config['GZIP_LEVEL'])
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < app.config['GZIP_MIN_SIZE']:
+            return response
+        with request_stage('gzip'):
+            response.set_data(gzip.compress(body, app.config['GZIP_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
     return response
 
 # 处理所有OPTIONS预检请求
@@ -40,65 +249,159 @@ def handle_preflight():
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 
+class RequestPayloadError(ValueError):
+    """请求中的文件或配置无效"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def request_buffer():
+    """本次请求使用的输出缓冲：先写内存，超过 UPLOAD_SPOOL_MAX_SIZE 后转存到匿名临时文件
+
+    缓冲在请求结束时（包括出错）关闭，转存文件随之删除。
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=app.config['UPLOAD_SPOOL_MAX_SIZE'], mode='w+b',
+                                           dir=app.config['SCRATCH_DIR'])
+    g.setdefault('request_buffers', []).append(buffer)
+    return buffer
+
+def release_request_buffer(buffer):
+    """把缓冲交给响应发送：请求结束时不再关闭，响应发送完毕后由响应关闭"""
+    g.request_buffers.remove(buffer)
+    return buffer
+
+@app.teardown_request
+def close_request_buffers(exc):
+    for buffer in g.pop('request_buffers', []):
+        buffer.close()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def clean_text(text):
-    """清理文本，去除特殊字符"""
-    if not text:
-        return ""
-        
-    text = str(text)
-    
-    # 去除不可见字符和换行符
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', text)
+@timed_stage('decode')
+def read_request_payload():
+    """读取请求中的配置和工作簿，返回 (配置字典, 可seek的二进制文件对象, 会话)
+
+    JSON 请求：文件以 base64 放在 file.content 中。
+    multipart/form-data 请求：文件放在 file 字段，配置以 JSON 字符串放在 config 字段，
+    也可以分别通过 sku_config、cost_config、output_config 字段提供。
+    两种方式都可以用 session_id 代替文件，引用 /api/upload 缓存的工作簿；未使用会话时会话为 None。
+    """
+    if request.mimetype == 'multipart/form-data':
+        data = read_form_config()
+        upload = request.files.get('file')
+        if upload is None:
+            if data.get('session_id'):
+                session = get_session(data['session_id'])
+                return data, session.open(), session
+            raise RequestPayloadError("缺少必需参数: file")
+        return data, upload.stream, None
     
-    # 去除多余空格
-    text = ' '.join(text.split())
+    data = request.get_json(silent=True)
+    if not data:
+        raise RequestPayloadError("请求数据为空")
+    if 'file' not in data and data.get('session_id'):
+        session = get_session(data['session_id'])
+        return data, session.open(), session
+    if 'file' not in data:
+        raise RequestPayloadError("缺少必需参数: file")
     
-    # 去除首尾空格
-    text = text.strip()
+    file_data = data['file']
+    if not file_data or 'content' not in file_data:
+        raise RequestPayloadError("文件数据无效")
     
-    return text
+    # 从base64解码文件内容
+    try:
+        file_content = base64.b64decode(file_data['content'])
+    except Exception as e:
+        raise RequestPayloadError(f"Base64解码失败: {str(e)}")
+    return data, io.BytesIO(file_content), None
+
+def read_form_config():
+    """读取 multipart 请求中的配置：config 字段为完整配置的 JSON，也可以分别提供各项配置"""
+    data = {}
+    try:
+        if request.form.get('config'):
+            data.update(json.loads(request.form['config']))
+        for field in CONFIG_FIELDS:
+            if request.form.get(field):
+                data[field] = json.loads(request.form[field])
+    except ValueError as e:
+        raise RequestPayloadError(f"配置JSON解析失败: {str(e)}")
+    if request.form.get('session_id'):
+        data['session_id'] = request.form['session_id']
+    return data
 
-def clean_sku(sku):
-    """清理SKU，处理特殊字符和格式问题"""
-    if not sku:
-        return ""
+# 独立参考表文件的请求字段：配置名 → 文件字段名
+REFERENCE_FILE_FIELDS = {'sku_config': 'sku_file', 'cost_config': 'cost_file'}
+
+@timed_stage('decode')
+def read_reference_sources(data):
+    """读取请求中独立的SKU表、成本表文件，返回 {配置名: ReferenceFileReader}
+
+    multipart 请求的文件放在 sku_file、cost_file 字段；JSON 请求与 file 相同，以
+    {"filename": ..., "content": base64} 放在 sku_file、cost_file 中。
+    格式按文件扩展名判断，也可以在 sku_config / cost_config 中用 format 指定。
+    """
+    sources = {}
+    for config_name, field in REFERENCE_FILE_FIELDS.items():
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get(field)
+            if upload is None:
+                continue
+            filename, stream = upload.filename, upload.stream
+        else:
+            file_data = data.get(field)
+            if not file_data:
+                continue
+            if not isinstance(file_data, dict) or 'content' not in file_data:
+                raise RequestPayloadError(f"{field} 文件数据无效")
+            try:
+                stream = io.BytesIO(base64.b64decode(file_data['content']))
+            except Exception as e:
+                raise RequestPayloadError(f"{field} Base64解码失败: {str(e)}")
+            filename = file_data.get('filename')
         
-    sku = str(sku)
-    
-    # 去除不可见字符
-    sku = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', sku)
-    
-    # 去除首尾空格
-    sku = sku.strip()
+        config = data.get(config_name)
+        fmt = config.get('format') if isinstance(config, dict) else None
+        try:
+            sources[config_name] = ReferenceFileReader(stream, reference_format(filename, fmt), filename)
+        except ReferenceFileError as e:
+            raise RequestPayloadError(str(e))
+    return sources
+
+def get_session(session_id):
+    """取出缓存的会话，不存在时抛出 404 错误，客户端应重新上传文件"""
+    session = session_cache.get(session_id)
+    if session is None:
+        raise RequestPayloadError("会话不存在或已过期，请重新上传文件", status=404)
+    return session
+
+def session_remember(session):
+    """返回把解析结果缓存到会话中的 remember 函数，未使用会话时返回 None"""
+    if session is None:
+        return None
+    return lambda key, builder: session_cache.remember(session, key, builder)
+
+def validate_workbook_source(source):
+    """检查文件内容是否为Excel格式，返回错误信息或 None"""
+    source.seek(0)
+    header = source.read(8)
+    source.seek(0)
     
-    # 统一空格处理（将多个空格替换为单个空格）
-    sku = re.sub(r'\s+', ' ', sku)
+    # 验证文件内容
+    if len(header) == 0:
+        return "文件内容为空"
     
-    return sku
+    # 检查文件头是否为Excel格式
+    if not (header.startswith(b'PK') or header.startswith(b'\xd0\xcf\x11\xe0')):
+        return "文件格式不正确，请确保上传的是Excel文件"
+    return None
 
 def load_sheet_data(sheet, key_col, value_col):
     """加载工作表数据到字典"""
-    data = {}
-    key_col_num = openpyxl.utils.column_index_from_string(key_col)
-    value_col_num = openpyxl.utils.column_index_from_string(value_col)
-    
-    for row in range(1, sheet.max_row + 1):
-        key_cell = sheet.cell(row=row, column=key_col_num)
-        value_cell = sheet.cell(row=row, column=value_col_num)
-        
-        if key_cell.value and str(key_cell.value).strip():
-            # 清理键值，去除特殊字符
-            clean_key = clean_text(str(key_cell.value))
-            # 如果是SKU数据，也清理值
-            if value_cell.value:
-                clean_value = clean_sku(str(value_cell.value))
-                data[clean_key] = clean_value
-            else:
-                data[clean_key] = value_cell.value
-            
+    data, _ = load_sheet_data_streaming(sheet, key_col, value_col, clean_text, clean_sku)
     return data
 
 @app.route('/')
@@ -111,36 +414,86 @@ def index():
             "POST /api/upload": "上传Excel文件",
             "POST /api/process": "处理Excel数据",
             "POST /api/check-consistency": "检查数据一致性",
-            "GET /api/health": "健康检查"
+            "POST /api/jobs": "提交异步处理任务",
+            "GET /api/jobs/<job_id>": "查询任务状态",
+            "GET /api/jobs/<job_id>/result": "下载任务结果",
+            "GET /api/download/<result_id>": "下载处理结果",
+            "POST /api/batch": "批量处理多个工作簿",
+            "GET/POST /api/catalogs": "列出或导入参考表目录",
+            "GET/DELETE /api/catalogs/<name>": "查询或删除参考表目录",
+            "POST /api/catalogs/<name>/changes": "插入、更新或删除参考表目录中的条目",
+            "GET /api/catalogs/<name>/versions": "查询参考表目录的版本历史",
+            "GET /api/health": "健康检查",
+            "GET /metrics": "Prometheus 格式的请求指标"
         }
     })
 
 @app.route('/api/health')
 def health():
-    """健康检查"""
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    """健康检查，workers 为本进程正在处理的请求数和异步任务队列的占用情况"""
+    jobs = job_manager.stats()
+    return jsonify({
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "workers": {"requests_in_flight": metrics.requests_in_flight, "jobs": jobs},
+        # 工作进程和排队位置都已占满，新任务会返回 503
+        "saturated": jobs['running'] + jobs['queued'] >= jobs['workers'] + jobs['max_queue']
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文本格式的请求指标（本进程）"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@timed_stage('check')
+def collect_consistency(source, sku_config, cost_config, remember=None):
+    """按配置的列流式读取SKU表和成本表，返回一致性检查结果"""
+    try:
+        reader = open_workbook_reader(source, remember, lookup_index_cache)
+    except WorkbookOpenError as e:
+        raise RequestPayloadError(str(e))
+    try:
+        return check_workbook(reader, sku_config, cost_config)
+    except KeyError as e:
+        raise RequestPayloadError(f"未找到工作表: {e.args[0]}")
+    finally:
+        reader.close()
+
+def consistency_summary(analysis):
+    total_skus = len(analysis['sku_titles'])
+    matched_count = len(analysis['matched'])
+    return {
+        "matched_count": matched_count,
+        "unmatched_count": len(analysis['unmatched']),
+        "unused_count": len(analysis['unused']),
+        "total_skus": total_skus,
+        "match_rate": f"{(matched_count / total_skus * 100):.1f}%" if total_skus > 0 else "0%"
+    }
+
+def stream_consistency(summary, analysis):
+    """NDJSON：第一行为统计信息，之后每行一个SKU"""
+    yield json.dumps(dict(summary, type="summary"), ensure_ascii=False) + "\n"
+    sku_titles = analysis['sku_titles']
+    for list_name in CONSISTENCY_LISTS:
+        for sku in analysis[list_name]:
+            record = {"type": list_name, "sku": sku}
+            if sku in sku_titles:
+                record["titles"] = sku_titles[sku]
+            yield json.dumps(record, ensure_ascii=False) + "\n"
 
 @app.route('/api/check-consistency', methods=['POST'])
 def check_consistency():
-    """检查数据一致性"""
+    """检查数据一致性
+
+    结果按上传会话缓存，完整列表用 cursor 分页获取，或以 application/x-ndjson 一次流式返回。
+    """
     try:
-        data = request.get_json()
-        
-        if not data or 'file' not in data:
-            return jsonify({"error": "缺少文件数据"}), 400
-            
-        # 解码文件内容
-        file_content = base64.b64decode(data['file']['content'])
-        
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
+        try:
+            data, source, session = read_request_payload()
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
         
         try:
-            # 加载工作簿
-            workbook = load_workbook(temp_file_path)
-            
             # 获取配置
             sku_config = data.get('sku_config', {})
             cost_config = data.get('cost_config', {})
@@ -148,64 +501,55 @@ def check_consistency():
             if not sku_config or not cost_config:
                 return jsonify({"error": "缺少数据源配置"}), 400
             
-            # 读取SKU数据
-            sku_sheet_name = sku_config.get('sheet', 'Sheet1')
-            if sku_sheet_name not in workbook.sheetnames:
-                return jsonify({"error": f"未找到工作表: {sku_sheet_name}"}), 400
-                
-            sku_sheet = workbook[sku_sheet_name]
-            sku_data = []
-            
-            for row in sku_sheet.iter_rows(min_row=2, values_only=True):
-                if row and len(row) > 0 and row[0]:  # 确保有数据
-                    sku_data.append({
-                        'title': str(row[0]) if len(row) > 0 else '',
-                        'sku': str(row[1]) if len(row) > 1 else ''
-                    })
-            
-            # 读取成本数据
-            cost_sheet_name = cost_config.get('sheet', 'Sheet2')
-            if cost_sheet_name not in workbook.sheetnames:
-                return jsonify({"error": f"未找到工作表: {cost_sheet_name}"}), 400
-                
-            cost_sheet = workbook[cost_sheet_name]
-            cost_data = []
-            
-            for row in cost_sheet.iter_rows(min_row=2, values_only=True):
-                if row and len(row) > 0 and row[0]:  # 确保有数据
-                    cost_data.append({
-                        'sku': str(row[0]) if len(row) > 0 else '',
-                        'cost': row[1] if len(row) > 1 else 0
-                    })
-            
-            # 进行数据匹配分析
-            sku_skus = set(item['sku'] for item in sku_data if item['sku'])
-            cost_skus = set(item['sku'] for item in cost_data if item['sku'])
-            
-            matched_skus = sku_skus.intersection(cost_skus)
-            unmatched_skus = sku_skus - cost_skus
-            unused_cost_skus = cost_skus - sku_skus
+            try:
+                limit = min(max(int(data.get('limit', CONSISTENCY_PAGE_SIZE)), 1), CONSISTENCY_MAX_PAGE_SIZE)
+            except (TypeError, ValueError):
+                return jsonify({"error": "limit 必须是整数"}), 400
             
-            total_skus = len(sku_skus)
-            matched_count = len(matched_skus)
-            match_rate = f"{(matched_count / total_skus * 100):.1f}%" if total_skus > 0 else "0%"
-            
-            return jsonify({
-                "matched_count": matched_count,
-                "unmatched_count": len(unmatched_skus),
-                "unused_count": len(unused_cost_skus),
-                "total_skus": total_skus,
-                "match_rate": match_rate,
-                "matched_skus": list(matched_skus)[:10],  # 只返回前10个
-                "unmatched_skus": list(unmatched_skus)[:20],  # 只返回前20个
-                "unused_cost_skus": list(unused_cost_skus)[:20],  # 只返回前20个
-                "message": "数据一致性检查完成"
-            })
+            # 直接上传的文件也放入会话缓存，后续翻页只需传 session_id
+            if session is None:
+                source.seek(0)
+                session = session_cache.add(source.read())
             
+            # 检查结果保存在会话的共享目录中，翻页请求落到其他工作进程时不再解析工作簿
+            config_key = json.dumps([sku_config, cost_config], sort_keys=True, ensure_ascii=False)
+            try:
+                analysis, cached = session_cache.remember_shared(
+                    session, ('consistency', config_key),
+                    lambda: collect_consistency(session.open(), sku_config, cost_config, session_remember(session)))
+            except RequestPayloadError as e:
+                return jsonify({"error": str(e)}), e.status
         finally:
-            # 清理临时文件
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            source.close()
+        
+        summary = consistency_summary(analysis)
+        fingerprint = hashlib.sha256(f"{session.session_id}:{config_key}".encode('utf-8')).hexdigest()[:16]
+        
+        wants_ndjson = (data.get('format') == 'ndjson' or
+                        request.accept_mimetypes.best == 'application/x-ndjson')
+        if wants_ndjson:
+            response = Response(stream_consistency(summary, analysis), mimetype='application/x-ndjson')
+            response.headers['X-Session-Id'] = session.session_id
+            return response
+        
+        result = dict(summary, session_id=session.session_id, cached=cached,
+                      expires_in=app.config['SESSION_TTL_SECONDS'])
+        if data.get('cursor'):
+            # 翻页：只返回游标对应的列表
+            try:
+                list_name, offset = decode_cursor(data['cursor'], fingerprint)
+            except CursorError as e:
+                return jsonify({"error": str(e)}), 400
+            items, next_cursor = page(analysis, list_name, offset, limit, fingerprint)
+            return jsonify(dict(result, list=list_name, items=items, next_cursor=next_cursor))
+        
+        # 首页：三个列表各返回第一页
+        next_cursors = {}
+        for list_name, field in CONSISTENCY_LISTS.items():
+            result[field], next_cursors[list_name] = page(analysis, list_name, 0, limit, fingerprint)
+        result['next_cursors'] = next_cursors
+        result['message'] = "数据一致性检查完成"
+        return jsonify(result)
                 
     except Exception as e:
         return jsonify({"error": f"数据一致性检查失败: {str(e)}"}), 500
@@ -224,31 +568,23 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({"error": "不支持的文件格式，请上传 .xlsx 或 .xls 文件"}), 400
         
-        # 保存临时文件
+        # 缓存文件内容，后续请求可以只传会话ID
         filename = secure_filename(file.filename)
-        temp_path = os.path.join(tempfile.gettempdir(), filename)
-        file.save(temp_path)
-        
-        # 加载工作簿
-        workbook = load_workbook(temp_path)
-        sheet_names = workbook.sheetnames
-        
-        # 获取每个工作表的基本信息
-        sheets_info = {}
-        for sheet_name in sheet_names:
-            sheet = workbook[sheet_name]
-            sheets_info[sheet_name] = {
-                "max_row": sheet.max_row,
-                "max_column": sheet.max_column,
-                "columns": [openpyxl.utils.get_column_letter(col) for col in range(1, sheet.max_column + 1)]
-            }
+        with request_stage('decode'):
+            session = session_cache.add(file.read(), filename)
         
-        # 清理临时文件
-        os.remove(temp_path)
+        # 只读取 workbook.xml 和各工作表开头的 <dimension> 与表头行，不加载整个工作簿
+        try:
+            with request_stage('metadata'):
+                sheet_names, sheets_info = read_sheet_metadata(session.open())
+        except (zipfile.BadZipFile, KeyError, ET.ParseError, XlsxPatchError) as e:
+            return jsonify({"error": f"无法打开Excel文件: {str(e)}"}), 400
         
         return jsonify({
             "message": "文件上传成功",
             "filename": filename,
+            "session_id": session.session_id,
+            "expires_in": app.config['SESSION_TTL_SECONDS'],
             "sheets": sheet_names,
             "sheets_info": sheets_info
         })
@@ -260,140 +596,477 @@ def upload_file():
 def process_data():
     """处理Excel数据"""
     try:
-        data = request.get_json()
+        try:
+            data, source, session = read_request_payload()
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
         
-        if not data:
-            return jsonify({"error": "请求数据为空"}), 400
+        try:
+            options = parse_process_options(data)
+            sources = read_reference_sources(data)
+        except ProcessConfigError as e:
+            return jsonify({"error": str(e)}), 400
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
         
-        # 验证必需参数
-        required_fields = ['file', 'sku_config', 'cost_config', 'output_config']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"缺少必需参数: {field}"}), 400
+        # inline: 结果文件以 base64 放在响应中；link: 结果保存到服务端，只返回下载链接；
+        # binary: 响应体直接是 xlsx（Accept: application/octet-stream 时默认使用），统计信息在响应头中
+        default_mode = 'binary' if request.accept_mimetypes.best in (BINARY_MIMETYPE, XLSX_MIMETYPE) else 'inline'
+        output_mode = data.get('output_mode', default_mode)
+        if output_mode not in ('inline', 'link', 'binary'):
+            return jsonify({"error": f"不支持的输出方式: {output_mode}"}), 400
         
-        # 处理文件数据
-        file_data = data['file']
-        if not file_data or 'content' not in file_data:
-            return jsonify({"error": "文件数据无效"}), 400
+        error = validate_workbook_source(source)
+        if error:
+            return jsonify({"error": error}), 400
         
-        # 从base64解码文件内容
-        import base64
+        # link 和 binary 模式的结果写入请求缓冲，大文件不在内存中保留完整副本
+        output = request_buffer() if output_mode in ('link', 'binary') else None
         try:
-            file_content = base64.b64decode(file_data['content'])
-        except Exception as e:
-            return jsonify({"error": f"Base64解码失败: {str(e)}"}), 400
+            result, output_content = process_workbook(source, options, session_remember(session),
+                                                      lookup_index_cache, output=output, sources=sources,
+                                                      catalog=reference_catalog, timer=g.timer)
+        except CatalogNotFound as e:
+            return jsonify({"error": str(e)}), 404
+        except (WorkbookOpenError, ReferenceFileError, CatalogError) as e:
+            return jsonify({"error": str(e)}), 400
+        g.timer.rows = result['processed_rows']
+        
+        output_filename = f"processed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        if output_mode == 'binary':
+            return send_binary_result(release_request_buffer(output), output_filename, result)
+        if output_mode == 'link':
+            try:
+                with request_stage('store'):
+                    result_id = result_store.put_stream(output, output_filename)
+            except ResultStoreFull as e:
+                return jsonify({"error": str(e)}), 413
+            output_file = {
+                "filename": output_filename,
+                "size": output.tell(),
+                "result_id": result_id,
+                "download_url": f"/api/download/{result_id}",
+                "expires_in": result_store.ttl_seconds
+            }
+        else:
+            with request_stage('encode'):
+                output_file = {
+                    "filename": output_filename,
+                    "content": base64.b64encode(output_content).decode('utf-8')
+                }
         
-        # 验证文件内容
-        if len(file_content) == 0:
-            return jsonify({"error": "文件内容为空"}), 400
+        with request_stage('serialize'):
+            return jsonify(dict({"message": "数据处理完成"}, **result, output_file=output_file))
         
-        # 检查文件头是否为Excel格式
-        if not (file_content.startswith(b'PK') or file_content.startswith(b'\xd0\xcf\x11\xe0')):
-            return jsonify({"error": "文件格式不正确，请确保上传的是Excel文件"}), 400
+    except Exception as e:
+        return jsonify({"error": f"数据处理失败: {str(e)}"}), 500
+
+@app.route('/api/batch', methods=['POST'])
+def process_batch():
+    """批量处理：一份参考工作簿加多个目标工作簿（或 zip），返回结果压缩包"""
+    try:
+        if request.mimetype != 'multipart/form-data':
+            return jsonify({"error": "批量处理只支持 multipart/form-data 请求"}), 400
         
-        # 创建临时文件
-        temp_path = os.path.join(tempfile.gettempdir(), f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
         try:
-            with open(temp_path, 'wb') as f:
-                f.write(file_content)
-        except Exception as e:
-            return jsonify({"error": f"创建临时文件失败: {str(e)}"}), 500
+            data = read_form_config()
+            options = parse_process_options(data)
+            sources = read_reference_sources(data)
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
+        except ProcessConfigError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # 加载工作簿
-        try:
-            workbook = load_workbook(temp_path)
-        except Exception as e:
-            return jsonify({"error": f"无法打开Excel文件: {str(e)}"}), 400
+        # zip: 直接返回结果压缩包；link: 返回统计信息和下载链接
+        output_mode = data.get('output_mode', 'zip')
+        if output_mode not in ('zip', 'link'):
+            return jsonify({"error": f"不支持的输出方式: {output_mode}"}), 400
         
-        # 获取配置
-        sku_config = data['sku_config']
-        cost_config = data['cost_config']
-        output_config = data['output_config']
-        
-        # 加载SKU数据
-        sku_sheet = workbook[sku_config['sheet']]
-        sku_data = load_sheet_data(sku_sheet, sku_config['title_col'], sku_config['sku_col'])
-        
-        # 加载成本数据
-        cost_sheet = workbook[cost_config['sheet']]
-        cost_data = load_sheet_data(cost_sheet, cost_config['sku_col'], cost_config['cost_col'])
-        
-        # 处理输出工作表
-        output_sheet = workbook[output_config['sheet']]
-        start_row = output_config.get('start_row', 2)
-        end_row = output_config.get('end_row', 5000)
-        
-        # 获取列号
-        title_col_num = openpyxl.utils.column_index_from_string(output_config['title_col'])
-        sku_col_num = openpyxl.utils.column_index_from_string(output_config['sku_col'])
-        cost_col_num = openpyxl.utils.column_index_from_string(output_config['cost_col'])
-        
-        processed = 0
-        found_sku_count = 0
-        found_cost_count = 0
-        
-        # 处理每一行
-        for row in range(start_row, end_row + 1):
-            title_cell = output_sheet.cell(row=row, column=title_col_num)
-            sku_cell = output_sheet.cell(row=row, column=sku_col_num)
-            cost_cell = output_sheet.cell(row=row, column=cost_col_num)
+        # 参考工作簿提供SKU表和成本表，可以用 session_id 引用已上传的工作簿；
+        # 两个参考表都由 sku_file、cost_file 提供时不需要参考工作簿
+        session = None
+        reference = request.files.get('reference')
+        if reference is not None:
+            reference = reference.stream
+        elif data.get('session_id'):
+            try:
+                session = get_session(data['session_id'])
+            except RequestPayloadError as e:
+                return jsonify({"error": str(e)}), e.status
+            reference = session.open()
+        elif not options['catalog'] and len(sources) < len(REFERENCE_FILE_FIELDS):
+            return jsonify({"error": "缺少必需参数: reference"}), 400
+        if reference is not None:
+            error = validate_workbook_source(reference)
+            if error:
+                return jsonify({"error": f"参考工作簿: {error}"}), 400
+        
+        uploads = request.files.getlist('files')
+        archive = request.files.get('archive')
+        with tempfile.TemporaryDirectory(prefix='excel_batch_', dir=app.config['SCRATCH_DIR']) as scratch_dir:
+            targets = BatchTargets(scratch_dir, app.config['BATCH_MAX_FILES'], app.config['BATCH_MAX_BYTES'])
+            try:
+                for upload in uploads:
+                    error = validate_workbook_source(upload.stream)
+                    if error:
+                        return jsonify({"error": f"{upload.filename}: {error}"}), 400
+                    targets.add(upload.filename, upload.stream)
+                if archive is not None:
+                    targets.add_archive(archive.stream)
+            except BatchInputError as e:
+                return jsonify({"error": str(e)}), e.status
+            if not len(targets):
+                return jsonify({"error": "缺少目标工作簿: files 或 archive"}), 400
             
-            if title_cell.value and str(title_cell.value).strip():
-                # 清理标题文本
-                clean_title = clean_text(str(title_cell.value))
-                
-                # 查找SKU
-                if clean_title in sku_data:
-                    sku_cell.value = sku_data[clean_title]
-                    found_sku_count += 1
-                    
-                    # 根据SKU查找成本
-                    sku_value = clean_sku(str(sku_cell.value))
-                    if sku_value in cost_data:
-                        cost_cell.value = cost_data[sku_value]
-                        found_cost_count += 1
+            # 参考表只加载一次，所有目标工作簿共用
+            reader = None
+            try:
+                with request_stage('load_reference'):
+                    if options['catalog']:
+                        tables, load_stats = load_catalog_tables(reference_catalog, options)
                     else:
-                        cost_cell.value = "未找到成本"
-                else:
-                    sku_cell.value = "未找到SKU"
-                    cost_cell.value = "未找到成本"
+                        if reference is not None:
+                            reader = open_workbook_reader(reference, session_remember(session), lookup_index_cache)
+                        tables, load_stats = load_reference_tables(reader, options, sources)
+            except WorkbookOpenError as e:
+                return jsonify({"error": f"参考工作簿: {str(e)}"}), 400
+            except CatalogNotFound as e:
+                return jsonify({"error": str(e)}), 404
+            except (ReferenceFileError, CatalogError) as e:
+                return jsonify({"error": str(e)}), 400
+            finally:
+                if reader is not None:
+                    reader.close()
+                if reference is not None:
+                    reference.close()
             
-            processed += 1
-        
-        # 保存处理后的文件
-        output_filename = f"processed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        output_path = os.path.join(tempfile.gettempdir(), output_filename)
-        workbook.save(output_path)
-        
-        # 读取处理后的文件内容
-        with open(output_path, 'rb') as f:
-            output_content = f.read()
-        
-        # 清理临时文件
-        os.remove(temp_path)
-        os.remove(output_path)
+            with request_stage('batch'):
+                zip_path, summary, files = run_batch(targets, options, tables, app.config['BATCH_WORKERS'])
+            g.timer.rows = summary.get('processed_rows')
+            output_filename = f"processed_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            try:
+                with request_stage('store'):
+                    result_id = result_store.put_file(zip_path, output_filename, ZIP_MIMETYPE)
+            except ResultStoreFull as e:
+                return jsonify({"error": str(e)}), 413
         
+        if output_mode == 'zip':
+            return send_result(result_id)
         return jsonify({
-            "message": "数据处理完成",
-            "processed_rows": processed,
-            "found_sku": found_sku_count,
-            "found_cost": found_cost_count,
+            "message": "批量处理完成",
+            "summary": summary,
+            "files": files,
+            "load_stats": load_stats,
             "output_file": {
                 "filename": output_filename,
-                "content": base64.b64encode(output_content).decode('utf-8')
+                "result_id": result_id,
+                "download_url": f"/api/download/{result_id}",
+                "expires_in": result_store.ttl_seconds
             }
         })
         
     except Exception as e:
-        return jsonify({"error": f"数据处理失败: {str(e)}"}), 500
+        return jsonify({"error": f"批量处理失败: {str(e)}"}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """提交异步处理任务，参数与 /api/process 相同"""
+    try:
+        try:
+            data, source, session = read_request_payload()
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
+        
+        try:
+            options = parse_process_options(data)
+            sources = read_reference_sources(data)
+        except ProcessConfigError as e:
+            return jsonify({"error": str(e)}), 400
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
+        
+        error = validate_workbook_source(source)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        # 目录在任务进程中读取，提交前先确认存在
+        if options['catalog']:
+            try:
+                if reference_catalog.info(options['catalog']) is None:
+                    return jsonify({"error": f"参考表目录不存在: {options['catalog']}"}), 404
+            except CatalogError as e:
+                return jsonify({"error": str(e)}), 400
+        
+        output_filename = f"processed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        try:
+            with request_stage('submit'):
+                job = job_manager.submit(source, options, output_filename, sources)
+        except JobQueueFull:
+            response = jsonify({"error": "任务队列已满，请稍后重试"})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        finally:
+            source.close()
+        
+        return jsonify({
+            "message": "任务已提交",
+            "job_id": job.job_id,
+            "state": job.state,
+            "status_url": f"/api/jobs/{job.job_id}",
+            "result_url": f"/api/jobs/{job.job_id}/result"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({"error": f"提交任务失败: {str(e)}"}), 500
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查询任务状态和进度"""
+    status = job_manager.get(job_id)
+    if status is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    if status['result_id']:
+        status['download_url'] = f"/api/download/{status['result_id']}"
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """下载任务的输出文件"""
+    status = job_manager.get(job_id)
+    if status is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    if status['state'] == JOB_FAILED:
+        return jsonify({"error": f"任务处理失败: {status['error']}", "state": status['state']}), 409
+    if status['state'] != JOB_DONE:
+        return jsonify({"error": "任务尚未完成", "state": status['state'],
+                        "progress": status['progress']}), 409
+    return send_result(status['result_id'])
+
+@app.route('/api/catalogs', methods=['GET'])
+def list_catalogs():
+    """列出参考表目录"""
+    return jsonify({"catalogs": reference_catalog.list()})
+
+@app.route('/api/catalogs', methods=['POST'])
+def import_catalog():
+    """把SKU表和成本表导入参考表目录，同名目录整体替换并使版本加一
+
+    参数与 /api/process 相同（工作簿或 session_id，以及可选的 sku_file、cost_file），另加目录名 name，
+    不需要 output_config。两个参考表都由文件提供时不需要工作簿。
+    """
+    try:
+        try:
+            if request.mimetype == 'multipart/form-data':
+                data = read_form_config()
+                if request.form.get('name'):
+                    data['name'] = request.form['name']
+            else:
+                data = request.get_json(silent=True) or {}
+            for field in ('sku_config', 'cost_config'):
+                if not isinstance(data.get(field), dict):
+                    raise RequestPayloadError(f"缺少必需参数: {field}")
+            name = ReferenceCatalog.validate_name(data.get('name'))
+            sources = read_reference_sources(data)
+            source = session = None
+            if len(sources) < len(REFERENCE_FILE_FIELDS):
+                _, source, session = read_request_payload()
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
+        except CatalogError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if source is not None:
+            error = validate_workbook_source(source)
+            if error:
+                return jsonify({"error": error}), 400
+        
+        # 目录保存清理后的字典，与 python 引擎的查找表相同
+        options = {'sku_config': data['sku_config'], 'cost_config': data['cost_config'], 'engine': 'python'}
+        reader = None
+        try:
+            with request_stage('load_reference'):
+                if source is not None:
+                    reader = open_workbook_reader(source, session_remember(session), lookup_index_cache)
+                (sku_data, cost_data), load_stats = load_reference_tables(reader, options, sources)
+        except (WorkbookOpenError, ReferenceFileError) as e:
+            return jsonify({"error": str(e)}), 400
+        except KeyError as e:
+            return jsonify({"error": f"未找到工作表: {e.args[0]}"}), 400
+        finally:
+            if reader is not None:
+                reader.close()
+        
+        with request_stage('import'):
+            catalog = reference_catalog.import_tables(name, sku_data, cost_data)
+        return jsonify({"message": "参考表已导入", "catalog": catalog, "load_stats": load_stats}), 201
+        
+    except Exception as e:
+        return jsonify({"error": f"导入参考表失败: {str(e)}"}), 500
+
+@app.route('/api/catalogs/<name>', methods=['GET'])
+def get_catalog(name):
+    """查询参考表目录的版本和条目数"""
+    try:
+        catalog = reference_catalog.info(name)
+    except CatalogError as e:
+        return jsonify({"error": str(e)}), 400
+    if catalog is None:
+        return jsonify({"error": f"参考表目录不存在: {name}"}), 404
+    return jsonify(catalog)
+
+@app.route('/api/catalogs/<name>', methods=['DELETE'])
+def delete_catalog(name):
+    """删除参考表目录"""
+    try:
+        deleted = reference_catalog.delete(name)
+    except CatalogError as e:
+        return jsonify({"error": str(e)}), 400
+    if not deleted:
+        return jsonify({"error": f"参考表目录不存在: {name}"}), 404
+    return jsonify({"message": "参考表目录已删除", "name": name})
+
+def read_delta_file(stream, filename, config):
+    """读取上传的变更表，返回 clean_changes 格式的变更
+
+    xlsx 的第一行为表头（delta_config 中 header 为 false 时没有表头），工作表默认为第一个；
+    CSV / Parquet / Arrow 的列可以写表头名或列字母。
+    """
+    if not isinstance(config, dict):
+        raise RequestPayloadError("缺少必需参数: delta_config")
+    if filename and allowed_file(filename):
+        error = validate_workbook_source(stream)
+        if error:
+            raise RequestPayloadError(error)
+        reader = open_workbook_reader(stream)
+        if not config.get('sheet'):
+            config = dict(config, sheet=reader.workbook.sheetnames[0])
+        skip_rows, first_row = (1 if config.get('header', True) else 0), 1
+    else:
+        try:
+            reader = ReferenceFileReader(stream, reference_format(filename, config.get('format')), filename)
+        except ReferenceFileError as e:
+            raise RequestPayloadError(str(e))
+        # 表头已由读取器跳过，第一个值在文件第2行
+        skip_rows, first_row = 0, 2
+    try:
+        return read_delta(reader, config, skip_rows, first_row)
+    finally:
+        reader.close()
+
+@app.route('/api/catalogs/<name>/changes', methods=['POST'])
+def apply_catalog_changes(name):
+    """按键插入、更新或删除参考表目录中的条目，不重新导入整个参考表，版本加一
+
+    JSON 请求可以直接给出 changes：{"sku"|"cost": {"upsert": {键: 值}, "delete": [键, ...]}}，
+    sku 为标题 → SKU，cost 为 SKU → 成本。也可以上传变更表（xlsx、CSV、Parquet 或 Arrow，multipart 的
+    file 字段，或 JSON 中 {"filename", "content"} 形式的 file），由 delta_config 指定 table（sku / cost）、
+    key_col、value_col、可选的 action_col（delete / 删除 表示删除）和 sheet。
+    可选的 base_version 为客户端读取到的版本，目录已被其他请求修改时返回 409。
+    """
+    try:
+        try:
+            stream = filename = None
+            if request.mimetype == 'multipart/form-data':
+                data = {}
+                try:
+                    if request.form.get('config'):
+                        data.update(json.loads(request.form['config']))
+                    if request.form.get('delta_config'):
+                        data['delta_config'] = json.loads(request.form['delta_config'])
+                except ValueError as e:
+                    raise RequestPayloadError(f"配置JSON解析失败: {str(e)}")
+                if request.form.get('base_version'):
+                    data['base_version'] = request.form['base_version']
+                upload = request.files.get('file')
+                if upload is not None:
+                    filename, stream = upload.filename, upload.stream
+            else:
+                data = request.get_json(silent=True)
+                if not data:
+                    raise RequestPayloadError("请求数据为空")
+                file_data = data.get('file')
+                if file_data:
+                    if not isinstance(file_data, dict) or 'content' not in file_data:
+                        raise RequestPayloadError("文件数据无效")
+                    try:
+                        stream = io.BytesIO(base64.b64decode(file_data['content']))
+                    except Exception as e:
+                        raise RequestPayloadError(f"Base64解码失败: {str(e)}")
+                    filename = file_data.get('filename')
+            
+            base_version = data.get('base_version')
+            if base_version is not None:
+                try:
+                    base_version = int(base_version)
+                except (TypeError, ValueError):
+                    raise RequestPayloadError("base_version 必须是整数")
+            
+            if 'changes' in data:
+                changes = clean_changes(data['changes'])
+            elif stream is not None:
+                changes = read_delta_file(stream, filename, data.get('delta_config'))
+            else:
+                raise RequestPayloadError("缺少必需参数: changes 或 file")
+        except RequestPayloadError as e:
+            return jsonify({"error": str(e)}), e.status
+        except (WorkbookOpenError, ReferenceFileError) as e:
+            return jsonify({"error": str(e)}), 400
+        except KeyError as e:
+            return jsonify({"error": f"未找到工作表: {e.args[0]}"}), 400
+        
+        with request_stage('apply'):
+            catalog, counts = reference_catalog.apply_changes(name, changes, base_version)
+        return jsonify({"message": "变更已应用", "catalog": catalog, "changes": counts})
+        
+    except CatalogNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except CatalogConflict as e:
+        return jsonify({"error": str(e)}), 409
+    except CatalogError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"应用变更失败: {str(e)}"}), 500
+
+@app.route('/api/catalogs/<name>/versions', methods=['GET'])
+def catalog_versions(name):
+    """查询参考表目录的版本历史：每次导入和每次变更的时间与条目数"""
+    try:
+        versions = reference_catalog.versions(name)
+    except CatalogNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except CatalogError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"name": name, "versions": versions})
+
+def send_binary_result(output, filename, result):
+    """直接发送输出缓冲中的 xlsx，省去 base64 编码；统计信息放在 X-* 响应头中
+
+    X-Process-Result 为完整统计信息的 JSON（非 ASCII 字符转义），其余响应头为常用的计数。
+    """
+    size = output.tell()
+    output.seek(0)
+    response = send_file(output, mimetype=BINARY_MIMETYPE, as_attachment=True, download_name=filename)
+    response.content_length = size
+    for header, field in RESULT_HEADERS.items():
+        value = result.get(field) if field else dict({"message": "数据处理完成"}, **result)
+        if value is not None:
+            response.headers[header] = json.dumps(value) if field is None else str(value)
+    return response
+
+def send_result(result_id):
+    """从结果存储中流式发送文件，支持 Range 和条件请求（ETag / If-Modified-Since）"""
+    entry = result_store.get(result_id)
+    if entry is None:
+        return jsonify({"error": "文件不存在或已过期"}), 404
+    path, meta = entry
+    return send_file(path, mimetype=meta['mimetype'], as_attachment=True,
+                     download_name=meta['filename'], conditional=True, etag=True, max_age=0)
 
-@app.route('/api/download/<filename>')
-def download_file(filename):
+@app.route('/api/download/<result_id>')
+def download_file(result_id):
     """下载处理后的文件"""
     try:
-        # 这里应该从安全的存储位置获取文件
-        # 为了演示，我们返回一个错误
-        return jsonify({"error": "文件下载功能需要实现安全存储"}), 501
+        return send_result(result_id)
     except Exception as e:
         return jsonify({"error": f"文件下载失败: {str(e)}"}), 500
 
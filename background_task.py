@@ -0,0 +1,91 @@
+"""桌面版的后台任务
+
+耗时操作在工作线程中执行，进度通过队列交给界面线程，由界面线程用 root.after 定时取出并刷新，
+工作线程从不直接操作 Tk 控件。工作函数在循环中调用 task.checkpoint() 响应暂停和取消。
+"""
+import queue
+import threading
+import time
+
+# 工作线程报告进度的最小间隔（秒），界面线程大约以同样的频率刷新
+REPORT_INTERVAL = 0.1
+
+
+class TaskCancelled(Exception):
+    """任务被用户取消"""
+
+
+class BackgroundTask:
+    """在工作线程中运行 work(task)，结果和进度以事件形式放入队列
+
+    事件为 (类型, 数据)：("progress", (百分比, 状态文字))、("done", 返回值)、
+    ("error", 异常) 或 ("cancelled", None)。
+    """
+
+    def __init__(self, work):
+        self.work = work
+        self.events = queue.Queue()
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._last_report = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            result = self.work(self)
+        except TaskCancelled:
+            self.events.put(("cancelled", None))
+        except Exception as e:
+            self.events.put(("error", e))
+        else:
+            self.events.put(("done", result))
+
+    # ---- 工作线程调用 ----
+
+    def checkpoint(self):
+        """暂停时阻塞到继续，已取消时抛出 TaskCancelled"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def report(self, percent, message=None, force=False):
+        """报告进度，距上次报告不足 REPORT_INTERVAL 时丢弃（force=True 时总是发送）"""
+        now = time.monotonic()
+        if force or now - self._last_report >= REPORT_INTERVAL:
+            self._last_report = now
+            self.events.put(("progress", (percent, message)))
+
+    # ---- 界面线程调用 ----
+
+    @property
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    @property
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 暂停中的任务需要先唤醒才能退出
+        self._running.set()
+
+    def poll(self):
+        """取出当前队列中的全部事件"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
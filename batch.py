@@ -0,0 +1,188 @@
+"""批量处理多个订单工作簿
+
+/api/batch 接收一份参考工作簿（SKU表和成本表）和多个目标工作簿（或包含它们的 zip），
+参考表只读取一次，目标工作簿分发到进程池中并行处理，结果和每个文件的统计打包成一个 zip。
+查找表通过进程池的 initializer 传给每个工作进程一次，而不是随每个文件重复序列化。
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from processing import build_fuzzy_matcher, process_target
+
+BATCH_REPORT_NAME = 'batch_report.json'
+TARGET_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# 工作进程内的处理选项、查找表和模糊匹配索引，由进程池的 initializer 设置
+_options = None
+_tables = None
+_fuzzy_matcher = None
+
+
+class BatchInputError(ValueError):
+    """批量处理的输入文件不合法"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(options, tables):
+    global _options, _tables, _fuzzy_matcher
+    _options = options
+    _tables = tables
+    # 索引体积较大，在每个工作进程中各构建一次，不随任务序列化
+    _fuzzy_matcher = build_fuzzy_matcher(tables, options)
+
+
+def _process_file(input_path, output_path, options, tables, fuzzy_matcher):
+    with open(output_path, 'wb') as f:
+        result, _ = process_target(input_path, options, tables, fuzzy_matcher=fuzzy_matcher, output=f)
+    return result
+
+
+def _process_file_in_worker(input_path, output_path):
+    return _process_file(input_path, output_path, _options, _tables, _fuzzy_matcher)
+
+
+def _member_name(info):
+    # 未设置 UTF-8 标志的文件名按 cp437 解码，Windows 中文系统打包的 zip 实际是 GBK
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        try:
+            name = name.encode('cp437').decode('gbk')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return name.replace('\\', '/').rsplit('/', 1)[-1]
+
+
+class BatchTargets:
+    """保存到临时目录中的目标工作簿，按加入顺序处理"""
+
+    def __init__(self, scratch_dir, max_files=100, max_bytes=500 * 1024 * 1024):
+        self.scratch_dir = scratch_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.items = []
+        self.total_bytes = 0
+
+    def _next_path(self, size):
+        if len(self.items) >= self.max_files:
+            raise BatchInputError(f"目标工作簿超过{self.max_files}个", status=413)
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            raise BatchInputError("目标工作簿解压后的总大小超过上限", status=413)
+        return os.path.join(self.scratch_dir, f"target_{len(self.items)}.xlsx")
+
+    def add(self, name, stream):
+        """保存一个上传的工作簿"""
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        path = self._next_path(size)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        self.items.append((name, path))
+
+    def add_archive(self, stream):
+        """解压 zip 中的全部工作簿，忽略目录、其他类型的文件和 Excel 的临时文件"""
+        try:
+            zf = zipfile.ZipFile(stream)
+        except zipfile.BadZipFile:
+            raise BatchInputError("压缩包格式不正确")
+        with zf:
+            for info in zf.infolist():
+                name = _member_name(info)
+                if (info.is_dir() or name.startswith(('~$', '.')) or '__MACOSX/' in info.filename
+                        or not name.lower().endswith(TARGET_EXTENSIONS)):
+                    continue
+                path = self._next_path(info.file_size)
+                with zf.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                self.items.append((name, path))
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _output_name(name, used):
+    # 结果文件名为 processed_<原文件名>，重名时加序号
+    base, ext = os.path.splitext(name)
+    candidate = f"processed_{base}{ext}"
+    index = 1
+    while candidate.lower() in used:
+        index += 1
+        candidate = f"processed_{base}_{index}{ext}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def _file_stats(name, result):
+    return {
+        "file": name,
+        "processed_rows": result['processed_rows'],
+        "found_sku": result['found_sku'],
+        "found_cost": result['found_cost'],
+        "sheets": result['sheets'],
+        "fuzzy": result.get('fuzzy'),
+    }
+
+
+def run_batch(targets, options, tables, max_workers=2):
+    """处理全部目标工作簿，返回 (结果 zip 路径, 汇总, 每个文件的统计)
+
+    单个文件处理失败不影响其他文件，失败的文件在统计中带 error 字段，不写入结果 zip。
+    """
+    jobs = [(name, path, f"{path}.out") for name, path in targets.items]
+    outcomes = []
+    workers = min(max_workers, len(jobs))
+    if workers <= 1:
+        fuzzy_matcher = build_fuzzy_matcher(tables, options)
+        for name, input_path, output_path in jobs:
+            try:
+                outcomes.append((name, output_path, _process_file(input_path, output_path, options, tables,
+                                                                  fuzzy_matcher)))
+            except Exception as e:
+                outcomes.append((name, output_path, e))
+    else:
+        # 使用 spawn 避免在多线程的 Web 进程中 fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(options, tables)) as executor:
+            futures = [(name, output_path, executor.submit(_process_file_in_worker, input_path, output_path))
+                       for name, input_path, output_path in jobs]
+            for name, output_path, future in futures:
+                try:
+                    outcomes.append((name, output_path, future.result()))
+                except Exception as e:
+                    outcomes.append((name, output_path, e))
+
+    files = []
+    used = set()
+    zip_path = os.path.join(targets.scratch_dir, 'results.zip')
+    # xlsx 本身已压缩，结果文件直接存储不再压缩
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        for name, output_path, outcome in outcomes:
+            if isinstance(outcome, Exception):
+                files.append({"file": name, "error": str(outcome)})
+                continue
+            stats = _file_stats(name, outcome)
+            stats['output_file'] = _output_name(name, used)
+            zf.write(output_path, stats['output_file'])
+            files.append(stats)
+
+        succeeded = [stats for stats in files if 'error' not in stats]
+        summary = {
+            "files": len(files),
+            "succeeded": len(succeeded),
+            "failed": len(files) - len(succeeded),
+            "processed_rows": sum(stats['processed_rows'] for stats in succeeded),
+            "found_sku": sum(stats['found_sku'] for stats in succeeded),
+            "found_cost": sum(stats['found_cost'] for stats in succeeded),
+        }
+        report = json.dumps({"summary": summary, "files": files}, ensure_ascii=False, indent=2)
+        zf.writestr(BATCH_REPORT_NAME, report, zipfile.ZIP_DEFLATED)
+    return zip_path, summary, files
@@ -0,0 +1,82 @@
+"""对比 python / pandas 两种查找引擎的耗时
+
+用法: python benchmarks/bench_engines.py [行数 ...]   默认 10000 100000 1000000
+
+按给定行数生成内存中的SKU表、成本表和输出列（不经过 Excel 读写），
+分别计时 python 引擎（构建字典 + lookup_rows）和 pandas 引擎（lookup_rows_pandas），
+并校验两者结果一致。
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookup_engine import lookup_rows, lookup_rows_pandas
+from text_normalize import clean_text, clean_sku
+
+
+def build_table(keys, values):
+    """与 load_sheet_data_streaming 相同的建表规则"""
+    data = {}
+    for key, value in zip(keys, values):
+        if key and str(key).strip():
+            key = clean_text(str(key))
+            if value:
+                data[key] = clean_sku(str(value))
+            else:
+                data[key] = value
+    return data
+
+
+def generate(rows, seed=0):
+    """生成 rows 行订单；SKU表约为其1/4，约10%的标题和SKU查不到"""
+    rng = random.Random(seed)
+    products = max(rows // 4, 1)
+    sku_keys = [f"Product  {i} size\t{rng.choice('SMLX')}" for i in range(products)]
+    sku_values = [f" SKU-{i:07d} " for i in range(products)]
+    cost_keys = [f"SKU-{i:07d}" for i in range(int(products * 0.9))]
+    cost_values = [round(rng.uniform(1, 100), 2) for _ in cost_keys]
+
+    titles = [None]  # 第1行为表头
+    for _ in range(rows):
+        index = rng.randrange(int(products * 1.1))
+        if index < products:
+            titles.append(sku_keys[index].replace('  ', ' '))
+        else:
+            titles.append(f"Unknown {index}")
+    return titles, sku_keys, sku_values, cost_keys, cost_values
+
+
+def bench(rows):
+    titles, sku_keys, sku_values, cost_keys, cost_values = generate(rows)
+    start_row, end_row = 2, rows + 1
+
+    start = time.perf_counter()
+    sku_data = build_table(sku_keys, sku_values)
+    cost_data = build_table(cost_keys, cost_values)
+    expected, expected_stats = lookup_rows(titles, start_row, end_row, sku_data, cost_data, 2, 4)
+    python_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updates, stats = lookup_rows_pandas(titles, start_row, end_row, sku_keys, sku_values,
+                                        cost_keys, cost_values, 2, 4)
+    pandas_seconds = time.perf_counter() - start
+
+    if updates != expected or stats != expected_stats:
+        raise AssertionError(f"{rows} 行时两种引擎结果不一致")
+    return python_seconds, pandas_seconds
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [10000, 100000, 1000000]
+    print(f"{'行数':>10} {'python(秒)':>12} {'pandas(秒)':>12} {'加速比':>8}")
+    for rows in sizes:
+        python_seconds, pandas_seconds = bench(rows)
+        print(f"{rows:>10} {python_seconds:>12.3f} {pandas_seconds:>12.3f} "
+              f"{python_seconds / pandas_seconds:>8.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
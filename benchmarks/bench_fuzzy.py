@@ -0,0 +1,75 @@
+"""模糊匹配基准：三元组倒排索引 vs 逐个标题计算相似度
+
+用法: python benchmarks/bench_fuzzy.py [SKU表标题数] [查询数]   默认 200000 200
+
+生成随机单词组成的商品标题作为SKU表，查询为改动了少量字符的标题，
+先校验索引查询与暴力计算的结果一致，再比较单次查询耗时。
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_match import TrigramIndex, title_grams
+
+
+def generate(count, seed=0):
+    rng = random.Random(seed)
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+             for _ in range(30000)]
+    words += ["women", "dress", "new", "summer", "kit", "pcs"] * 200
+    titles = {' '.join(rng.choice(words) for _ in range(rng.randint(4, 10))) for _ in range(count)}
+    return sorted(titles), rng
+
+
+def mutate(title, rng):
+    position = rng.randrange(len(title))
+    return title[:position] + rng.choice(string.ascii_lowercase) + title[position + 1:]
+
+
+def brute_force(titles, values, query, threshold, limit):
+    grams = title_grams(query)
+    scored = []
+    for title_id, title in enumerate(titles):
+        other = title_grams(title)
+        score = 2 * len(grams & other) / (len(grams) + len(other))
+        if score >= threshold:
+            scored.append((score, title_id))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(titles[title_id], values[title_id], round(score, 4)) for score, title_id in scored[:limit]]
+
+
+def main(argv):
+    count = int(argv[0]) if len(argv) > 0 else 200000
+    queries = int(argv[1]) if len(argv) > 1 else 200
+    titles, rng = generate(count)
+    values = [f"SKU{i}" for i in range(len(titles))]
+    queries = [mutate(rng.choice(titles), rng) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = TrigramIndex(titles, values)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [index.search(query, 0.6, 3) for query in queries]
+    index_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    # 暴力计算很慢，只对前10个查询校验并计时
+    sample = queries[:10]
+    start = time.perf_counter()
+    expected = [brute_force(titles, values, query, 0.6, 3) for query in sample]
+    brute_ms = (time.perf_counter() - start) / len(sample) * 1000
+    if expected != results[:len(sample)]:
+        raise AssertionError("索引查询结果与暴力计算不一致")
+
+    print(f"{len(titles)} 个标题，索引构建 {build_seconds:.2f} 秒")
+    print(f"{'方式':<10} {'每次查询(毫秒)':>16}")
+    print(f"{'倒排索引':<10} {index_ms:>16.2f}")
+    print(f"{'暴力计算':<10} {brute_ms:>16.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,106 @@
+"""文本清理微基准：原 re.sub 实现 vs 预编译实现 vs 带 memo 的批量清理
+
+用法: python benchmarks/bench_normalize.py [值个数] [不同标题个数]   默认 200000 5000
+
+生成含制表符、换行、不可见字符和多余空格的商品标题，模拟订单表中标题大量重复的情况，
+先校验三种实现结果一致，再分别计时。
+
+第二部分对比 pandas 引擎清理去重后的值的两种方式：pandas .str 链式正则替换（object 列的 .str
+仍是逐个元素调用 Python 的字符串方法，每一步都生成一个中间 Series）与 normalize_many（lookup_engine 当前的实现）。
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from lookup_engine import normalize_sku_series, normalize_text_series
+from text_normalize import clean_text, clean_sku, normalize_many
+
+# 原 pandas 引擎中 .str 实现使用的模式
+CONTROL_CHARS = r'[\x00-\x1f\x7f-\x9f]'
+CONTROL_OR_SPACE_RUN = r'[\x00-\x1f\x7f-\x9f\s]+'
+
+
+def legacy_clean_text(text):
+    """原实现，作为对照"""
+    if not text:
+        return ""
+    text = str(text)
+    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', text)
+    text = ' '.join(text.split())
+    text = text.strip()
+    return text
+
+
+def legacy_clean_sku(sku):
+    """原实现，作为对照"""
+    if not sku:
+        return ""
+    sku = str(sku)
+    sku = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', sku)
+    sku = sku.strip()
+    sku = re.sub(r'\s+', ' ', sku)
+    return sku
+
+
+def str_clean_text(series):
+    return series.str.replace(CONTROL_OR_SPACE_RUN, ' ', regex=True).str.strip()
+
+
+def str_clean_sku(series):
+    return series.str.replace(CONTROL_CHARS, '', regex=True).str.strip().str.replace(r'\s+', ' ', regex=True)
+
+
+def generate(count, distinct, seed=0):
+    rng = random.Random(seed)
+    noise = [' ', '  ', '\t', '\n', '\x00', '\x85', '　', '']
+    titles = []
+    for i in range(distinct):
+        words = [f"Fashion{i}", "女士", "连衣裙", rng.choice("SMLX"), f"颜色{i % 17}"]
+        titles.append(''.join(word + rng.choice(noise) for word in words))
+    return [rng.choice(titles) for _ in range(count)]
+
+
+def timed(func, values):
+    start = time.perf_counter()
+    result = func(values)
+    return time.perf_counter() - start, result
+
+
+def main(argv):
+    count = int(argv[0]) if len(argv) > 0 else 200000
+    distinct = int(argv[1]) if len(argv) > 1 else 5000
+    values = generate(count, distinct)
+
+    print(f"{count} 个值，{distinct} 个不同标题")
+    print(f"{'函数':<12} {'原实现(秒)':>12} {'预编译(秒)':>14} {'memo批量(秒)':>14} {'加速比':>8}")
+    for name, legacy, current in (('clean_text', legacy_clean_text, clean_text),
+                                  ('clean_sku', legacy_clean_sku, clean_sku)):
+        legacy_seconds, expected = timed(lambda vs: [legacy(v) for v in vs], values)
+        current_seconds, result = timed(lambda vs: [current(v) for v in vs], values)
+        memo_seconds, memo_result = timed(lambda vs: normalize_many(vs, current, memo={}), values)
+        if not (expected == result == memo_result):
+            raise AssertionError(f"{name} 结果与原实现不一致")
+        print(f"{name:<12} {legacy_seconds:>12.3f} {current_seconds:>14.3f} {memo_seconds:>14.3f} "
+              f"{legacy_seconds / memo_seconds:>8.1f}")
+
+    # pandas 引擎只清理去重后的值，没有重复可以复用
+    uniques = pd.Series(list(dict.fromkeys(generate(count, count))), dtype=object)
+    print(f"\npandas 引擎：{len(uniques)} 个不同的值")
+    print(f"{'函数':<12} {'.str(秒)':>12} {'normalize_many(秒)':>20} {'加速比':>8}")
+    for name, vectorized, engine in (('clean_text', str_clean_text, normalize_text_series),
+                                     ('clean_sku', str_clean_sku, normalize_sku_series)):
+        str_seconds, expected = timed(vectorized, uniques)
+        engine_seconds, result = timed(engine, uniques)
+        if not expected.equals(result):
+            raise AssertionError(f"{name} 的 .str 实现与 normalize_many 结果不一致")
+        print(f"{name:<12} {str_seconds:>12.3f} {engine_seconds:>20.3f} {str_seconds / engine_seconds:>8.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
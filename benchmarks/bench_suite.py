@@ -0,0 +1,213 @@
+"""端到端基准：在合成工作簿上按阶段计时，结果写成 JSON 便于比较
+
+用法: python benchmarks/bench_suite.py [--sizes 1000 10000 100000] [--repeat 3] [--output 结果.json]
+      [--baseline 上次结果.json] [--tolerance 0.25] [生成参数，见 workbook_generator.py]
+
+每个订单行数生成一个合成工作簿（workbook_generator），依次计时：
+- load_sheet_data：只读流式读取 Sheet1、Sheet2 并构建查找表（不使用磁盘缓存）
+- clean_text / clean_sku：清理订单表的全部标题和SKU表的全部SKU（不使用 memo）
+- lookup：process_data 的逐行查找循环（python 引擎 lookup_rows）
+- lookup_pandas：pandas 引擎 lookup_rows_pandas，并校验与 python 引擎结果一致
+- consistency：数据一致性检查（读取两个参考表并比较）
+- process_end_to_end：process_workbook 读取、查找并保存结果文件
+
+每个阶段重复 --repeat 次，记录最短耗时和每秒行数。指定 --baseline 时与之前的结果比较，
+有阶段比基线慢超过 --tolerance（默认 25%）时退出码为 1；基线耗时不到 MIN_COMPARE_SECONDS 的阶段
+计时误差太大，只显示不判断。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from consistency import check_workbook
+from lookup_engine import lookup_rows, lookup_rows_pandas, resolve_row_range
+from processing import parse_process_options, process_workbook
+from sheet_reader import WorkbookReader
+from text_normalize import CLEAN_VERSION, clean_sku, clean_text
+from workbook_generator import PROCESS_CONFIG, add_generator_arguments, generate_workbook, generator_options
+
+# 与基线比较时，基线耗时低于该值的阶段不判断是否退化
+MIN_COMPARE_SECONDS = 0.01
+
+
+def timed(function, repeat):
+    """运行 repeat 次，返回 (最短耗时, 每次耗时列表, 最后一次的返回值)"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - start)
+    return min(runs), runs, result
+
+
+def record(results, orders, stage, rows, runs):
+    seconds = min(runs)
+    results.append({
+        "orders": orders,
+        "stage": stage,
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "runs": [round(run, 6) for run in runs],
+        "rows_per_sec": int(rows / seconds) if seconds > 0 else rows,
+    })
+    print(f"{orders:>10} {stage:<20} {rows:>10} {seconds:>10.4f} {results[-1]['rows_per_sec']:>12}")
+
+
+def bench_size(path, orders, repeat, results):
+    sku_config = PROCESS_CONFIG['sku_config']
+    cost_config = PROCESS_CONFIG['cost_config']
+    output_config = PROCESS_CONFIG['output_config']
+
+    def load_tables():
+        reader = WorkbookReader(path)
+        try:
+            sku = reader.lookup_table(sku_config['sheet'], sku_config['title_col'], sku_config['sku_col'],
+                                      clean_text, clean_sku)
+            cost = reader.lookup_table(cost_config['sheet'], cost_config['sku_col'], cost_config['cost_col'],
+                                       clean_text, clean_sku)
+        finally:
+            reader.close()
+        return sku, cost
+
+    _, runs, ((sku_data, sku_stats), (cost_data, cost_stats)) = timed(load_tables, repeat)
+    record(results, orders, 'load_sheet_data', sku_stats['rows'] + cost_stats['rows'], runs)
+
+    # 原始列数据只读取一次，后面的阶段不再包含读取工作簿的时间
+    reader = WorkbookReader(path)
+    try:
+        titles = reader.column_values(output_config['sheet'], output_config['title_col'])
+        sku_keys, sku_values = reader.columns(sku_config['sheet'], (sku_config['title_col'], sku_config['sku_col']))
+        cost_keys, cost_values = reader.columns(cost_config['sheet'], (cost_config['sku_col'], cost_config['cost_col']))
+    finally:
+        reader.close()
+
+    title_strings = [str(title) for title in titles if title]
+    sku_strings = [str(sku) for sku in sku_values if sku]
+    _, runs, _ = timed(lambda: [clean_text(title) for title in title_strings], repeat)
+    record(results, orders, 'clean_text', len(title_strings), runs)
+    _, runs, _ = timed(lambda: [clean_sku(sku) for sku in sku_strings], repeat)
+    record(results, orders, 'clean_sku', len(sku_strings), runs)
+
+    scanned = resolve_row_range(titles, output_config['start_row'], output_config['end_row'])
+    start_row, end_row = scanned['start_row'], scanned['end_row']
+    sku_col, cost_col = 2, 4
+    _, runs, (expected, expected_stats) = timed(
+        lambda: lookup_rows(titles, start_row, end_row, sku_data, cost_data, sku_col, cost_col), repeat)
+    record(results, orders, 'lookup', expected_stats['processed_rows'], runs)
+
+    _, runs, (updates, stats) = timed(
+        lambda: lookup_rows_pandas(titles, start_row, end_row, sku_keys, sku_values, cost_keys, cost_values,
+                                   sku_col, cost_col), repeat)
+    if updates != expected or stats != expected_stats:
+        raise AssertionError(f"{orders} 行时两种引擎结果不一致")
+    record(results, orders, 'lookup_pandas', stats['processed_rows'], runs)
+
+    def consistency():
+        reader = WorkbookReader(path)
+        try:
+            return check_workbook(reader, sku_config, cost_config)
+        finally:
+            reader.close()
+
+    _, runs, _ = timed(consistency, repeat)
+    record(results, orders, 'consistency', len(sku_keys) + len(cost_keys), runs)
+
+    options = parse_process_options(PROCESS_CONFIG)
+
+    def process():
+        with tempfile.TemporaryFile() as output:
+            result, _ = process_workbook(path, options, output=output)
+        return result
+
+    _, runs, result = timed(process, repeat)
+    if (result['found_sku'], result['found_cost']) != (expected_stats['found_sku'], expected_stats['found_cost']):
+        raise AssertionError(f"{orders} 行时 process_workbook 与 lookup_rows 结果不一致")
+    record(results, orders, 'process_end_to_end', result['processed_rows'], runs)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线结果逐阶段比较，返回变慢超过 tolerance 的 (订单行数, 阶段, 基线耗时, 本次耗时) 列表"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(item['orders'], item['stage']): item['seconds'] for item in json.load(f)['results']}
+    regressions = []
+    print(f"\n与基线 {baseline_path} 比较（变慢超过 {tolerance:.0%} 视为退化）")
+    for item in results:
+        key = (item['orders'], item['stage'])
+        if key not in baseline:
+            continue
+        ratio = item['seconds'] / baseline[key] if baseline[key] > 0 else 1.0
+        flag = ''
+        if ratio > 1 + tolerance and baseline[key] >= MIN_COMPARE_SECONDS:
+            regressions.append((*key, baseline[key], item['seconds']))
+            flag = '  退化'
+        print(f"{key[0]:>10} {key[1]:<20} {baseline[key]:>10.4f} -> {item['seconds']:>10.4f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="按阶段计时的端到端基准")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="订单行数")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help="结果 JSON 路径，默认 bench_results_<时间>.json")
+    parser.add_argument('--baseline', default=None, help="用于比较的上次结果 JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--workdir', default=None, help="合成工作簿所在目录，默认临时目录（运行后删除）")
+    add_generator_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = []
+    workbooks = []
+    print(f"{'订单行数':>10} {'阶段':<20} {'行数':>10} {'耗时(秒)':>10} {'每秒行数':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        for orders in args.sizes:
+            path = os.path.join(workdir, f"synthetic_{orders}.xlsx")
+            info = generate_workbook(path, orders, **generator_options(args))
+            info['bytes'] = os.path.getsize(path)
+            workbooks.append(info)
+            bench_size(path, orders, args.repeat, results)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "clean_version": CLEAN_VERSION,
+        "repeat": args.repeat,
+        "workbooks": workbooks,
+        "results": results,
+    }
+    output = args.output or f"bench_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} 个阶段退化")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
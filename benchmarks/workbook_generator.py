@@ -0,0 +1,151 @@
+"""生成与示例工作簿结构相同的合成工作簿
+
+用法: python benchmarks/workbook_generator.py 输出.xlsx [--orders 100000] [--products N]
+      [--duplicate-ratio 0.1] [--miss-rate 0.1] [--cost-miss-rate 0.05] [--dirty-ratio 0.2] [--seed 0]
+
+工作表与 Tk-Fashion 示例.xlsx 相同：
+- Sheet1：A 产品ID、B 产品标题、C SKU、D 变种ID（标题 → SKU）
+- Sheet2：A SKU、B 平均成本、C 标题（SKU → 成本）
+- Order details：A Product name、B SKU、C Quantity、D 成本、E 总成本（公式），B、D 列留空待填充
+
+duplicate_ratio 为 Sheet1 中重复前面标题的行比例（同一标题的多个变种，后出现的SKU生效）；
+miss_rate 为订单标题不在 Sheet1 中的比例，cost_miss_rate 为 Sheet1 的SKU不在 Sheet2 中的比例；
+dirty_ratio 为标题和SKU中混入多余空格、制表符、换行和 C1 控制字符的比例，清理后与干净的值相同。
+同样的参数和 seed 生成的内容完全相同。
+"""
+import argparse
+import os
+import random
+import string
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+# 处理合成工作簿使用的配置，与示例工作簿的列位置相同
+PROCESS_CONFIG = {
+    "sku_config": {"sheet": "Sheet1", "title_col": "B", "sku_col": "C"},
+    "cost_config": {"sheet": "Sheet2", "sku_col": "A", "cost_col": "B"},
+    "output_config": {"sheet": "Order details", "title_col": "A", "sku_col": "B", "cost_col": "D",
+                      "start_row": 2, "end_row": "auto"},
+}
+
+# 混入的噪声，都是 xlsx 允许的字符（C0 控制字符中只有制表符、换行、回车可以写入）
+NOISE = [' ', '  ', '\t', '\n', '\r\n', '\x7f', '\x85', '\x9f']
+
+WORDS = ("Kit Conjunto Garrafa Dobrável Novo Profissional Infantil Maquiagem Princesa Farol Moto Led "
+         "Auxiliar Lampada Placas Tábuas Corte Titânio Cozinha Portátil Vestido Feminino Verão Bolsa "
+         "Couro Relógio Digital Fone Bluetooth Capa Celular Tapete Banheiro Luminária Mesa").split()
+
+
+def dirty(text, rng):
+    """在词之间和首尾插入噪声，clean_text / clean_sku 清理后与原文相同"""
+    parts = text.split(' ')
+    noisy = [rng.choice(NOISE) + parts[0]]
+    for part in parts[1:]:
+        noisy.append(' ' + rng.choice(NOISE) + part)
+    return ''.join(noisy) + rng.choice(NOISE)
+
+
+def make_titles(count, rng):
+    titles = set()
+    while len(titles) < count:
+        words = rng.sample(WORDS, rng.randint(4, 8))
+        words.append(''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(5)))
+        titles.add(' '.join(words))
+    return sorted(titles)
+
+
+def generate_workbook(path, orders=100000, products=None, duplicate_ratio=0.1, miss_rate=0.1,
+                      cost_miss_rate=0.05, dirty_ratio=0.2, seed=0):
+    """写出合成工作簿，返回生成参数和各工作表的行数"""
+    rng = random.Random(seed)
+    products = products or max(orders // 4, 1)
+    titles = make_titles(products, rng)
+    skus = [f"A{i:06d}" if rng.random() < 0.7 else f"A{i:06d}-{rng.choice('SMLX')}" for i in range(products)]
+
+    def maybe_dirty(text):
+        return dirty(text, rng) if rng.random() < dirty_ratio else text
+
+    workbook = openpyxl.Workbook(write_only=True)
+
+    # Sheet1：标题 → SKU，duplicate_ratio 的行重复前面的标题
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(["产品ID", "产品标题", "SKU", "变种ID"])
+    duplicates = int(products * duplicate_ratio)
+    sku_rows = list(range(products)) + [rng.randrange(products) for _ in range(duplicates)]
+    for row_id, index in enumerate(sku_rows):
+        sheet.append([str(1731435822277101500 + row_id), maybe_dirty(titles[index]), maybe_dirty(skus[index]),
+                      str(1731379422596728764 + row_id) if index != row_id else None])
+
+    # Sheet2：SKU → 成本，cost_miss_rate 的SKU没有成本
+    sheet = workbook.create_sheet("Sheet2")
+    sheet.append(["SKU", "平均成本", "标题"])
+    cost_rows = 0
+    for index in range(products):
+        if rng.random() < cost_miss_rate:
+            continue
+        sheet.append([maybe_dirty(skus[index]), round(rng.uniform(1, 200), 2), titles[index]])
+        cost_rows += 1
+
+    # Order details：miss_rate 的订单标题在 Sheet1 中不存在
+    sheet = workbook.create_sheet("Order details")
+    sheet.append(["Product name", "SKU", "Quantity", "成本", "总成本"])
+    missing = 0
+    for row in range(2, orders + 2):
+        if rng.random() < miss_rate:
+            title = f"Produto Desconhecido {rng.randrange(orders)}"
+            missing += 1
+        else:
+            title = maybe_dirty(titles[rng.randrange(products)])
+        sheet.append([title, None, rng.randint(1, 3), None, f"=C{row}*D{row}"])
+
+    workbook.save(path)
+    return {
+        "orders": orders,
+        "products": products,
+        "duplicate_ratio": duplicate_ratio,
+        "miss_rate": miss_rate,
+        "cost_miss_rate": cost_miss_rate,
+        "dirty_ratio": dirty_ratio,
+        "seed": seed,
+        "sku_rows": len(sku_rows),
+        "cost_rows": cost_rows,
+        "missing_titles": missing,
+    }
+
+
+def add_generator_arguments(parser):
+    parser.add_argument('--products', type=int, default=None, help="Sheet1 中不同标题的个数，默认为订单数的1/4")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--miss-rate', type=float, default=0.1)
+    parser.add_argument('--cost-miss-rate', type=float, default=0.05)
+    parser.add_argument('--dirty-ratio', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def generator_options(args):
+    return {
+        "products": args.products,
+        "duplicate_ratio": args.duplicate_ratio,
+        "miss_rate": args.miss_rate,
+        "cost_miss_rate": args.cost_miss_rate,
+        "dirty_ratio": args.dirty_ratio,
+        "seed": args.seed,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="生成合成工作簿")
+    parser.add_argument('path')
+    parser.add_argument('--orders', type=int, default=100000)
+    add_generator_arguments(parser)
+    args = parser.parse_args(argv)
+    info = generate_workbook(args.path, args.orders, **generator_options(args))
+    print(f"已生成 {args.path}: 订单 {info['orders']} 行, SKU表 {info['sku_rows']} 行, "
+          f"成本表 {info['cost_rows']} 行, 查不到的标题 {info['missing_titles']} 个")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
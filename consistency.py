@@ -0,0 +1,101 @@
+"""SKU表与成本表的一致性检查
+
+sku_data 为 {清理后的标题: SKU}，cost_data 为 {SKU: 成本}。多个标题可以对应同一个SKU，
+报告中需要按SKU列出标题时使用一次遍历构建的反向索引，而不是对每个SKU扫描整个 sku_data。
+
+/api/check-consistency 把检查结果缓存在上传会话中，完整的列表用游标分页返回，
+游标只编码列表名和偏移量，翻页时不再解析工作簿。
+"""
+import base64
+import json
+
+from text_normalize import clean_text, clean_sku
+
+# 参考表的表头行数，一致性检查从表头之后开始读取
+HEADER_ROWS = 1
+
+
+def build_sku_titles(sku_data):
+    """构建反向索引 {SKU: [标题, ...]}，标题保持在SKU表中的顺序"""
+    sku_titles = {}
+    for title, sku in sku_data.items():
+        sku_titles.setdefault(sku, []).append(title)
+    return sku_titles
+
+
+def analyze_consistency(sku_data, cost_data):
+    """比较SKU表中的SKU和成本表中的SKU
+
+    返回 {"sku_titles": 反向索引, "matched": 两边都有的SKU, "unmatched": 成本表中没有的SKU,
+    "unused": SKU表中没有用到的成本SKU}，三个列表均已排序。
+    """
+    sku_titles = build_sku_titles(sku_data)
+    sku_values = set(sku_titles)
+    cost_keys = set(cost_data)
+    return {
+        "sku_titles": sku_titles,
+        "matched": sorted(sku_values & cost_keys, key=str),
+        "unmatched": sorted(sku_values - cost_keys, key=str),
+        "unused": sorted(cost_keys - sku_values, key=str),
+    }
+
+
+def check_workbook(reader, sku_config, cost_config):
+    """按配置的列读取SKU表和成本表并比较，返回值同 analyze_consistency
+
+    reader 为 WorkbookReader，只流式读取配置的两列，标题和SKU的清理规则与 /api/process 相同。
+    第1行为表头，从第2行开始读取，表头不计入SKU。缺省列与旧版一致：SKU表 A列标题、B列SKU，成本表 A列SKU、B列成本。
+    工作表不存在时抛出 KeyError(工作表名)。
+    """
+    def load(sheet_name, key_col, value_col):
+        try:
+            data, _ = reader.lookup_table(sheet_name, key_col, value_col, clean_text, clean_sku,
+                                          min_row=HEADER_ROWS + 1)
+        except KeyError:
+            raise KeyError(sheet_name) from None
+        return data
+
+    sku_data = load(sku_config.get('sheet', 'Sheet1'), sku_config.get('title_col', 'A'), sku_config.get('sku_col', 'B'))
+    cost_data = load(cost_config.get('sheet', 'Sheet2'), cost_config.get('sku_col', 'A'),
+                     cost_config.get('cost_col', 'B'))
+    # SKU为空的标题不参与比较
+    return analyze_consistency({title: sku for title, sku in sku_data.items() if sku}, cost_data)
+
+
+# 分页返回的三个列表：列表名 → 首页响应中的字段名
+CONSISTENCY_LISTS = {
+    'matched': 'matched_skus',
+    'unmatched': 'unmatched_skus',
+    'unused': 'unused_cost_skus',
+}
+
+
+class CursorError(ValueError):
+    """分页游标无效"""
+
+
+def encode_cursor(list_name, offset, fingerprint):
+    """生成不透明的分页游标，fingerprint 标识游标所属的检查结果"""
+    raw = json.dumps([list_name, offset, fingerprint], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, fingerprint):
+    """解析分页游标，返回 (列表名, 偏移量)；游标格式错误或不属于当前检查结果时抛出 CursorError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        list_name, offset, cursor_fingerprint = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorError("分页游标无效")
+    if (list_name not in CONSISTENCY_LISTS or not isinstance(offset, int) or offset < 0
+            or cursor_fingerprint != fingerprint):
+        raise CursorError("分页游标无效或已失效，请重新检查")
+    return list_name, offset
+
+
+def page(analysis, list_name, offset, limit, fingerprint):
+    """返回 (列表中从 offset 开始的至多 limit 项, 下一页游标或 None)"""
+    items = analysis[list_name]
+    end = offset + limit
+    next_cursor = encode_cursor(list_name, end, fingerprint) if end < len(items) else None
+    return items[offset:end], next_cursor
@@ -1,11 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
 import openpyxl
 from openpyxl import load_workbook
 import os
-import re
 from datetime import datetime
+from sheet_reader import load_sheet_data_streaming, WorkbookReader
+from lookup_cache import LookupIndexCache
+from lookup_engine import AUTO_END_ROW, lookup_rows, resolve_row_range
+from background_task import BackgroundTask
+from consistency import analyze_consistency
+from text_normalize import clean_text, clean_sku
+from reference_files import REFERENCE_FORMATS, ReferenceFileReader, reference_format
+from reference_catalog import CatalogError, ReferenceCatalog, read_delta
 
 class ExcelProcessor:
     def __init__(self, root):
@@ -25,6 +31,16 @@ class ExcelProcessor:
         self.sheet_names = []
         self.sku_data = {}
         self.cost_data = {}
+        # 参考表未变化时直接从磁盘缓存读取查找表
+        self.lookup_index_cache = LookupIndexCache()
+        # 导入过的参考表保存在本地目录中，之后可按目录名直接加载
+        self.reference_catalog = ReferenceCatalog()
+        # 当前SKU数据和成本数据来自的目录名，应用变更后同步刷新
+        self.loaded_catalog = None
+        # 正在后台运行的任务（同一时间只运行一个）
+        self.task = None
+        self.task_description = ""
+        self.task_on_done = None
         
         self.setup_ui()
         
@@ -98,7 +114,7 @@ class ExcelProcessor:
         # 绑定事件
         self.sku_sheet_combo.bind('<<ComboboxSelected>>', self.on_sheet_selected)
         self.cost_sheet_combo.bind('<<ComboboxSelected>>', self.on_sheet_selected)
-        self.output_sheet_combo.bind('<<ComboboxSelected>>', self.on_output_sheet_selected)
+        self.output_sheet_list.bind('<<ListboxSelect>>', self.on_output_sheet_selected)
         
     def create_card(self, parent, title):
         """创建现代化卡片"""
@@ -115,6 +131,8 @@ class ExcelProcessor:
         
     def setup_sku_config(self, parent):
         """设置SKU数据源配置"""
+        self.sku_file_var = self.setup_reference_file_row(parent, 'sku')
+        
         # 工作表选择
         sheet_frame = tk.Frame(parent, bg='#ecf0f1')
         sheet_frame.pack(fill='x', padx=15, pady=5)
@@ -153,6 +171,8 @@ class ExcelProcessor:
         
     def setup_cost_config(self, parent):
         """设置成本数据源配置"""
+        self.cost_file_var = self.setup_reference_file_row(parent, 'cost')
+        
         # 工作表选择
         sheet_frame = tk.Frame(parent, bg='#ecf0f1')
         sheet_frame.pack(fill='x', padx=15, pady=5)
@@ -189,6 +209,25 @@ class ExcelProcessor:
                                           state='readonly', width=8, font=self.font_normal)
         self.cost_col_combo.pack(side='left', padx=5)
         
+    def setup_reference_file_row(self, parent, kind):
+        """独立参考表文件（CSV / Parquet / Arrow）选择行，选择文件后不再使用工作表，返回文件路径变量"""
+        file_frame = tk.Frame(parent, bg='#ecf0f1')
+        file_frame.pack(fill='x', padx=15, pady=5)
+        
+        tk.Label(file_frame, text="文件:", 
+                font=self.font_normal, bg='#ecf0f1', fg='#2c3e50').pack(side='left')
+        
+        file_var = tk.StringVar()
+        tk.Entry(file_frame, textvariable=file_var, state='readonly', width=14,
+                 font=self.font_small, relief='solid', bd=1).pack(side='left', padx=5)
+        tk.Button(file_frame, text="选择", command=lambda: self.browse_reference_file(kind),
+                  font=self.font_small, bg='#3498db', fg='#ffffff', relief='flat', padx=6,
+                  cursor='hand2').pack(side='left')
+        tk.Button(file_frame, text="清除", command=lambda: self.clear_reference_file(kind),
+                  font=self.font_small, bg='#95a5a6', fg='#ffffff', relief='flat', padx=6,
+                  cursor='hand2').pack(side='left', padx=(5, 0))
+        return file_var
+        
     def setup_output_config(self, parent):
         """设置输出配置"""
         # 输出工作表
@@ -196,12 +235,12 @@ class ExcelProcessor:
         sheet_frame.pack(fill='x', padx=15, pady=5)
         
         tk.Label(sheet_frame, text="输出工作表:", 
-                font=self.font_normal, bg='#ecf0f1', fg='#2c3e50').pack(side='left')
+                font=self.font_normal, bg='#ecf0f1', fg='#2c3e50').pack(side='left', anchor='n')
         
-        self.output_sheet_var = tk.StringVar()
-        self.output_sheet_combo = ttk.Combobox(sheet_frame, textvariable=self.output_sheet_var, 
-                                              state='readonly', width=12, font=self.font_normal)
-        self.output_sheet_combo.pack(side='left', padx=(5, 15))
+        # 可多选，选中的工作表使用相同的列设置，一次处理全部填充
+        self.output_sheet_list = tk.Listbox(sheet_frame, selectmode='multiple', exportselection=False,
+                                            height=4, width=16, font=self.font_normal)
+        self.output_sheet_list.pack(side='left', padx=(5, 15))
         
         # 标题列
         title_frame = tk.Frame(parent, bg='#ecf0f1')
@@ -254,10 +293,20 @@ class ExcelProcessor:
         tk.Label(range_frame, text="结束行:", 
                 font=self.font_normal, bg='#ecf0f1', fg='#2c3e50').pack(side='left')
         
-        self.end_row_var = tk.StringVar(value="5000")
+        # 留空或填 auto 时处理到标题列最后一个非空单元格
+        self.end_row_var = tk.StringVar(value=AUTO_END_ROW)
         self.end_row_entry = tk.Entry(range_frame, textvariable=self.end_row_var, 
                                      width=8, font=self.font_normal, relief='solid', bd=1)
-        self.end_row_entry.pack(side='left', padx=5)
+        self.end_row_entry.pack(side='left', padx=(5, 15))
+        
+        tk.Label(range_frame, text="连续空行停止:", 
+                font=self.font_normal, bg='#ecf0f1', fg='#2c3e50').pack(side='left')
+        
+        # 连续遇到这么多空标题时停止，留空或0表示不限
+        self.blank_limit_var = tk.StringVar(value="")
+        self.blank_limit_entry = tk.Entry(range_frame, textvariable=self.blank_limit_var, 
+                                         width=6, font=self.font_normal, relief='solid', bd=1)
+        self.blank_limit_entry.pack(side='left', padx=5)
         
     def setup_control_buttons(self, parent):
         """设置操作控制按钮"""
@@ -300,6 +349,40 @@ class ExcelProcessor:
                                  activebackground='#e67e22', activeforeground='#ffffff')
         self.save_btn.pack(side='left', padx=5)
         
+        # 参考表目录
+        catalog_frame = tk.Frame(parent, bg='#2c3e50')
+        catalog_frame.pack(pady=5)
+        
+        tk.Label(catalog_frame, text="参考表目录:", 
+                font=self.font_small, bg='#2c3e50', fg='#ecf0f1').pack(side='left')
+        
+        self.catalog_var = tk.StringVar()
+        self.catalog_combo = ttk.Combobox(catalog_frame, textvariable=self.catalog_var, 
+                                         width=20, font=self.font_small,
+                                         postcommand=self.refresh_catalog_names)
+        self.catalog_combo.pack(side='left', padx=5)
+        
+        self.catalog_load_btn = tk.Button(catalog_frame, text="📂 从目录加载", 
+                                         command=self.load_catalog,
+                                         font=self.font_small, bg='#2980b9', fg='#ffffff',
+                                         relief='flat', padx=15, pady=8, cursor='hand2',
+                                         activebackground='#2471a3', activeforeground='#ffffff')
+        self.catalog_load_btn.pack(side='left', padx=5)
+        
+        self.catalog_import_btn = tk.Button(catalog_frame, text="🗂 导入到目录", 
+                                           command=self.import_catalog,
+                                           font=self.font_small, bg='#16a085', fg='#ffffff',
+                                           relief='flat', padx=15, pady=8, cursor='hand2',
+                                           activebackground='#138d75', activeforeground='#ffffff')
+        self.catalog_import_btn.pack(side='left', padx=5)
+        
+        self.catalog_delta_btn = tk.Button(catalog_frame, text="✏ 应用变更表", 
+                                          command=self.apply_catalog_delta,
+                                          font=self.font_small, bg='#8e44ad', fg='#ffffff',
+                                          relief='flat', padx=15, pady=8, cursor='hand2',
+                                          activebackground='#7d3c98', activeforeground='#ffffff')
+        self.catalog_delta_btn.pack(side='left', padx=5)
+        
         # 工具按钮
         tool_buttons_frame = tk.Frame(parent, bg='#2c3e50')
         tool_buttons_frame.pack(pady=5)
@@ -343,6 +426,24 @@ class ExcelProcessor:
                                            maximum=100, length=400)
         self.progress_bar.pack(pady=10)
         
+        # 后台任务控制按钮，任务运行时可用
+        task_buttons_frame = tk.Frame(status_card, bg='#ecf0f1')
+        task_buttons_frame.pack()
+        
+        self.pause_btn = tk.Button(task_buttons_frame, text="⏸ 暂停", 
+                                  command=self.toggle_pause_task, state='disabled',
+                                  font=self.font_small, bg='#7f8c8d', fg='#ffffff',
+                                  relief='flat', padx=15, pady=4, cursor='hand2',
+                                  activebackground='#636e72', activeforeground='#ffffff')
+        self.pause_btn.pack(side='left', padx=5)
+        
+        self.cancel_btn = tk.Button(task_buttons_frame, text="✖ 取消", 
+                                   command=self.cancel_task, state='disabled',
+                                   font=self.font_small, bg='#c0392b', fg='#ffffff',
+                                   relief='flat', padx=15, pady=4, cursor='hand2',
+                                   activebackground='#a93226', activeforeground='#ffffff')
+        self.cancel_btn.pack(side='left', padx=5)
+        
         # 状态标签
         self.status_var = tk.StringVar(value="请选择Excel文件开始处理")
         self.status_label = tk.Label(status_card, textvariable=self.status_var, 
@@ -366,7 +467,8 @@ class ExcelProcessor:
             # 更新工作表下拉框
             self.sku_sheet_combo['values'] = self.sheet_names
             self.cost_sheet_combo['values'] = self.sheet_names
-            self.output_sheet_combo['values'] = self.sheet_names
+            self.output_sheet_list.delete(0, 'end')
+            self.output_sheet_list.insert('end', *self.sheet_names)
             
             if self.sheet_names:
                 # 设置默认工作表
@@ -381,9 +483,9 @@ class ExcelProcessor:
                     self.cost_sheet_combo.set(self.sheet_names[0])
                     
                 if 'Order details' in self.sheet_names:
-                    self.output_sheet_combo.set('Order details')
+                    self.set_output_sheets(['Order details'])
                 else:
-                    self.output_sheet_combo.set(self.sheet_names[0])
+                    self.set_output_sheets(self.sheet_names[:1])
                 
             self.status_var.set(f"已加载工作簿，共{len(self.sheet_names)}个工作表")
             
@@ -398,20 +500,32 @@ class ExcelProcessor:
         # 当选择输出工作表时，更新输出列选项
         self.update_output_column_options()
         
+    def get_output_sheets(self):
+        """返回选中的输出工作表名列表"""
+        return [self.output_sheet_list.get(i) for i in self.output_sheet_list.curselection()]
+        
+    def set_output_sheets(self, sheet_names):
+        """选中指定的输出工作表"""
+        self.output_sheet_list.selection_clear(0, 'end')
+        for i, name in enumerate(self.output_sheet_list.get(0, 'end')):
+            if name in sheet_names:
+                self.output_sheet_list.selection_set(i)
+        self.update_output_column_options()
+        
     def update_column_options(self):
         try:
             if not self.workbook:
                 return
                 
-            # 更新SKU数据源的列选项
-            if self.sku_sheet_var.get():
+            # 更新SKU数据源的列选项（使用参考表文件时列为文件的表头）
+            if self.sku_sheet_var.get() and not self.sku_file_var.get():
                 sku_sheet = self.workbook[self.sku_sheet_var.get()]
                 sku_columns = self.get_column_letters(sku_sheet)
                 self.sku_title_col_combo['values'] = sku_columns
                 self.sku_col_combo['values'] = sku_columns
                 
             # 更新成本数据源的列选项
-            if self.cost_sheet_var.get():
+            if self.cost_sheet_var.get() and not self.cost_file_var.get():
                 cost_sheet = self.workbook[self.cost_sheet_var.get()]
                 cost_columns = self.get_column_letters(cost_sheet)
                 self.cost_sku_col_combo['values'] = cost_columns
@@ -426,9 +540,10 @@ class ExcelProcessor:
             if not self.workbook:
                 return
                 
-            # 更新输出工作表的列选项
-            if self.output_sheet_var.get():
-                output_sheet = self.workbook[self.output_sheet_var.get()]
+            # 更新输出工作表的列选项（多选时以第一个工作表为准）
+            output_sheets = self.get_output_sheets()
+            if output_sheets:
+                output_sheet = self.workbook[output_sheets[0]]
                 output_columns = self.get_column_letters(output_sheet)
                 self.output_title_col_combo['values'] = output_columns
                 self.output_sku_col_combo['values'] = output_columns
@@ -437,6 +552,47 @@ class ExcelProcessor:
         except Exception as e:
             print(f"更新输出列选项时出错: {e}")
             
+    def reference_widgets(self, kind):
+        """返回 (文件路径变量, 工作表下拉框, 两个列下拉框)"""
+        if kind == 'sku':
+            return self.sku_file_var, self.sku_sheet_combo, (self.sku_title_col_combo, self.sku_col_combo)
+        return self.cost_file_var, self.cost_sheet_combo, (self.cost_sku_col_combo, self.cost_col_combo)
+        
+    def browse_reference_file(self, kind):
+        """选择 CSV / Parquet / Arrow 参考表文件，列下拉框改为文件的表头"""
+        patterns = ' '.join(f"*{ext}" for ext in REFERENCE_FORMATS)
+        file_path = filedialog.askopenfilename(
+            title="选择参考表文件",
+            filetypes=[("CSV / Parquet / Arrow", patterns), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            reader = ReferenceFileReader(file_path, reference_format(file_path), os.path.basename(file_path))
+            header = reader.header
+        except Exception as e:
+            messagebox.showerror("错误", f"读取参考表文件失败: {str(e)}")
+            return
+            
+        file_var, sheet_combo, column_combos = self.reference_widgets(kind)
+        file_var.set(file_path)
+        sheet_combo.config(state='disabled')
+        for combo in column_combos:
+            combo['values'] = header
+            combo.set('')
+        self.status_var.set(f"已选择参考表文件 {os.path.basename(file_path)}，共{len(header)}列")
+        
+    def clear_reference_file(self, kind):
+        """取消参考表文件，恢复使用工作簿中的工作表"""
+        file_var, sheet_combo, column_combos = self.reference_widgets(kind)
+        if not file_var.get():
+            return
+        file_var.set('')
+        sheet_combo.config(state='readonly')
+        for combo in column_combos:
+            combo.set('')
+        self.update_column_options()
+        
     def get_column_letters(self, sheet):
         """获取工作表的列字母"""
         columns = []
@@ -444,98 +600,245 @@ class ExcelProcessor:
             columns.append(openpyxl.utils.get_column_letter(col))
         return columns
         
+    def run_task(self, work, on_done, description):
+        """在后台线程运行 work(task)，完成后在界面线程调用 on_done(结果)"""
+        if self.task is not None and self.task.is_alive:
+            messagebox.showwarning("警告", "已有任务正在运行，请等待完成或取消")
+            return
+        
+        self.task_description = description
+        self.task_on_done = on_done
+        self.status_var.set(f"正在{description}...")
+        self.progress_var.set(0)
+        self.set_task_controls(True)
+        self.task = BackgroundTask(work).start()
+        self.root.after(100, self.poll_task)
+        
+    def poll_task(self):
+        """约每100毫秒取出一次后台任务的进度和结果"""
+        task = self.task
+        for kind, payload in task.poll():
+            if kind == "progress":
+                percent, message = payload
+                self.progress_var.set(percent)
+                if message:
+                    self.status_var.set(message)
+            elif kind == "done":
+                self.set_task_controls(False)
+                try:
+                    self.task_on_done(payload)
+                except Exception as e:
+                    messagebox.showerror("错误", f"{self.task_description}失败: {str(e)}")
+                    self.status_var.set(f"{self.task_description}失败")
+                return
+            elif kind == "error":
+                self.set_task_controls(False)
+                messagebox.showerror("错误", f"{self.task_description}失败: {str(payload)}")
+                self.status_var.set(f"{self.task_description}失败")
+                return
+            elif kind == "cancelled":
+                self.set_task_controls(False)
+                self.progress_var.set(0)
+                self.status_var.set(f"已取消{self.task_description}")
+                return
+        self.root.after(100, self.poll_task)
+        
+    def set_task_controls(self, running):
+        """任务运行时禁用操作按钮，启用暂停/取消按钮"""
+        action_state = 'disabled' if running else 'normal'
+        for button in (self.auto_config_btn, self.check_data_btn, self.load_btn,
+                       self.process_btn, self.save_btn, self.test_save_btn,
+                       self.catalog_load_btn, self.catalog_import_btn, self.catalog_delta_btn):
+            button.config(state=action_state)
+        task_state = 'normal' if running else 'disabled'
+        self.pause_btn.config(state=task_state, text="⏸ 暂停")
+        self.cancel_btn.config(state=task_state)
+        
+    def toggle_pause_task(self):
+        if self.task is None or not self.task.is_alive:
+            return
+        if self.task.is_paused:
+            self.task.resume()
+            self.pause_btn.config(text="⏸ 暂停")
+            self.status_var.set(f"正在{self.task_description}...")
+        else:
+            self.task.pause()
+            self.pause_btn.config(text="▶ 继续")
+            self.status_var.set(f"{self.task_description}已暂停")
+            
+    def cancel_task(self):
+        if self.task is not None and self.task.is_alive:
+            self.task.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.status_var.set(f"正在取消{self.task_description}...")
+            
     def load_data(self):
         """加载数据到内存"""
-        try:
-            if not self.workbook:
-                messagebox.showwarning("警告", "请先选择Excel文件")
-                return
+        if not self.workbook:
+            messagebox.showwarning("警告", "请先选择Excel文件")
+            return
+            
+        # Tk 变量只能在界面线程读取，先取出配置再交给后台线程
+        file_path = self.file_path_var.get()
+        sku_file = self.sku_file_var.get()
+        cost_file = self.cost_file_var.get()
+        sku_source = (self.sku_sheet_var.get() or sku_file, self.sku_title_col_var.get(), self.sku_col_var.get())
+        cost_source = (self.cost_sheet_var.get() or cost_file, self.cost_sku_col_var.get(), self.cost_col_var.get())
+        
+        def work(task):
+            # 以只读模式流式读取参考表，只取配置的两列；工作表未变化时使用磁盘缓存
+            reader = WorkbookReader(file_path, index_cache=self.lookup_index_cache)
+            
+            def source_reader(reference_file):
+                # 选择了参考表文件时按列读取该文件，否则读取工作簿
+                if not reference_file:
+                    return reader
+                return ReferenceFileReader(reference_file, reference_format(reference_file),
+                                           os.path.basename(reference_file))
                 
-            self.status_var.set("正在加载数据...")
-            self.progress_var.set(0)
-            self.root.update()
+            sku_data, cost_data = self.sku_data, self.cost_data
+            load_stats = []
+            try:
+                # 加载SKU数据
+                if all(sku_source):
+                    task.checkpoint()
+                    task.report(0, "正在加载SKU数据...", force=True)
+                    sku_data, stats = source_reader(sku_file).lookup_table(*sku_source, clean_text, clean_sku)
+                    load_stats.append(stats)
+                    task.report(50, force=True)
+                    
+                # 加载成本数据
+                if all(cost_source):
+                    task.checkpoint()
+                    task.report(50, "正在加载成本数据...", force=True)
+                    cost_data, stats = source_reader(cost_file).lookup_table(*cost_source, clean_text, clean_sku)
+                    load_stats.append(stats)
+                    task.report(100, force=True)
+            finally:
+                reader.close()
+            return sku_data, cost_data, load_stats
+            
+        def on_done(result):
+            self.sku_data, self.cost_data, load_stats = result
+            self.loaded_catalog = None
+            rows = sum(stats['rows'] for stats in load_stats)
+            seconds = sum(stats['seconds'] for stats in load_stats)
+            speed = int(rows / seconds) if seconds > 0 else rows
+            cached = sum(1 for stats in load_stats if stats.get('disk_cache'))
+            cache_note = f", {cached}个表来自缓存" if cached else ""
+            self.status_var.set(f"数据加载完成 - SKU数据: {len(self.sku_data)}条, 成本数据: {len(self.cost_data)}条 ({speed}行/秒{cache_note})")
+            
+        self.run_task(work, on_done, "加载数据")
+            
+    def refresh_catalog_names(self):
+        """展开下拉框时刷新目录名列表"""
+        try:
+            self.catalog_combo['values'] = [info['name'] for info in self.reference_catalog.list()]
+        except Exception as e:
+            self.status_var.set(f"读取参考表目录失败: {str(e)}")
             
-            # 加载SKU数据
-            if self.sku_sheet_var.get() and self.sku_title_col_var.get() and self.sku_col_var.get():
-                sku_sheet = self.workbook[self.sku_sheet_var.get()]
-                self.sku_data = self.load_sheet_data(sku_sheet, 
-                                                   self.sku_title_col_var.get(), 
-                                                   self.sku_col_var.get())
-                self.progress_var.set(50)
-                self.root.update()
-                
-            # 加载成本数据
-            if self.cost_sheet_var.get() and self.cost_sku_col_var.get() and self.cost_col_var.get():
-                cost_sheet = self.workbook[self.cost_sheet_var.get()]
-                self.cost_data = self.load_sheet_data(cost_sheet, 
-                                                    self.cost_sku_col_var.get(), 
-                                                    self.cost_col_var.get())
-                self.progress_var.set(100)
-                self.root.update()
-                
-            self.status_var.set(f"数据加载完成 - SKU数据: {len(self.sku_data)}条, 成本数据: {len(self.cost_data)}条")
+    def load_catalog(self):
+        """从参考表目录加载SKU数据和成本数据，代替从工作表加载"""
+        name = self.catalog_var.get().strip()
+        if not name:
+            messagebox.showwarning("警告", "请输入或选择参考表目录名")
+            return
             
-        except Exception as e:
-            messagebox.showerror("错误", f"加载数据失败: {str(e)}")
-            self.status_var.set("数据加载失败")
+        def work(task):
+            task.report(0, "正在读取参考表目录...", force=True)
+            return self.reference_catalog.tables(name)
             
-    def load_sheet_data(self, sheet, key_col, value_col):
-        """加载工作表数据到字典"""
-        data = {}
-        key_col_num = openpyxl.utils.column_index_from_string(key_col)
-        value_col_num = openpyxl.utils.column_index_from_string(value_col)
-        
-        for row in range(1, sheet.max_row + 1):
-            key_cell = sheet.cell(row=row, column=key_col_num)
-            value_cell = sheet.cell(row=row, column=value_col_num)
-            
-            if key_cell.value and str(key_cell.value).strip():
-                # 清理键值，去除特殊字符
-                clean_key = self.clean_text(str(key_cell.value))
-                # 如果是SKU数据，也清理值
-                if value_cell.value:
-                    clean_value = self.clean_sku(str(value_cell.value))
-                    data[clean_key] = clean_value
-                else:
-                    data[clean_key] = value_cell.value
-                
-        return data
-        
-    def clean_text(self, text):
-        """清理文本，去除特殊字符"""
-        if not text:
-            return ""
+        def on_done(result):
+            version, self.sku_data, self.cost_data = result
+            self.loaded_catalog = name
+            self.status_var.set(f"已从目录 {name}（版本 {version}）加载 - SKU数据: {len(self.sku_data)}条, 成本数据: {len(self.cost_data)}条")
             
-        text = str(text)
-        
-        # 去除不可见字符和换行符
-        text = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', text)
+        self.run_task(work, on_done, "读取参考表目录")
         
-        # 去除多余空格
-        text = ' '.join(text.split())
-        
-        # 去除首尾空格
-        text = text.strip()
-        
-        return text
+    def import_catalog(self):
+        """把已加载的SKU数据和成本数据导入参考表目录（同名目录的内容被替换，版本加一）"""
+        name = self.catalog_var.get().strip()
+        try:
+            ReferenceCatalog.validate_name(name)
+        except CatalogError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        if not self.sku_data or not self.cost_data:
+            messagebox.showwarning("警告", "请先加载SKU数据和成本数据")
+            return
+            
+        sku_data, cost_data = self.sku_data, self.cost_data
         
-    def clean_sku(self, sku):
-        """清理SKU，处理特殊字符和格式问题"""
-        if not sku:
-            return ""
+        def work(task):
+            task.report(0, "正在导入参考表目录...", force=True)
+            return self.reference_catalog.import_tables(name, sku_data, cost_data)
+            
+        def on_done(info):
+            self.loaded_catalog = name
+            self.status_var.set(f"已导入目录 {name}（版本 {info['version']}）- SKU数据: {info['sku_entries']}条, 成本数据: {info['cost_entries']}条")
             
-        sku = str(sku)
+        self.run_task(work, on_done, "导入参考表目录")
         
-        # 去除不可见字符
-        sku = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', sku)
+    def apply_catalog_delta(self):
+        """把变更表应用到参考表目录：A列为键，B列为新值，可选的C列写"删除"表示删除该键
         
-        # 去除首尾空格
-        sku = sku.strip()
+        xlsx 读取第一个工作表并跳过表头行；CSV / Parquet / Arrow 的第一行为表头。
+        """
+        name = self.catalog_var.get().strip()
+        try:
+            ReferenceCatalog.validate_name(name)
+        except CatalogError as e:
+            messagebox.showwarning("警告", str(e))
+            return
         
-        # 统一空格处理（将多个空格替换为单个空格）
-        sku = re.sub(r'\s+', ' ', sku)
+        patterns = ' '.join(f"*{ext}" for ext in ('.xlsx', *REFERENCE_FORMATS))
+        file_path = filedialog.askopenfilename(
+            title="选择变更表",
+            filetypes=[("Excel / CSV / Parquet / Arrow", patterns), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        answer = messagebox.askyesnocancel("变更类型", "是否为成本变更（A列SKU → B列成本）？\n选择“否”为SKU变更（A列标题 → B列SKU）")
+        if answer is None:
+            return
+        table = 'cost' if answer else 'sku'
+        reload = self.loaded_catalog == name
+        
+        def work(task):
+            task.report(0, "正在读取变更表...", force=True)
+            config = {'table': table, 'key_col': 'A', 'value_col': 'B', 'action_col': 'C'}
+            if file_path.lower().endswith('.xlsx'):
+                reader = WorkbookReader(file_path)
+                config['sheet'] = reader.workbook.sheetnames[0]
+                skip_rows, first_row = 1, 1
+            else:
+                reader = ReferenceFileReader(file_path, reference_format(file_path), os.path.basename(file_path))
+                if len(reader.header) < 3:
+                    del config['action_col']
+                skip_rows, first_row = 0, 2
+            try:
+                changes = read_delta(reader, config, skip_rows, first_row)
+            finally:
+                reader.close()
+            task.checkpoint()
+            task.report(50, "正在应用变更...", force=True)
+            info, counts = self.reference_catalog.apply_changes(name, changes)
+            # 内存中的数据来自该目录时一并更新，只重放本次变更
+            tables = self.reference_catalog.tables(name) if reload else None
+            return info, counts[table], tables
+            
+        def on_done(result):
+            info, counts, tables = result
+            if tables is not None and self.loaded_catalog == name:
+                _, self.sku_data, self.cost_data = tables
+            self.status_var.set(f"目录 {name} 已更新到版本 {info['version']} - 新增/更新: {counts['upserted']}条, 删除: {counts['deleted']}条")
+            
+        self.run_task(work, on_done, "应用变更表")
         
-        return sku
+    def load_sheet_data(self, sheet, key_col, value_col):
+        """加载工作表数据到字典"""
+        data, _ = load_sheet_data_streaming(sheet, key_col, value_col, clean_text, clean_sku)
+        return data
         
     def process_data(self):
         """处理数据"""
@@ -544,7 +847,8 @@ class ExcelProcessor:
                 messagebox.showwarning("警告", "请先加载数据")
                 return
                 
-            if not self.output_sheet_var.get():
+            sheet_names = self.get_output_sheets()
+            if not sheet_names:
                 messagebox.showwarning("警告", "请选择输出工作表")
                 return
                 
@@ -552,62 +856,72 @@ class ExcelProcessor:
                 messagebox.showwarning("警告", "请选择输出工作表的标题列、SKU列和成本列")
                 return
                 
-            self.status_var.set("正在处理数据...")
-            self.progress_var.set(0)
-            self.root.update()
-            
-            # 获取输出工作表
-            output_sheet = self.workbook[self.output_sheet_var.get()]
+            # 获取输出工作表，选中的工作表共用列设置和行范围
+            file_path = self.file_path_var.get()
+            title_col = self.output_title_col_var.get()
+            output_sheets = [self.workbook[name] for name in sheet_names]
             start_row = int(self.start_row_var.get())
-            end_row = int(self.end_row_var.get())
+            end_row = self.end_row_var.get().strip().lower()
+            end_row = int(end_row) if end_row not in ('', AUTO_END_ROW) else AUTO_END_ROW
+            blank_limit = int(self.blank_limit_var.get().strip() or 0)
             
             # 获取列号
-            title_col_num = openpyxl.utils.column_index_from_string(self.output_title_col_var.get())
             sku_col_num = openpyxl.utils.column_index_from_string(self.output_sku_col_var.get())
             cost_col_num = openpyxl.utils.column_index_from_string(self.output_cost_col_var.get())
+        except Exception as e:
+            messagebox.showerror("错误", f"处理数据失败: {str(e)}")
+            return
             
-            total_rows = end_row - start_row + 1
-            processed = 0
-            found_sku_count = 0
-            found_cost_count = 0
-            
-            # 处理每一行
-            for row in range(start_row, end_row + 1):
-                # 使用用户选择的列
-                title_cell = output_sheet.cell(row=row, column=title_col_num)
-                sku_cell = output_sheet.cell(row=row, column=sku_col_num)
-                cost_cell = output_sheet.cell(row=row, column=cost_col_num)
+        sku_data, cost_data = self.sku_data, self.cost_data
+        
+        def work(task):
+            # 以只读模式读取全部输出工作表的标题列，不在工作表中为空行创建单元格
+            task.report(0, "正在读取标题列...", force=True)
+            reader = WorkbookReader(file_path)
+            try:
+                titles_list = [reader.column_values(name, title_col) for name in sheet_names]
+            finally:
+                reader.close()
                 
-                if title_cell.value and str(title_cell.value).strip():
-                    # 清理标题文本
-                    clean_title = self.clean_text(str(title_cell.value))
-                    
-                    # 查找SKU
-                    if clean_title in self.sku_data:
-                        sku_cell.value = self.sku_data[clean_title]
-                        found_sku_count += 1
-                        
-                        # 根据SKU查找成本
-                        sku_value = self.clean_sku(str(sku_cell.value))
-                        if sku_value in self.cost_data:
-                            cost_cell.value = self.cost_data[sku_value]
-                            found_cost_count += 1
-                        else:
-                            cost_cell.value = "未找到成本"
-                    else:
-                        sku_cell.value = "未找到SKU"
-                        cost_cell.value = "未找到成本"
+            results = []
+            sheet_count = len(sheet_names)
+            for index, (name, output_sheet, titles) in enumerate(zip(sheet_names, output_sheets, titles_list)):
+                scanned_range = resolve_row_range(titles, start_row, end_row, blank_limit)
+                base = 10 + 85 * index / sheet_count
                 
-                processed += 1
-                progress = (processed / total_rows) * 100
-                self.progress_var.set(progress)
-                self.root.update()
+                def on_progress(done, total):
+                    task.checkpoint()
+                    task.report(base + 80 * done / total / sheet_count,
+                                f"正在处理 {name}... {done}/{total}行")
+                    
+                task.checkpoint()
+                updates, stats = lookup_rows(titles, start_row, scanned_range['end_row'],
+                                             sku_data, cost_data, sku_col_num, cost_col_num,
+                                             on_progress)
                 
-            self.status_var.set(f"数据处理完成，共处理{processed}行，找到SKU: {found_sku_count}个，找到成本: {found_cost_count}个")
+                # 查找后只写入有标题的行；写入阶段不响应取消，避免工作表只更新了一部分
+                task.checkpoint()
+                task.report(base + 80 / sheet_count, f"正在写入 {name}...", force=True)
+                for (row, col), value in updates.items():
+                    output_sheet.cell(row=row, column=col).value = value
+                results.append((name, scanned_range, stats))
+            task.report(100, force=True)
+            return results
+            
+        def on_done(results):
+            if len(results) == 1:
+                _, scanned_range, stats = results[0]
+                self.status_var.set(f"数据处理完成，扫描第{scanned_range['start_row']}-{scanned_range['end_row']}行，"
+                                    f"共处理{stats['processed_rows']}行，找到SKU: {stats['found_sku']}个，"
+                                    f"找到成本: {stats['found_cost']}个")
+                return
+            processed = sum(stats['processed_rows'] for _, _, stats in results)
+            found_sku = sum(stats['found_sku'] for _, _, stats in results)
+            found_cost = sum(stats['found_cost'] for _, _, stats in results)
+            self.status_var.set(f"数据处理完成，{len(results)}个工作表共处理{processed}行，"
+                                f"找到SKU: {found_sku}个，找到成本: {found_cost}个")
             
-        except Exception as e:
-            messagebox.showerror("错误", f"处理数据失败: {str(e)}")
-            self.status_var.set("数据处理失败")
+        self.run_task(work, on_done, "处理数据")
             
     def save_results(self):
         """保存结果"""
@@ -669,8 +983,12 @@ class ExcelProcessor:
                 messagebox.showwarning("警告", "没有工作簿可测试")
                 return
                 
-            # 获取输出工作表
-            output_sheet = self.workbook[self.output_sheet_var.get()]
+            # 获取输出工作表（多选时使用第一个）
+            output_sheets = self.get_output_sheets()
+            if not output_sheets:
+                messagebox.showwarning("警告", "请选择输出工作表")
+                return
+            output_sheet = self.workbook[output_sheets[0]]
             
             # 在测试单元格写入数据
             test_cell = output_sheet.cell(row=1, column=1)
@@ -1014,9 +1332,9 @@ A6: 检查项目：
                 debug_info.append(f"工作表数量: {len(self.workbook.sheetnames)}")
                 debug_info.append(f"工作表列表: {', '.join(self.workbook.sheetnames)}")
             
-            debug_info.append(f"SKU数据源: {self.sku_sheet_var.get()} - {self.sku_title_col_var.get()} -> {self.sku_col_var.get()}")
-            debug_info.append(f"成本数据源: {self.cost_sheet_var.get()} - {self.cost_sku_col_var.get()} -> {self.cost_col_var.get()}")
-            debug_info.append(f"输出设置: {self.output_sheet_var.get()} - 标题:{self.output_title_col_var.get()}, SKU:{self.output_sku_col_var.get()}, 成本:{self.output_cost_col_var.get()}")
+            debug_info.append(f"SKU数据源: {self.sku_file_var.get() or self.sku_sheet_var.get()} - {self.sku_title_col_var.get()} -> {self.sku_col_var.get()}")
+            debug_info.append(f"成本数据源: {self.cost_file_var.get() or self.cost_sheet_var.get()} - {self.cost_sku_col_var.get()} -> {self.cost_col_var.get()}")
+            debug_info.append(f"输出设置: {', '.join(self.get_output_sheets())} - 标题:{self.output_title_col_var.get()}, SKU:{self.output_sku_col_var.get()}, 成本:{self.output_cost_col_var.get()}")
             
             debug_info.append(f"SKU数据条数: {len(self.sku_data) if self.sku_data else 0}")
             debug_info.append(f"成本数据条数: {len(self.cost_data) if self.cost_data else 0}")
@@ -1074,7 +1392,7 @@ A6: 检查项目：
                 
             # 自动设置输出
             if 'Order details' in self.workbook.sheetnames:
-                self.output_sheet_var.set('Order details')
+                self.set_output_sheets(['Order details'])
                 self.output_title_col_var.set('A')  # 产品标题列
                 self.output_sku_col_var.set('B')    # SKU列
                 self.output_cost_col_var.set('D')   # 成本列
@@ -1085,74 +1403,90 @@ A6: 检查项目：
             messagebox.showerror("错误", f"自动配置失败: {str(e)}")
             
     def check_data_consistency(self):
-        """检查数据一致性"""
+        """检查数据一致性；从参考表目录加载了数据时检查该目录，与处理时使用的数据相同"""
+        catalog = self.loaded_catalog
         try:
-            if not self.workbook:
-                messagebox.showwarning("警告", "请先选择Excel文件")
-                return
-                
-            if not self.sku_sheet_var.get() or not self.cost_sheet_var.get():
-                messagebox.showwarning("警告", "请先配置SKU数据源和成本数据源")
-                return
-                
-            self.status_var.set("正在检查数据一致性...")
-            self.progress_var.set(0)
-            self.root.update()
-            
-            # 加载SKU数据
-            sku_sheet = self.workbook[self.sku_sheet_var.get()]
-            sku_data = {}
-            sku_title_col_num = openpyxl.utils.column_index_from_string(self.sku_title_col_var.get())
-            sku_col_num = openpyxl.utils.column_index_from_string(self.sku_col_var.get())
-            
-            for row in range(2, sku_sheet.max_row + 1):
-                title_cell = sku_sheet.cell(row=row, column=sku_title_col_num)
-                sku_cell = sku_sheet.cell(row=row, column=sku_col_num)
+            if catalog is None:
+                if not self.workbook:
+                    messagebox.showwarning("警告", "请先选择Excel文件")
+                    return
+                    
+                # 选择了参考表文件时该参考表从文件读取，列下拉框中为文件的表头
+                sku_file = self.sku_file_var.get()
+                cost_file = self.cost_file_var.get()
+                if not (self.sku_sheet_var.get() or sku_file) or not (self.cost_sheet_var.get() or cost_file):
+                    messagebox.showwarning("警告", "请先配置SKU数据源和成本数据源")
+                    return
+                    
+                if not all((self.sku_title_col_var.get(), self.sku_col_var.get(),
+                            self.cost_sku_col_var.get(), self.cost_col_var.get())):
+                    messagebox.showwarning("警告", "请先选择SKU数据源和成本数据源的列")
+                    return
+                    
+                # Tk 变量只能在界面线程读取，先取出配置再交给后台线程
+                file_path = self.file_path_var.get()
+                sku_source = (self.sku_sheet_var.get() or sku_file, self.sku_title_col_var.get(), self.sku_col_var.get())
+                cost_source = (self.cost_sheet_var.get() or cost_file, self.cost_sku_col_var.get(), self.cost_col_var.get())
+        except Exception as e:
+            messagebox.showerror("错误", f"数据检查失败: {str(e)}")
+            return
+            
+        def read_tables(task):
+            if catalog is not None:
+                task.report(0, f"正在读取参考表目录 {catalog}...", force=True)
+                _, sku_data, cost_data = self.reference_catalog.tables(catalog)
+                return sku_data, cost_data
                 
-                if title_cell.value and sku_cell.value:
-                    clean_title = self.clean_text(str(title_cell.value))
-                    clean_sku = self.clean_sku(str(sku_cell.value))
-                    sku_data[clean_title] = clean_sku
-            
-            self.progress_var.set(50)
-            self.root.update()
-            
-            # 加载成本数据
-            cost_sheet = self.workbook[self.cost_sheet_var.get()]
-            cost_data = {}
-            cost_sku_col_num = openpyxl.utils.column_index_from_string(self.cost_sku_col_var.get())
-            cost_col_num = openpyxl.utils.column_index_from_string(self.cost_col_var.get())
-            
-            for row in range(2, cost_sheet.max_row + 1):
-                sku_cell = cost_sheet.cell(row=row, column=cost_sku_col_num)
-                cost_cell = cost_sheet.cell(row=row, column=cost_col_num)
+            # 与加载数据相同，以只读模式流式读取配置的两列，工作表未变化时使用磁盘缓存
+            reader = WorkbookReader(file_path, index_cache=self.lookup_index_cache)
+            
+            def source_reader(reference_file):
+                # 与处理时读取的数据相同：选择了参考表文件时按列读取该文件，否则读取工作簿
+                if not reference_file:
+                    return reader
+                return ReferenceFileReader(reference_file, reference_format(reference_file),
+                                           os.path.basename(reference_file))
                 
-                if sku_cell.value and cost_cell.value:
-                    clean_sku = self.clean_sku(str(sku_cell.value))
-                    cost_data[clean_sku] = str(cost_cell.value)
-            
-            self.progress_var.set(100)
-            self.root.update()
-            
-            # 分析数据一致性
-            sku_values = set(sku_data.values())
-            cost_keys = set(cost_data.keys())
-            
-            matched_skus = sku_values.intersection(cost_keys)
-            unmatched_skus = sku_values - cost_keys
-            unused_cost_skus = cost_keys - sku_values
+            # 第1行为表头，从第2行开始读取，表头不计入SKU
+            try:
+                task.report(0, "正在读取SKU数据...", force=True)
+                sku_data, _ = source_reader(sku_file).lookup_table(*sku_source, clean_text, clean_sku, min_row=2)
+                task.checkpoint()
+                task.report(50, "正在读取成本数据...", force=True)
+                cost_data, _ = source_reader(cost_file).lookup_table(*cost_source, clean_text, clean_sku, min_row=2)
+            finally:
+                reader.close()
+            return sku_data, cost_data
+            
+        def work(task):
+            sku_data, cost_data = read_tables(task)
+            # 标题、SKU或成本为空的行不参与比较
+            sku_data = {title: sku for title, sku in sku_data.items() if sku}
+            cost_data = {sku: cost for sku, cost in cost_data.items() if cost}
+            
+            # 分析数据一致性，同时构建 SKU→标题 的反向索引
+            task.checkpoint()
+            analysis = analyze_consistency(sku_data, cost_data)
+            task.report(100, force=True)
+            return sku_data, cost_data, analysis
+            
+        def on_done(result):
+            sku_data, cost_data, analysis = result
             
             # 显示检查结果窗口
-            self.show_consistency_report(sku_data, cost_data, matched_skus, unmatched_skus, unused_cost_skus)
+            self.show_consistency_report(sku_data, cost_data, analysis)
             
-            self.status_var.set(f"数据检查完成 - 匹配: {len(matched_skus)}, 不匹配: {len(unmatched_skus)}")
+            self.status_var.set(f"数据检查完成 - 匹配: {len(analysis['matched'])}, 不匹配: {len(analysis['unmatched'])}")
             
-        except Exception as e:
-            messagebox.showerror("错误", f"数据检查失败: {str(e)}")
-            self.status_var.set("数据检查失败")
+        self.run_task(work, on_done, "数据检查")
             
-    def show_consistency_report(self, sku_data, cost_data, matched_skus, unmatched_skus, unused_cost_skus):
+    def show_consistency_report(self, sku_data, cost_data, analysis):
         """显示数据一致性报告"""
+        sku_titles = analysis['sku_titles']
+        matched_skus = analysis['matched']
+        unmatched_skus = analysis['unmatched']
+        unused_cost_skus = analysis['unused']
+        
         report_window = tk.Toplevel(self.root)
         report_window.title("数据一致性检查报告")
         report_window.geometry("800x600")
@@ -1172,12 +1506,13 @@ A6: 检查项目：
         overview_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         overview_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        match_rate = len(matched_skus) / len(sku_titles) * 100 if sku_titles else 0
         overview_info = f"""数据一致性检查报告
 {'='*50}
 
 SKU数据源统计:
 - 总数据条数: {len(sku_data)}
-- 唯一SKU数量: {len(set(sku_data.values()))}
+- 唯一SKU数量: {len(sku_titles)}
 
 成本数据源统计:
 - 总数据条数: {len(cost_data)}
@@ -1188,7 +1523,7 @@ SKU数据源统计:
 - 不匹配的SKU: {len(unmatched_skus)} 个
 - 未使用的成本SKU: {len(unused_cost_skus)} 个
 
-匹配率: {len(matched_skus) / len(set(sku_data.values())) * 100:.1f}%
+匹配率: {match_rate:.1f}%
 
 建议:
 1. 如果匹配率低于80%，建议检查SKU格式是否一致
@@ -1199,83 +1534,85 @@ SKU数据源统计:
         overview_text.insert(tk.END, overview_info)
         overview_text.config(state=tk.DISABLED)
         
+        def titles_line(sku):
+            titles = sku_titles.get(sku, [])
+            if len(titles) > 1:
+                return f"标题: {titles[0]}（共{len(titles)}个标题）\n"
+            return f"标题: {titles[0] if titles else '未知'}\n"
+        
         # 不匹配SKU标签页
         if unmatched_skus:
-            unmatched_frame = ttk.Frame(notebook)
-            notebook.add(unmatched_frame, text=f"不匹配SKU ({len(unmatched_skus)})")
-            
-            unmatched_text = tk.Text(unmatched_frame, wrap=tk.WORD, font=("微软雅黑", 9))
-            unmatched_scrollbar = tk.Scrollbar(unmatched_frame, orient=tk.VERTICAL, command=unmatched_text.yview)
-            unmatched_text.configure(yscrollcommand=unmatched_scrollbar.set)
+            def format_unmatched(sku):
+                return (f"SKU: {sku}\n" + titles_line(sku) +
+                        "问题: 在成本数据源中未找到此SKU\n" + "-" * 30 + "\n")
             
-            unmatched_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            unmatched_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            unmatched_info = "不匹配的SKU列表:\n" + "="*50 + "\n\n"
-            for sku in sorted(unmatched_skus):
-                # 找到对应的标题
-                titles = [title for title, s in sku_data.items() if s == sku]
-                unmatched_info += f"SKU: {sku}\n"
-                unmatched_info += f"标题: {titles[0] if titles else '未知'}\n"
-                unmatched_info += f"问题: 在成本数据源中未找到此SKU\n"
-                unmatched_info += "-" * 30 + "\n"
-            
-            unmatched_text.insert(tk.END, unmatched_info)
-            unmatched_text.config(state=tk.DISABLED)
+            self.add_paged_tab(notebook, f"不匹配SKU ({len(unmatched_skus)})", "不匹配的SKU列表:",
+                               unmatched_skus, format_unmatched)
         
         # 未使用成本SKU标签页
         if unused_cost_skus:
-            unused_frame = ttk.Frame(notebook)
-            notebook.add(unused_frame, text=f"未使用成本SKU ({len(unused_cost_skus)})")
-            
-            unused_text = tk.Text(unused_frame, wrap=tk.WORD, font=("微软雅黑", 9))
-            unused_scrollbar = tk.Scrollbar(unused_frame, orient=tk.VERTICAL, command=unused_text.yview)
-            unused_text.configure(yscrollcommand=unused_scrollbar.set)
-            
-            unused_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            unused_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            unused_info = "未使用的成本SKU列表:\n" + "="*50 + "\n\n"
-            for sku in sorted(list(unused_cost_skus)[:50]):  # 只显示前50个
-                cost_value = cost_data.get(sku, '未知')
-                unused_info += f"SKU: {sku}\n"
-                unused_info += f"成本: {cost_value}\n"
-                unused_info += f"问题: 在SKU数据源中未找到此SKU\n"
-                unused_info += "-" * 30 + "\n"
-            
-            if len(unused_cost_skus) > 50:
-                unused_info += f"\n... 还有 {len(unused_cost_skus) - 50} 个未显示的SKU"
+            def format_unused(sku):
+                return (f"SKU: {sku}\n" + f"成本: {cost_data.get(sku, '未知')}\n" +
+                        "问题: 在SKU数据源中未找到此SKU\n" + "-" * 30 + "\n")
             
-            unused_text.insert(tk.END, unused_info)
-            unused_text.config(state=tk.DISABLED)
+            self.add_paged_tab(notebook, f"未使用成本SKU ({len(unused_cost_skus)})", "未使用的成本SKU列表:",
+                               unused_cost_skus, format_unused)
         
-        # 匹配示例标签页
+        # 匹配SKU标签页
         if matched_skus:
-            matched_frame = ttk.Frame(notebook)
-            notebook.add(matched_frame, text=f"匹配示例 ({len(matched_skus)})")
-            
-            matched_text = tk.Text(matched_frame, wrap=tk.WORD, font=("微软雅黑", 9))
-            matched_scrollbar = tk.Scrollbar(matched_frame, orient=tk.VERTICAL, command=matched_text.yview)
-            matched_text.configure(yscrollcommand=matched_scrollbar.set)
-            
-            matched_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            matched_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            matched_info = "成功匹配的SKU示例:\n" + "="*50 + "\n\n"
-            for sku in sorted(list(matched_skus)[:20]):  # 只显示前20个
-                titles = [title for title, s in sku_data.items() if s == sku]
-                cost_value = cost_data.get(sku, '未知')
-                matched_info += f"SKU: {sku}\n"
-                matched_info += f"标题: {titles[0] if titles else '未知'}\n"
-                matched_info += f"成本: {cost_value}\n"
-                matched_info += "状态: ✓ 匹配成功\n"
-                matched_info += "-" * 30 + "\n"
-            
-            if len(matched_skus) > 20:
-                matched_info += f"\n... 还有 {len(matched_skus) - 20} 个匹配的SKU"
-            
-            matched_text.insert(tk.END, matched_info)
-            matched_text.config(state=tk.DISABLED)
+            def format_matched(sku):
+                return (f"SKU: {sku}\n" + titles_line(sku) + f"成本: {cost_data.get(sku, '未知')}\n" +
+                        "状态: ✓ 匹配成功\n" + "-" * 30 + "\n")
+            
+            self.add_paged_tab(notebook, f"匹配SKU ({len(matched_skus)})", "成功匹配的SKU列表:",
+                               matched_skus, format_matched)
+            
+    # 报告中每页显示的条目数
+    REPORT_PAGE_SIZE = 200
+    
+    def add_paged_tab(self, notebook, tab_text, heading, items, format_item):
+        """添加分页显示的报告标签页，切换页面时才格式化当前页的条目"""
+        frame = ttk.Frame(notebook)
+        notebook.add(frame, text=tab_text)
+        
+        nav_frame = tk.Frame(frame)
+        nav_frame.pack(side=tk.BOTTOM, fill='x', pady=(5, 0))
+        
+        text = tk.Text(frame, wrap=tk.WORD, font=("微软雅黑", 9))
+        scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        page_size = self.REPORT_PAGE_SIZE
+        page_count = max((len(items) + page_size - 1) // page_size, 1)
+        page_var = tk.StringVar()
+        current = [0]
+        
+        def show_page(page):
+            current[0] = min(max(page, 0), page_count - 1)
+            start = current[0] * page_size
+            page_items = items[start:start + page_size]
+            content = f"{heading}\n" + "=" * 50 + "\n\n" + "".join(format_item(item) for item in page_items)
+            text.config(state=tk.NORMAL)
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, content)
+            text.config(state=tk.DISABLED)
+            text.yview_moveto(0)
+            page_var.set(f"第 {current[0] + 1}/{page_count} 页（第{start + 1}-{start + len(page_items)}条，共{len(items)}条）")
+            prev_btn.config(state=tk.NORMAL if current[0] > 0 else tk.DISABLED)
+            next_btn.config(state=tk.NORMAL if current[0] < page_count - 1 else tk.DISABLED)
+        
+        prev_btn = tk.Button(nav_frame, text="上一页", font=self.font_small,
+                             command=lambda: show_page(current[0] - 1))
+        prev_btn.pack(side='left', padx=5)
+        next_btn = tk.Button(nav_frame, text="下一页", font=self.font_small,
+                             command=lambda: show_page(current[0] + 1))
+        next_btn.pack(side='left', padx=5)
+        tk.Label(nav_frame, textvariable=page_var, font=self.font_small).pack(side='left', padx=10)
+        
+        show_page(0)
 
 def main():
     root = tk.Tk()
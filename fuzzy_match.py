@@ -0,0 +1,167 @@
+"""未找到SKU的标题的模糊匹配
+
+精确查找（clean_text 之后完全相同）失败的标题，可以再用三元组（连续3个字符）倒排索引查找相似的
+SKU表标题。索引对SKU表的标题只构建一次；查询时按文档频率从低到高只取查询标题最稀有的一部分三元组
+收集候选（前缀过滤），再用 Dice 系数 2|A∩B| / (|A|+|B|) 精确打分，因此每次查询只访问少量倒排链，
+不随SKU表的行数线性增长。
+
+前缀长度由阈值决定：Dice ≥ t 要求重叠数 ≥ t·|A| / (2 - t)，相似的标题必然至少包含最稀有的
+|A| - 最小重叠数 + 1 个三元组之一。候选在前缀中的命中次数加上其余三元组的个数是重叠数的上界，
+达不到 t·(|A|+|B|) / 2 的候选不再精确打分。
+"""
+import math
+from array import array
+from collections import Counter
+
+from text_normalize import clean_text
+
+NGRAM = 3
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_CANDIDATES = 3
+MAX_CANDIDATES = 10
+
+
+def title_grams(title):
+    """返回标题的三元组集合，比较时不区分大小写，首尾补空格使短标题也有足够的三元组"""
+    text = f" {title.casefold()} "
+    if len(text) < NGRAM:
+        return {text}
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TrigramIndex:
+    """SKU表标题的三元组倒排索引
+
+    titles 为清理后的标题列表，values 为对应的SKU；倒排链保存标题下标，用 array 紧凑存储。
+    """
+
+    def __init__(self, titles, values):
+        self.titles = list(titles)
+        self.values = list(values)
+        postings = {}
+        self._sizes = array('i')
+        for title_id, title in enumerate(self.titles):
+            grams = title_grams(title)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(title_id)
+        self._postings = {gram: array('i', ids) for gram, ids in postings.items()}
+
+    @classmethod
+    def from_lookup(cls, sku_data):
+        """从 {清理后的标题: SKU} 字典构建"""
+        return cls(sku_data.keys(), sku_data.values())
+
+    def __len__(self):
+        return len(self.titles)
+
+    def search(self, title, threshold=DEFAULT_THRESHOLD, limit=DEFAULT_CANDIDATES):
+        """返回相似度不低于 threshold 的 [(标题, SKU, 相似度)]，按相似度从高到低，最多 limit 个"""
+        grams = title_grams(title)
+        size = len(grams)
+        min_overlap = max(1, math.ceil(threshold * size / (2 - threshold)))
+        # 长度过滤：Dice ≥ t 时候选标题的三元组个数在 [t/(2-t)·|A|, (2-t)/t·|A|] 之间
+        min_size = threshold * size / (2 - threshold)
+        max_size = (2 - threshold) * size / threshold
+
+        # 只用最稀有的前缀三元组收集候选；索引中没有的三元组最稀有，占用前缀但没有候选
+        known = sorted((len(self._postings[gram]), gram) for gram in grams if gram in self._postings)
+        prefix = max(size - min_overlap + 1 - (size - len(known)), 0)
+        counts = Counter()
+        for _, gram in known[:prefix]:
+            counts.update(self._postings[gram])
+        rest = len(known) - prefix
+
+        scored = []
+        for title_id, count in counts.items():
+            other_size = self._sizes[title_id]
+            if not min_size <= other_size <= max_size or count + rest < threshold * (size + other_size) / 2 - 1e-9:
+                continue
+            other = title_grams(self.titles[title_id])
+            score = 2 * len(grams & other) / (size + other_size)
+            if score >= threshold:
+                scored.append((score, title_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.titles[title_id], self.values[title_id], round(score, 4))
+                for score, title_id in scored[:limit]]
+
+
+def parse_fuzzy_options(fuzzy):
+    """校验模糊匹配配置，未开启时返回 None；配置错误时抛出 ValueError
+
+    fuzzy: {"threshold": 候选的最低相似度, "candidates": 每行最多候选数,
+            "accept_threshold": 最佳候选达到该相似度时直接填入SKU和成本（缺省不填）}
+    """
+    if not fuzzy:
+        return None
+    if fuzzy is True:
+        fuzzy = {}
+    if not isinstance(fuzzy, dict):
+        raise ValueError("fuzzy 必须是对象或 true")
+    try:
+        threshold = float(fuzzy.get('threshold', DEFAULT_THRESHOLD))
+        candidates = int(fuzzy.get('candidates', DEFAULT_CANDIDATES))
+        accept_threshold = fuzzy.get('accept_threshold')
+        if accept_threshold is not None:
+            accept_threshold = float(accept_threshold)
+    except (TypeError, ValueError):
+        raise ValueError("fuzzy 的 threshold、accept_threshold 必须是数字，candidates 必须是整数")
+    if not 0 < threshold <= 1:
+        raise ValueError("fuzzy.threshold 必须在 0 到 1 之间")
+    if not 1 <= candidates <= MAX_CANDIDATES:
+        raise ValueError(f"fuzzy.candidates 必须在 1 到 {MAX_CANDIDATES} 之间")
+    if accept_threshold is not None and not threshold <= accept_threshold <= 1:
+        raise ValueError("fuzzy.accept_threshold 必须在 threshold 到 1 之间")
+    return {'threshold': threshold, 'candidates': candidates, 'accept_threshold': accept_threshold}
+
+
+def format_candidates(candidates):
+    """旁注列的文字：每个候选为 "SKU ← 标题 (相似度)"，用分号分隔"""
+    return '; '.join(f"{sku} ← {title} ({score:.2f})" for title, sku, score in candidates)
+
+
+def match_missing(titles, rows, index, fuzzy, lookup_cost, sku_col, cost_col, note_col=None):
+    """对精确查找失败的行做模糊匹配，返回 (需要写回的单元格, 报告)
+
+    rows 为未找到SKU的行号；lookup_cost(sku) 返回成本或 None，用于直接采用的候选。
+    报告按标题去重：{"rows": 检查的行数, "matched": 有候选的行数, "accepted": 直接采用的行数,
+    "matches": [{"title", "rows", "candidates": [{"title", "sku", "score"}]}]}
+    """
+    updates = {}
+    results = {}
+    matched = 0
+    accepted = 0
+    accept_threshold = fuzzy['accept_threshold']
+
+    for row in rows:
+        title = clean_text(titles[row - 1])
+        if title not in results:
+            results[title] = {"rows": [], "candidates": index.search(title, fuzzy['threshold'],
+                                                                   fuzzy['candidates'])}
+        entry = results[title]
+        entry['rows'].append(row)
+        candidates = entry['candidates']
+        if not candidates:
+            continue
+        matched += 1
+        if note_col is not None:
+            updates[(row, note_col)] = format_candidates(candidates)
+        _, best_sku, best_score = candidates[0]
+        if accept_threshold is not None and best_score >= accept_threshold:
+            accepted += 1
+            updates[(row, sku_col)] = best_sku
+            cost = lookup_cost(best_sku)
+            if cost is not None:
+                updates[(row, cost_col)] = cost
+
+    report = {
+        "rows": len(rows),
+        "matched": matched,
+        "accepted": accepted,
+        "matches": [
+            {"title": title, "rows": entry['rows'],
+             "candidates": [{"title": t, "sku": sku, "score": score} for t, sku, score in entry['candidates']]}
+            for title, entry in results.items() if entry['candidates']
+        ],
+    }
+    return updates, report
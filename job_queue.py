@@ -0,0 +1,324 @@
+"""异步处理任务
+
+/api/jobs 把处理请求放入有界的进程池，立即返回任务ID，客户端轮询任务状态并在完成后下载结果。
+大文件的解析和写回在独立的工作进程中进行，不占用 Web 请求的处理时间，也不受请求超时限制。
+
+任务的输入和状态文件保存在任务目录中（状态为 <任务ID>.json），完成后的输出文件移入 ResultStore，
+因此请求落到同一台机器上的其他 gunicorn 工作进程时同样可以查询状态和下载结果。
+任务目录与查找表缓存一样必须属于当前用户且其他用户不可写（默认 excel_jobs-<uid>，权限 0700），否则不接受任务。
+"""
+import json
+import multiprocessing
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lookup_cache import LookupIndexCache, _private_dir, _user_temp_dir
+from metrics import StageTimer
+from processing import process_workbook
+from reference_catalog import ReferenceCatalog
+from reference_files import ReferenceFileReader
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# 独立参考表文件在任务目录中的文件名后缀
+REFERENCE_SUFFIXES = {'sku_config': '.sku.ref', 'cost_config': '.cost.ref'}
+
+# 工作进程内的进度队列、参考表缓存和参考表目录，由进程池的 initializer 设置
+_progress_queue = None
+_index_cache = None
+_catalog = None
+
+
+class JobQueueFull(Exception):
+    """排队中的任务已达上限"""
+
+
+def _init_worker(progress_queue, cache_dir, cache_max_entries, catalog_path):
+    global _progress_queue, _index_cache, _catalog
+    _progress_queue = progress_queue
+    _index_cache = LookupIndexCache(cache_dir, cache_max_entries)
+    _catalog = ReferenceCatalog(catalog_path)
+
+
+def _run_job(job_id, input_path, output_path, options, reference_files=None):
+    """在工作进程中执行一个任务，返回结果统计
+
+    reference_files 为 {配置名: (路径, 格式, 原文件名)}，对应 /api/process 的 sku_file、cost_file。
+    """
+    last_report = [0.0]
+
+    def report(percent, message):
+        # 限制进度消息频率，避免进度队列被大量消息占满
+        now = time.monotonic()
+        if now - last_report[0] >= 0.5 or percent in (0, 100):
+            last_report[0] = now
+            _progress_queue.put((job_id, percent, message))
+
+    report(0, "开始处理")
+    timer = StageTimer()
+    sources = {name: ReferenceFileReader(path, fmt, filename)
+               for name, (path, fmt, filename) in (reference_files or {}).items()}
+    with open(output_path, 'wb') as f:
+        result, _ = process_workbook(input_path, options, index_cache=_index_cache, report=report, output=f,
+                                     sources=sources, catalog=_catalog, timer=timer)
+    # 各阶段耗时（毫秒），run 为工作进程中的总耗时
+    result['timings'] = dict(timer.to_dict(), run=round(timer.elapsed() * 1000, 3))
+    return result
+
+
+class Job:
+    """一个异步处理任务"""
+
+    def __init__(self, job_id, filename):
+        self.job_id = job_id
+        self.filename = filename
+        self.state = JOB_QUEUED
+        self.progress = 0
+        self.message = "排队中"
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.result_id = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "progress": self.progress,
+            "message": self.message,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "result_id": self.result_id,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """有界进程池上的任务队列
+
+    max_workers 为同时处理的任务数，max_queue 为等待中的任务上限，超过时 submit 抛出 JobQueueFull。
+    输出文件保存到 result_store；任务状态在结束 ttl_seconds 秒后删除。
+    catalog_path 为参考表目录的 SQLite 文件，工作进程各自打开。
+    metrics 为可选的 MetricsRegistry，任务完成时记录各阶段耗时和排队时间。
+    """
+
+    def __init__(self, result_store, job_dir=None, max_workers=2, max_queue=8, ttl_seconds=3600,
+                 cache_dir=None, cache_max_entries=64, catalog_path=None, metrics=None):
+        self.result_store = result_store
+        self.job_dir = job_dir or _user_temp_dir('excel_jobs')
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.cache_max_entries = cache_max_entries
+        self.catalog_path = catalog_path
+        self.metrics = metrics
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+
+    # ---- 进程池 ----
+
+    def _ensure_executor(self):
+        # 第一次提交任务时才创建进程池；使用 spawn 避免在多线程的 Web 进程中 fork
+        if self._executor is None:
+            context = multiprocessing.get_context('spawn')
+            self._progress_queue = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context, initializer=_init_worker,
+                initargs=(self._progress_queue, self.cache_dir, self.cache_max_entries, self.catalog_path))
+            threading.Thread(target=self._drain_progress, daemon=True).start()
+
+    def _drain_progress(self):
+        while True:
+            job_id, percent, message = self._progress_queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.state not in (JOB_QUEUED, JOB_RUNNING):
+                    continue
+                job.state = JOB_RUNNING
+                job.progress = percent
+                job.message = message
+                self._save(job)
+
+    # ---- 文件 ----
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.job_dir, f"{job_id}{suffix}")
+
+    def input_path(self, job_id):
+        return self._path(job_id, '.input.xlsx')
+
+    def output_path(self, job_id):
+        return self._path(job_id, '.xlsx')
+
+    def _save(self, job):
+        temp_path = self._path(job.job_id, '.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(temp_path, self._path(job.job_id, '.json'))
+
+    def _remove_files(self, job_id):
+        for suffix in ('.json', '.input.xlsx', '.xlsx', *REFERENCE_SUFFIXES.values()):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except OSError:
+                pass
+
+    def _expire(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._remove_files(job_id)
+
+    def _sweep(self, now):
+        # 清理已退出的工作进程遗留的任务文件（超过两倍 TTL 未修改）
+        try:
+            names = os.listdir(self.job_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.job_dir, name)
+            try:
+                if now - os.path.getmtime(path) > 2 * self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # ---- 接口 ----
+
+    def submit(self, source, options, filename=None, sources=None):
+        """保存输入文件并提交任务，source 为二进制文件对象，返回 Job
+
+        sources 为可选的 {配置名: ReferenceFileReader}，参考表文件同样保存到任务目录。
+        """
+        now = time.time()
+        self._sweep(now)
+        with self._lock:
+            self._expire(now)
+            pending = sum(1 for job in self._jobs.values() if job.state in (JOB_QUEUED, JOB_RUNNING))
+            if pending >= self.max_workers + self.max_queue:
+                raise JobQueueFull()
+            job = Job(secrets.token_hex(16), filename)
+            self._jobs[job.job_id] = job
+
+        try:
+            if not _private_dir(self.job_dir):
+                raise PermissionError(f"任务目录不可安全使用: {self.job_dir}")
+            source.seek(0)
+            with open(self.input_path(job.job_id), 'wb') as f:
+                shutil.copyfileobj(source, f)
+            reference_files = {}
+            for name, reader in (sources or {}).items():
+                path = self._path(job.job_id, REFERENCE_SUFFIXES[name])
+                reader.source.seek(0)
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(reader.source, f)
+                reference_files[name] = (path, reader.fmt, reader.filename)
+            with self._lock:
+                self._save(job)
+                self._ensure_executor()
+            future = self._executor.submit(_run_job, job.job_id, self.input_path(job.job_id),
+                                           self.output_path(job.job_id), options, reference_files)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            self._remove_files(job.job_id)
+            raise
+        future.add_done_callback(lambda f: self._finish(job.job_id, f))
+        return job
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+        finished_at = time.time()
+        error = None
+        try:
+            result = future.result()
+            # 在锁外把输出文件移入结果存储，移动大文件时不阻塞进度更新和状态查询；
+            # 结果超过存储上限时任务记为失败
+            result_id = self.result_store.put_file(self.output_path(job_id), job.filename)
+        except Exception as e:
+            error = e
+        with self._lock:
+            job.finished_at = finished_at
+            if error is not None:
+                job.state = JOB_FAILED
+                job.error = str(error)
+                job.message = "处理失败"
+                if isinstance(error, BrokenProcessPool):
+                    # 工作进程异常退出后进程池不可再用，下次提交时重新创建
+                    self._executor = None
+            else:
+                job.result_id = result_id
+                job.result = result
+                job.state = JOB_DONE
+                job.progress = 100
+                job.message = "处理完成"
+                if self.metrics is not None:
+                    timings = dict(result.get('timings', {}))
+                    # 提交到完成的时间减去工作进程中的耗时即为排队时间
+                    total_ms = (job.finished_at - job.created_at) * 1000
+                    timings['queue_wait'] = max(total_ms - timings.get('run', total_ms), 0.0)
+                    self.metrics.observe_stages('/api/jobs', timings, result.get('processed_rows'))
+            self._save(job)
+        for path in (self.input_path(job_id), self.output_path(job_id),
+                     *(self._path(job_id, suffix) for suffix in REFERENCE_SUFFIXES.values())):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, job_id):
+        """返回任务状态字典，不存在或已过期时返回 None
+
+        本进程提交的任务直接读内存，其他工作进程提交的任务读状态文件。
+        """
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        if not _private_dir(self.job_dir):
+            return None
+        try:
+            with open(self._path(job_id, '.json'), encoding='utf-8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if status['finished_at'] is not None and now - status['finished_at'] > self.ttl_seconds:
+            return None
+        return status
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        running = states.count(JOB_RUNNING)
+        queued = states.count(JOB_QUEUED)
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queued": queued,
+            # 忙碌的工作进程比例和排队位置的占用比例，排队占满时新任务返回 503
+            "saturation": round(running / self.max_workers, 3) if self.max_workers else 0,
+            "queue_saturation": round(queued / self.max_queue, 3) if self.max_queue else 0,
+        }
@@ -0,0 +1,227 @@
+"""查找表的磁盘缓存
+
+SKU表和成本表很少变化，而 zip 中央目录已经记录了每个工作表部件的 CRC32，
+不解析工作表就能判断它是否改变。这里把 load_sheet_data 构建的字典按
+(工作表部件CRC, 键列, 值列, 清理规则版本) 缓存到磁盘，命中时跳过解析。
+
+工作表 XML 中字符串只保存 sharedStrings 的下标、日期只保存样式下标，
+因此部件CRC相同还不够：缓存条目同时记录被引用的共享字符串内容摘要和日期样式下标，
+命中前逐一校验，保证返回的字典与重新解析的结果一致。
+
+条目以 JSON 保存（查找表只含字符串、数字和 None），读取缓存不会执行代码；
+缓存目录必须属于当前用户且其他用户不可写，否则不使用缓存，避免其他本地用户写入伪造的查找表。
+默认目录为系统临时目录下按用户区分的 excel_lookup_cache-<uid>，权限 0700。
+"""
+import hashlib
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from array import array
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+from text_normalize import CLEAN_VERSION
+from xlsx_patch import NS_MAIN, XlsxPatchError, resolve_sheet_parts, resolve_workbook_part
+
+SHARED_STRING_REF_RE = re.compile(rb'\bt="s"[^>]*><v>(\d+)</v>')
+STRING_ITEM_RE = re.compile(rb'<si>.*?</si>|<si/>', re.S)
+
+
+def _shared_string_indices(sheet_xml):
+    """返回工作表引用的共享字符串下标（升序去重）"""
+    indices = sorted({int(match.group(1)) for match in SHARED_STRING_REF_RE.finditer(sheet_xml)})
+    return array('I', indices)
+
+
+def _shared_strings_digest(zf, indices):
+    """计算指定下标的共享字符串原始内容摘要，下标越界时返回 None"""
+    digest = hashlib.sha256()
+    if not indices:
+        return digest.hexdigest()
+
+    part = resolve_workbook_part(zf, 'sharedStrings')
+    if part is None:
+        return None
+    wanted = iter(indices)
+    target = next(wanted)
+    for position, match in enumerate(STRING_ITEM_RE.finditer(zf.read(part))):
+        if position == target:
+            digest.update(b'%d:' % position)
+            digest.update(match.group(0))
+            target = next(wanted, None)
+            if target is None:
+                return digest.hexdigest()
+    return None
+
+
+def _date_style_indices(zf):
+    """返回 (cellXfs 数量, 日期格式的样式下标集合)"""
+    part = resolve_workbook_part(zf, 'styles')
+    if part is None:
+        return 0, frozenset()
+    root = ET.fromstring(zf.read(part))
+
+    custom_formats = {}
+    num_fmts = root.find(f'{{{NS_MAIN}}}numFmts')
+    if num_fmts is not None:
+        for fmt in num_fmts.findall(f'{{{NS_MAIN}}}numFmt'):
+            custom_formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+
+    cell_xfs = root.find(f'{{{NS_MAIN}}}cellXfs')
+    if cell_xfs is None:
+        return 0, frozenset()
+    dates = set()
+    xfs = cell_xfs.findall(f'{{{NS_MAIN}}}xf')
+    for index, xf in enumerate(xfs):
+        fmt_id = int(xf.get('numFmtId', 0))
+        code = custom_formats.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+        if code and is_date_format(code):
+            dates.add(index)
+    return len(xfs), frozenset(dates)
+
+
+def _user_temp_dir(name):
+    """系统临时目录下按用户区分的目录路径 <name>-<uid>"""
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(tempfile.gettempdir(), f'{name}-{user}')
+
+
+def _default_cache_dir():
+    return _user_temp_dir('excel_lookup_cache')
+
+
+def _private_dir(path):
+    """创建缓存目录（0700）并检查它可以安全使用：是目录而不是符号链接、属于当前用户、其他用户不可写"""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False
+    if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        return False
+    return True
+
+
+class LookupIndexCache:
+    """以 JSON 文件保存在本地私有目录中的查找表缓存"""
+
+    def __init__(self, cache_dir=None, max_entries=64):
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.max_entries = max_entries
+        # 第一次使用时检查目录，None 表示尚未检查
+        self._usable = None
+
+    def usable(self):
+        """缓存目录是否可以安全使用；不可用时 load 直接构建，不读写缓存"""
+        if self._usable is None:
+            self._usable = _private_dir(self.cache_dir)
+        return self._usable
+
+    def _entry_path(self, info, key_col, value_col, min_row=1):
+        rows = f"-r{min_row}" if min_row != 1 else ""
+        name = f"{info.CRC:08x}-{info.file_size}-{key_col}-{value_col}{rows}-v{CLEAN_VERSION}.json"
+        return os.path.join(self.cache_dir, name)
+
+    def _read_entry(self, path):
+        try:
+            with open(path, 'rb') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get('data'), dict):
+            return None
+        return entry
+
+    def _write_entry(self, path, entry):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, path)
+            self._prune()
+        except (OSError, TypeError, ValueError):
+            # 缓存写入失败不影响处理结果
+            pass
+
+    def _prune(self):
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                   if name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _is_valid(self, zf, entry):
+        try:
+            return self._matches(zf, entry)
+        except (KeyError, TypeError, ValueError):
+            # 字段缺失或类型不对的条目视为未命中
+            return False
+
+    def _matches(self, zf, entry):
+        if entry.get('version') != CLEAN_VERSION:
+            return False
+        if _shared_strings_digest(zf, entry['string_indices']) != entry['strings_digest']:
+            return False
+        xf_count, date_styles = _date_style_indices(zf)
+        if xf_count < entry['xf_count']:
+            return False
+        current = frozenset(index for index in date_styles if index < entry['xf_count'])
+        return current == frozenset(entry['date_styles'])
+
+    def load(self, source, sheet_name, key_col, value_col, build, min_row=1):
+        """返回 (data, stats)，缓存未命中时调用 build() -> (data, stats) 构建并写入缓存
+
+        source 为工作簿路径或可 seek 的二进制文件对象；min_row 为查找表开始的行号，不同时分别缓存。
+        """
+        if not self.usable():
+            return build()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        with zipfile.ZipFile(source) as zf:
+            try:
+                parts = resolve_sheet_parts(zf)
+            except XlsxPatchError:
+                # 包关系中找不到工作簿部件时不使用缓存，由 build 读取或报告错误
+                return build()
+            if sheet_name not in parts:
+                raise KeyError(f"Worksheet {sheet_name} does not exist.")
+            part = parts[sheet_name]
+            info = zf.getinfo(part)
+            path = self._entry_path(info, key_col, value_col, min_row)
+
+            start = time.perf_counter()
+            entry = self._read_entry(path)
+            if entry is not None and self._is_valid(zf, entry):
+                os.utime(path)
+                stats = dict(entry['stats'], disk_cache=True,
+                             seconds=round(time.perf_counter() - start, 4))
+                return entry['data'], stats
+
+            data, stats = build()
+
+            indices = _shared_string_indices(zf.read(part))
+            xf_count, date_styles = _date_style_indices(zf)
+            strings_digest = _shared_strings_digest(zf, indices)
+            if strings_digest is not None:
+                self._write_entry(path, {
+                    'version': CLEAN_VERSION,
+                    'string_indices': indices.tolist(),
+                    'strings_digest': strings_digest,
+                    'xf_count': xf_count,
+                    'date_styles': sorted(date_styles),
+                    'data': data,
+                    'stats': stats,
+                })
+            return data, stats
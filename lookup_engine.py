@@ -0,0 +1,213 @@
+"""标题 → SKU → 成本 查找引擎
+
+lookup_rows 是逐行字典查找的实现；lookup_rows_pandas 把三张表的相关列载入 pandas，
+对去重后的值批量清理文本，以哈希连接完成查找，结果与逐行实现完全一致。
+两者都返回需要写回的单元格 {(行, 列): 值} 和统计信息。
+"""
+import numpy as np
+import pandas as pd
+
+from text_normalize import clean_text, clean_sku, memoize, normalize_many
+
+NOT_FOUND_SKU = "未找到SKU"
+NOT_FOUND_COST = "未找到成本"
+
+
+AUTO_END_ROW = 'auto'
+
+
+def _has_title(value):
+    return bool(value and str(value).strip())
+
+
+def resolve_row_range(titles, start_row, end_row=AUTO_END_ROW, blank_limit=None):
+    """确定实际扫描的行范围，返回 {"start_row", "end_row", "stopped_by"}
+
+    end_row 为 "auto" 时扫描到标题列最后一个非空单元格；blank_limit 大于0时，
+    连续遇到 blank_limit 个空标题就在该行停止。stopped_by 为 "end_row"、"data_end" 或 "blank_rows"。
+    """
+    if end_row == AUTO_END_ROW:
+        last = len(titles)
+        while last >= start_row and not _has_title(titles[last - 1]):
+            last -= 1
+        end_row, stopped_by = last, "data_end"
+    else:
+        stopped_by = "end_row"
+
+    if blank_limit and blank_limit > 0:
+        blanks = 0
+        for row in range(start_row, min(end_row, len(titles)) + 1):
+            if _has_title(titles[row - 1]):
+                blanks = 0
+                continue
+            blanks += 1
+            if blanks >= blank_limit:
+                end_row, stopped_by = row, "blank_rows"
+                break
+        else:
+            # 工作表末尾之后的行都视为空标题
+            stop_row = max(len(titles), start_row - 1) + blank_limit - blanks
+            if stop_row < end_row:
+                end_row, stopped_by = stop_row, "blank_rows"
+
+    end_row = max(end_row, start_row - 1)
+    return {"start_row": start_row, "end_row": end_row, "stopped_by": stopped_by}
+
+
+# lookup_rows 调用 on_progress 的间隔行数
+PROGRESS_EVERY = 1000
+
+
+def lookup_rows(titles, start_row, end_row, sku_data, cost_data, sku_col, cost_col,
+                on_progress=None):
+    """逐行查找，titles 为整列标题值列表（下标0对应第1行）
+
+    on_progress 为可选的回调 on_progress(已处理行数, 总行数)，每 PROGRESS_EVERY 行调用一次，
+    回调抛出的异常会中止查找。
+    """
+    total = max(end_row - start_row + 1, 0)
+    # 同一标题和SKU在订单表中大量重复，只清理一次
+    title_key = memoize(clean_text)
+    sku_key = memoize(clean_sku)
+
+    processed = 0
+    found_sku_count = 0
+    found_cost_count = 0
+    updates = {}
+
+    for row in range(start_row, end_row + 1):
+        title = titles[row - 1] if row <= len(titles) else None
+        if _has_title(title):
+            # 清理标题文本
+            title = title_key(str(title))
+
+            # 查找SKU
+            if title in sku_data:
+                sku_value = sku_data[title]
+                updates[(row, sku_col)] = sku_value
+                found_sku_count += 1
+
+                # 根据SKU查找成本
+                sku_value = sku_key(str(sku_value))
+                if sku_value in cost_data:
+                    updates[(row, cost_col)] = cost_data[sku_value]
+                    found_cost_count += 1
+                else:
+                    updates[(row, cost_col)] = NOT_FOUND_COST
+            else:
+                updates[(row, sku_col)] = NOT_FOUND_SKU
+                updates[(row, cost_col)] = NOT_FOUND_COST
+
+        processed += 1
+        if on_progress is not None and processed % PROGRESS_EVERY == 0:
+            on_progress(processed, total)
+
+    stats = {"processed_rows": processed, "found_sku": found_sku_count, "found_cost": found_cost_count}
+    return updates, stats
+
+
+def normalize_text_series(series):
+    """批量 clean_text，输入为字符串 Series
+
+    没有使用 .str.replace 链：object 列的 .str 仍是逐个元素调用 Python，并且每一步生成中间 Series，
+    实测比直接调用 clean_text 慢（见 benchmarks/bench_normalize.py）。
+    """
+    return pd.Series(normalize_many(series, clean_text), index=series.index, dtype=object)
+
+
+def normalize_sku_series(series):
+    """批量 clean_sku，输入为字符串 Series"""
+    return pd.Series(normalize_many(series, clean_sku), index=series.index, dtype=object)
+
+
+def _factorize_str(series):
+    """按 str() 的结果去重，返回 (每行对应的去重下标, 去重后的字符串 Series)
+
+    先转成字符串再去重：1、1.0 和 True 的哈希相同，但 str() 结果不同。
+    """
+    codes, uniques = pd.factorize(series.map(str))
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def _present_mask(series):
+    """与 `value and str(value).strip()` 等价的布尔掩码"""
+    truthy = (series.notna() & ~series.isin(['', 0])).values
+    codes, uniques = _factorize_str(series[truthy])
+    mask = truthy.copy()
+    mask[truthy] = (uniques.str.strip() != '').values.take(codes)
+    return mask
+
+
+def build_lookup_frame(keys, values):
+    """按 load_sheet_data 的规则构建 key/value 两列的查找表（重复键保留最后一个）"""
+    frame = pd.DataFrame({'key': pd.Series(keys, dtype=object),
+                          'value': pd.Series(values, dtype=object)})
+    frame = frame[_present_mask(frame['key'])]
+
+    codes, uniques = _factorize_str(frame['key'])
+    clean_keys = normalize_text_series(uniques).values.take(codes)
+
+    # 值为真时清理，否则保留原值（与 `if value:` 一致）
+    clean_values = frame['value'].values.copy()
+    value_present = (frame['value'].notna() & ~frame['value'].isin(['', 0])).values
+    codes, uniques = _factorize_str(frame['value'][value_present])
+    clean_values[value_present] = normalize_sku_series(uniques).values.take(codes)
+
+    table = pd.DataFrame({'key': pd.Series(clean_keys, dtype=object),
+                          'value': pd.Series(clean_values, dtype=object)})
+    table = table.drop_duplicates('key', keep='last')
+    return table.reset_index(drop=True)
+
+
+def _take(values, positions, missing):
+    """按行下标取值，下标为 -1 的位置填 missing"""
+    result = np.full(len(positions), missing, dtype=object)
+    found = positions >= 0
+    result[found] = values[positions[found]]
+    return result
+
+
+def _hash_lookup(table, keys):
+    """在 key 唯一的查找表中定位 keys，返回行下标数组，未找到为 -1"""
+    return pd.Index(table['key']).get_indexer(keys)
+
+
+def lookup_rows_pandas(titles, start_row, end_row, sku_keys, sku_values, cost_keys, cost_values,
+                       sku_col, cost_col):
+    """向量化查找，参数为各列的原始值列表，返回值与 lookup_rows 相同"""
+    processed = max(end_row - start_row + 1, 0)
+    sku_table = build_lookup_frame(sku_keys, sku_values)
+    cost_table = build_lookup_frame(cost_keys, cost_values)
+
+    # SKU → 成本：每个SKU只解析一次，而不是每个订单行一次
+    codes, uniques = _factorize_str(sku_table['value'])
+    cost_positions = _hash_lookup(cost_table, normalize_sku_series(uniques).values).take(codes)
+    sku_cost_found = cost_positions >= 0
+    sku_costs = _take(cost_table['value'].values, cost_positions, NOT_FOUND_COST)
+
+    window = titles[start_row - 1:end_row]
+    rows = pd.Series(window, dtype=object, index=range(start_row, start_row + len(window)))
+    rows = rows[_present_mask(rows)]
+    if rows.empty:
+        return {}, {"processed_rows": processed, "found_sku": 0, "found_cost": 0}
+
+    # 标题 → SKU：对去重后的标题做哈希连接，再按行展开
+    codes, uniques = _factorize_str(rows)
+    positions = _hash_lookup(sku_table, normalize_text_series(uniques).values).take(codes)
+    sku_found = positions >= 0
+    cost_found = _take(sku_cost_found, positions, False).astype(bool)
+
+    sku_out = _take(sku_table['value'].values, positions, NOT_FOUND_SKU)
+    cost_out = _take(sku_costs, positions, NOT_FOUND_COST)
+
+    # 批量生成需要写回的单元格
+    row_numbers = rows.index.tolist()
+    updates = dict(zip(((row, sku_col) for row in row_numbers), sku_out.tolist()))
+    updates.update(zip(((row, cost_col) for row in row_numbers), cost_out.tolist()))
+
+    stats = {
+        "processed_rows": processed,
+        "found_sku": int(sku_found.sum()),
+        "found_cost": int(cost_found.sum()),
+    }
+    return updates, stats
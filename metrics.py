@@ -0,0 +1,183 @@
+"""请求分阶段计时和 Prometheus 指标
+
+StageTimer 记录一次请求（或一个异步任务）中各阶段的耗时、输入输出字节数和处理行数，
+用于 Server-Timing 响应头和结构化日志；MetricsRegistry 把这些数据累计成按接口和阶段划分的
+延迟直方图和计数器，以 Prometheus 文本格式输出。
+
+指标保存在进程内存中，每个 gunicorn 工作进程各自统计，/metrics 返回的是处理该请求的进程的数据。
+"""
+import contextlib
+import math
+import threading
+import time
+
+# 延迟直方图的桶上限（秒），覆盖从几毫秒的小请求到接近 gunicorn 超时的大文件
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_PREFIX = 'excel_processor'
+
+
+class StageTimer:
+    """累计各阶段耗时；同名阶段多次计时时耗时相加，阶段按第一次出现的顺序保存"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.bytes_in = None
+        self.bytes_out = None
+        self.rows = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def to_dict(self):
+        """各阶段耗时（毫秒），用于响应、日志和任务状态"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self, total=None):
+        """Server-Timing 响应头的值，例如 load_reference;dur=12.5, lookup;dur=3.1, total;dur=20.0"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(parts)
+
+
+class Histogram:
+    """按标签分组的累积直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, (None, 0.0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self.series[labels] = (counts, total + value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """进程内的请求指标（线程安全）"""
+
+    def __init__(self, prefix=METRIC_PREFIX, buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._request_seconds = Histogram(buckets)
+        self._stage_seconds = Histogram(buckets)
+        self._counters = {}
+        self._in_flight = 0
+        # 采集时调用的函数，返回 {指标名: (说明, 值)}，用于任务队列等即时状态
+        self._gauge_sources = []
+
+    def enter(self):
+        """请求开始，与 exit 成对调用"""
+        with self._lock:
+            self._in_flight += 1
+
+    def exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @property
+    def requests_in_flight(self):
+        return self._in_flight
+
+    def add_gauges(self, source):
+        self._gauge_sources.append(source)
+
+    def _count(self, name, labels, value):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, endpoint, status, seconds, timer=None):
+        """记录一次请求：总耗时、各阶段耗时、输入输出字节数和处理行数"""
+        with self._lock:
+            self._request_seconds.observe((endpoint, str(status)), seconds)
+            self._count('requests_total', (endpoint, str(status)), 1)
+            if timer is None:
+                return
+            for stage, stage_seconds in timer.stages.items():
+                self._stage_seconds.observe((endpoint, stage), stage_seconds)
+            if timer.bytes_in:
+                self._count('request_bytes_total', (endpoint,), timer.bytes_in)
+            if timer.bytes_out:
+                self._count('response_bytes_total', (endpoint,), timer.bytes_out)
+            if timer.rows:
+                self._count('rows_processed_total', (endpoint,), timer.rows)
+
+    def observe_stages(self, endpoint, stages_ms, rows=None):
+        """记录在其他进程中计时的阶段（StageTimer.to_dict 的结果），用于异步任务"""
+        with self._lock:
+            for stage, ms in stages_ms.items():
+                self._stage_seconds.observe((endpoint, stage), ms / 1000)
+            if rows:
+                self._count('rows_processed_total', (endpoint,), rows)
+
+    def render(self):
+        """Prometheus 文本格式（0.0.4）"""
+        p = self.prefix
+        lines = []
+
+        def histogram(name, help_text, label_names, hist):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for labels, (counts, total) in sorted(hist.series.items()):
+                for bound, count in zip((*hist.buckets, math.inf), counts):
+                    le = _format_labels(label_names, labels, (('le', _format_value(float(bound))),))
+                    lines.append(f"{p}_{name}_bucket{le} {count}")
+                label_text = _format_labels(label_names, labels)
+                lines.append(f"{p}_{name}_sum{label_text} {total!r}")
+                lines.append(f"{p}_{name}_count{label_text} {counts[-1]}")
+
+        counters = {
+            'requests_total': ("请求数", ('endpoint', 'status')),
+            'request_bytes_total': ("请求体字节数", ('endpoint',)),
+            'response_bytes_total': ("响应体字节数（不含流式响应）", ('endpoint',)),
+            'rows_processed_total': ("处理的订单行数", ('endpoint',)),
+        }
+        with self._lock:
+            histogram('request_duration_seconds', "请求总耗时", ('endpoint', 'status'), self._request_seconds)
+            histogram('stage_duration_seconds', "各阶段耗时", ('endpoint', 'stage'), self._stage_seconds)
+            for name, (help_text, label_names) in counters.items():
+                lines.append(f"# HELP {p}_{name} {help_text}")
+                lines.append(f"# TYPE {p}_{name} counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f"{p}_{name}{_format_labels(label_names, labels)} {value}")
+            gauges = {'requests_in_flight': ("正在处理的请求数", self._in_flight)}
+        for source in self._gauge_sources:
+            gauges.update(source())
+        for name, (help_text, value) in gauges.items():
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {value}")
+        return '\n'.join(lines) + '\n'
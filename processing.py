@@ -0,0 +1,352 @@
+"""/api/process 的处理流程
+
+同步接口 /api/process 和异步任务 /api/jobs 共用这里的配置解析和处理函数。
+process_workbook 只依赖可序列化的参数，可以直接在进程池的工作进程中运行。
+"""
+import time
+
+import openpyxl
+
+from fuzzy_match import TrigramIndex, match_missing, parse_fuzzy_options
+from lookup_engine import (AUTO_END_ROW, NOT_FOUND_SKU, build_lookup_frame, lookup_rows, lookup_rows_pandas,
+                           resolve_row_range)
+from metrics import StageTimer
+from sheet_reader import WorkbookReader
+from text_normalize import clean_text, clean_sku
+from xlsx_patch import save_cell_updates
+
+CONFIG_FIELDS = ('sku_config', 'cost_config', 'output_config')
+ENGINES = ('python', 'pandas')
+
+
+class ProcessConfigError(ValueError):
+    """处理配置不合法"""
+
+
+class WorkbookOpenError(ValueError):
+    """工作簿无法打开"""
+
+
+OUTPUT_COLUMNS = ('sheet', 'title_col', 'sku_col', 'cost_col')
+
+
+def parse_output_spec(spec):
+    """校验一个输出工作表的配置，返回带解析后行范围和列号的字典"""
+    if not isinstance(spec, dict):
+        raise ProcessConfigError("output_config 必须是对象或对象列表")
+    for field in OUTPUT_COLUMNS:
+        if not spec.get(field):
+            raise ProcessConfigError(f"output_config 缺少必需参数: {field}")
+
+    # end_row 可以是行号或 "auto"（扫描到标题列最后一个非空单元格）
+    start_row = spec.get('start_row', 2)
+    end_row = spec.get('end_row', 5000)
+    blank_limit = spec.get('stop_after_blank_rows') or 0
+    try:
+        start_row = int(start_row)
+        if end_row != AUTO_END_ROW:
+            end_row = int(end_row)
+        blank_limit = int(blank_limit)
+    except (TypeError, ValueError):
+        raise ProcessConfigError("start_row、stop_after_blank_rows 必须是整数，end_row 必须是整数或 auto")
+
+    try:
+        sku_col_num = openpyxl.utils.column_index_from_string(spec['sku_col'])
+        cost_col_num = openpyxl.utils.column_index_from_string(spec['cost_col'])
+        # 可选的旁注列：开启模糊匹配时写入候选标题和相似度
+        fuzzy_col_num = openpyxl.utils.column_index_from_string(spec['fuzzy_col']) if spec.get('fuzzy_col') else None
+    except ValueError as e:
+        raise ProcessConfigError(f"列名无效: {str(e)}")
+
+    return {
+        'sheet': spec['sheet'],
+        'title_col': spec['title_col'],
+        'sku_col_num': sku_col_num,
+        'cost_col_num': cost_col_num,
+        'fuzzy_col_num': fuzzy_col_num,
+        'start_row': start_row,
+        'end_row': end_row,
+        'blank_limit': blank_limit,
+    }
+
+
+def parse_process_options(data):
+    """校验请求中的处理配置，返回处理选项字典
+
+    output_config 可以是一个输出配置，也可以是多个输出配置的列表，后者在一次加载和一次保存中全部填充。
+    catalog 为参考表目录名，提供时从目录查找，不需要 sku_config 和 cost_config。
+    """
+    # 验证必需参数
+    catalog = data.get('catalog')
+    if catalog is not None and not isinstance(catalog, str):
+        raise ProcessConfigError("catalog 必须是目录名")
+    for field in (('output_config',) if catalog else CONFIG_FIELDS):
+        if field not in data:
+            raise ProcessConfigError(f"缺少必需参数: {field}")
+
+    output_config = data['output_config']
+    specs = output_config if isinstance(output_config, list) else [output_config]
+    if not specs:
+        raise ProcessConfigError("output_config 不能为空")
+    outputs = [parse_output_spec(spec) for spec in specs]
+
+    # 查找引擎：python 为逐行字典查找，pandas 为向量化哈希连接
+    engine = data.get('engine', 'python')
+    if engine not in ENGINES:
+        raise ProcessConfigError(f"不支持的查找引擎: {engine}")
+
+    # 可选的模糊匹配，只用于精确查找失败的标题
+    try:
+        fuzzy = parse_fuzzy_options(data.get('fuzzy'))
+    except ValueError as e:
+        raise ProcessConfigError(str(e))
+
+    return {
+        'sku_config': data.get('sku_config'),
+        'cost_config': data.get('cost_config'),
+        'catalog': catalog,
+        'outputs': outputs,
+        'engine': engine,
+        'fuzzy': fuzzy,
+    }
+
+
+def load_reference_tables(reader, options, sources=None):
+    """读取SKU表和成本表，返回 (查找表, 加载统计)
+
+    python 引擎的查找表为清理后的 (SKU字典, 成本字典)；pandas 引擎为四列原始值，由查找时统一清理。
+    查找表只含可序列化的数据，批量处理时构建一次后交给各个工作进程。
+    sources 为可选的 {'sku_config' / 'cost_config': ReferenceFileReader}，提供时该参考表从独立的
+    CSV / Parquet / Arrow 文件读取，不再读取工作簿。
+    """
+    sources = sources or {}
+    sku_reader = sources.get('sku_config', reader)
+    cost_reader = sources.get('cost_config', reader)
+    sku_config = options['sku_config']
+    cost_config = options['cost_config']
+    if options['engine'] == 'pandas':
+        sku_keys, sku_values = sku_reader.columns(sku_config.get('sheet'),
+                                                  (sku_config['title_col'], sku_config['sku_col']))
+        cost_keys, cost_values = cost_reader.columns(cost_config.get('sheet'),
+                                                     (cost_config['sku_col'], cost_config['cost_col']))
+        return (sku_keys, sku_values, cost_keys, cost_values), None
+
+    # 加载SKU数据和成本数据
+    sku_data, sku_stats = sku_reader.lookup_table(sku_config.get('sheet'), sku_config['title_col'],
+                                                  sku_config['sku_col'], clean_text, clean_sku)
+    cost_data, cost_stats = cost_reader.lookup_table(cost_config.get('sheet'), cost_config['sku_col'],
+                                                     cost_config['cost_col'], clean_text, clean_sku)
+    return (sku_data, cost_data), {"sku": sku_stats, "cost": cost_stats}
+
+
+def load_catalog_tables(catalog, options, titles_list=None):
+    """从参考表目录读取查找表，返回 (查找表, 加载统计)，查找表的格式同 load_reference_tables
+
+    提供 titles_list 时只按其中出现的标题做带索引的查询；否则读取整个目录（批量处理时所有目标共用）。
+    """
+    if catalog is None:
+        raise ProcessConfigError("未配置参考表目录")
+    start = time.perf_counter()
+    refresh = {}
+    if titles_list is None:
+        version, sku_data, cost_data = catalog.tables(options['catalog'], refresh)
+    else:
+        version, sku_data, cost_data = catalog.lookup(options['catalog'],
+                                                      (title for titles in titles_list for title in titles))
+    load_stats = {
+        "catalog": options['catalog'],
+        "version": version,
+        "sku_entries": len(sku_data),
+        "cost_entries": len(cost_data),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    load_stats.update(refresh)
+    if options['engine'] == 'pandas':
+        # 目录中的键和值已经清理过，再次清理结果不变
+        tables = (list(sku_data), list(sku_data.values()), list(cost_data), list(cost_data.values()))
+    else:
+        tables = (sku_data, cost_data)
+    return tables, load_stats
+
+
+def lookup_titles(titles, output, options, tables, report):
+    """在查找表中查找一个输出工作表的标题列，返回 (扫描范围, 需要写回的单元格 {(行, 列): 值}, 统计)"""
+    start_row = output['start_row']
+    scanned_range = resolve_row_range(titles, start_row, output['end_row'], output['blank_limit'])
+    end_row = scanned_range['end_row']
+
+    report(50, "正在查找")
+    if options['engine'] == 'pandas':
+        updates, stats = lookup_rows_pandas(titles, start_row, end_row, *tables,
+                                            output['sku_col_num'], output['cost_col_num'])
+    else:
+        def on_progress(done, total):
+            report(50 + 30 * done // total, f"正在查找 {done}/{total}行")
+
+        sku_data, cost_data = tables
+        updates, stats = lookup_rows(titles, start_row, end_row, sku_data, cost_data,
+                                     output['sku_col_num'], output['cost_col_num'], on_progress)
+    return scanned_range, updates, stats
+
+
+def build_fuzzy_matcher(tables, options):
+    """开启模糊匹配时为SKU表构建三元组索引，返回 (索引, 按SKU查成本的函数)，否则返回 None"""
+    if not options.get('fuzzy'):
+        return None
+    if options['engine'] == 'pandas':
+        sku_keys, sku_values, cost_keys, cost_values = tables
+        sku_table = build_lookup_frame(sku_keys, sku_values)
+        cost_table = build_lookup_frame(cost_keys, cost_values)
+        sku_data = dict(zip(sku_table['key'], sku_table['value']))
+        cost_data = dict(zip(cost_table['key'], cost_table['value']))
+    else:
+        sku_data, cost_data = tables
+    return TrigramIndex.from_lookup(sku_data), lambda sku: cost_data.get(clean_sku(str(sku)))
+
+
+def read_output_titles(reader, options):
+    """读取全部输出工作表的标题列，返回与 options['outputs'] 对应的列表"""
+    return [reader.column_values(output['sheet'], output['title_col']) for output in options['outputs']]
+
+
+def lookup_outputs(titles_list, options, tables, report, fuzzy_matcher=None):
+    """查找全部输出工作表，返回 (按工作表合并的写回单元格, 每个输出的统计列表)
+
+    fuzzy_matcher 为 build_fuzzy_matcher 的返回值，提供时对未找到SKU的行做模糊匹配。
+    """
+    sheet_updates = {}
+    sheets = []
+    for output, titles in zip(options['outputs'], titles_list):
+        scanned_range, updates, stats = lookup_titles(titles, output, options, tables, report)
+        sheet = {
+            "sheet": output['sheet'],
+            "processed_rows": stats['processed_rows'],
+            "found_sku": stats['found_sku'],
+            "found_cost": stats['found_cost'],
+            "scanned_range": scanned_range,
+        }
+        if fuzzy_matcher is not None:
+            report(75, "正在模糊匹配未找到的标题")
+            index, lookup_cost = fuzzy_matcher
+            sku_col_num = output['sku_col_num']
+            missing = sorted(row for (row, col), value in updates.items()
+                             if col == sku_col_num and value == NOT_FOUND_SKU)
+            fuzzy_updates, sheet['fuzzy'] = match_missing(titles, missing, index, options['fuzzy'],
+                                                          lookup_cost, sku_col_num, output['cost_col_num'],
+                                                          output['fuzzy_col_num'])
+            updates.update(fuzzy_updates)
+        sheet_updates.setdefault(output['sheet'], {}).update(updates)
+        sheets.append(sheet)
+    return sheet_updates, sheets
+
+
+def _write_result(source, options, sheet_updates, sheets, load_stats, report, output, timer):
+    # 只重写输出工作表，其余部件原样复制
+    report(80, "正在写入结果")
+    with timer.stage('save'):
+        output_content, write_engine = save_cell_updates(source, sheet_updates, output)
+
+    result = {
+        "processed_rows": sum(sheet['processed_rows'] for sheet in sheets),
+        "found_sku": sum(sheet['found_sku'] for sheet in sheets),
+        "found_cost": sum(sheet['found_cost'] for sheet in sheets),
+        "engine": options['engine'],
+        "sheets": sheets,
+        "load_stats": load_stats,
+        "write_engine": write_engine,
+    }
+    if options.get('fuzzy'):
+        result["fuzzy"] = {key: sum(sheet['fuzzy'][key] for sheet in sheets)
+                           for key in ('rows', 'matched', 'accepted')}
+    # 记录使用的参考表目录版本
+    if options.get('catalog') and load_stats:
+        result["catalog"] = {"name": load_stats['catalog'], "version": load_stats['version']}
+    # 只有一个输出工作表时保留原来的扫描范围字段
+    if len(sheets) == 1:
+        result["scanned_range"] = sheets[0]['scanned_range']
+    return result, output_content
+
+
+def open_workbook_reader(source, remember=None, index_cache=None):
+    """创建 WorkbookReader；未使用会话缓存时立即打开工作簿，打开失败抛出 WorkbookOpenError"""
+    reader = WorkbookReader(source, remember, index_cache)
+    if remember is None:
+        try:
+            reader.workbook
+        except Exception as e:
+            raise WorkbookOpenError(f"无法打开Excel文件: {str(e)}")
+    return reader
+
+
+def process_workbook(source, options, remember=None, index_cache=None, report=None, output=None, sources=None,
+                     catalog=None, timer=None):
+    """执行查找并写回，返回 (结果统计, 输出文件 bytes)
+
+    source 为工作簿路径或可 seek 的二进制文件对象；remember / index_cache 含义同 WorkbookReader；
+    report 为可选的进度回调 report(百分比, 状态文字)；
+    output 为可写的二进制文件对象时结果直接写入其中，不在内存中保留完整的输出文件，返回值的第二项为 output；
+    sources 同 load_reference_tables；catalog 为 ReferenceCatalog，options 中指定了目录时使用；
+    timer 为可选的 StageTimer，记录 open_workbook、read_titles、load_reference、fuzzy_index、lookup、save 各阶段耗时。
+    """
+    if report is None:
+        report = lambda percent, message: None
+    if timer is None:
+        timer = StageTimer()
+
+    # 按需以只读流式模式打开工作簿，使用会话时解析结果会被缓存复用
+    with timer.stage('open_workbook'):
+        reader = open_workbook_reader(source, remember, index_cache)
+    try:
+        # 处理输出工作表，只读取标题列
+        report(5, "正在读取标题列")
+        with timer.stage('read_titles'):
+            titles_list = read_output_titles(reader, options)
+
+        report(20, "正在加载参考表")
+        fuzzy_matcher = None
+        if options.get('catalog'):
+            with timer.stage('load_reference'):
+                tables, load_stats = load_catalog_tables(catalog, options, titles_list)
+            if options.get('fuzzy'):
+                # 模糊匹配需要全部SKU表标题，读取整个目录
+                with timer.stage('fuzzy_index'):
+                    full_options = dict(options, engine='python')
+                    full_tables, _ = load_catalog_tables(catalog, full_options)
+                    fuzzy_matcher = build_fuzzy_matcher(full_tables, full_options)
+        else:
+            with timer.stage('load_reference'):
+                tables, load_stats = load_reference_tables(reader, options, sources)
+            if options.get('fuzzy'):
+                with timer.stage('fuzzy_index'):
+                    fuzzy_matcher = build_fuzzy_matcher(tables, options)
+        with timer.stage('lookup'):
+            sheet_updates, sheets = lookup_outputs(titles_list, options, tables, report, fuzzy_matcher)
+    finally:
+        reader.close()
+
+    return _write_result(source, options, sheet_updates, sheets, load_stats, report, output, timer)
+
+
+def process_target(source, options, tables, report=None, fuzzy_matcher=None, output=None, timer=None):
+    """用已加载的查找表处理一个目标工作簿，返回 (结果统计, 输出文件 bytes)
+
+    目标工作簿只需要包含输出工作表，SKU表和成本表由 load_reference_tables 预先读取，
+    模糊匹配索引由 build_fuzzy_matcher 预先构建；output、timer 同 process_workbook。
+    """
+    if report is None:
+        report = lambda percent, message: None
+    if timer is None:
+        timer = StageTimer()
+
+    with timer.stage('open_workbook'):
+        reader = open_workbook_reader(source)
+    try:
+        report(5, "正在读取标题列")
+        with timer.stage('read_titles'):
+            titles_list = read_output_titles(reader, options)
+        with timer.stage('lookup'):
+            sheet_updates, sheets = lookup_outputs(titles_list, options, tables, report, fuzzy_matcher)
+    finally:
+        reader.close()
+
+    return _write_result(source, options, sheet_updates, sheets, None, report, output, timer)
@@ -0,0 +1,435 @@
+"""SQLite 参考表目录
+
+SKU表和成本表导入一次后保存在本地 SQLite 数据库中，之后的处理请求只需给出目录名，
+订单工作簿只需包含输出工作表，不必每次都附带并重新解析参考表。
+
+每个目录保存两张清理后的映射：标题 → SKU（sku_map）和 SKU → 成本（cost_map），内容与
+load_reference_tables 从工作表构建的字典完全相同，主键分别是清理后的标题和清理后的SKU。
+处理时只按输出工作表中出现的标题及其SKU做带索引的查询，耗时与参考表的大小无关。
+
+每次导入都会使目录版本加一，处理结果中记录使用的版本。清理规则（CLEAN_VERSION）变化后，
+旧规则导入的目录不能再用于查找，需要重新导入。
+
+少量条目变化时不必重新导入：apply_changes 在一个事务中按键插入、更新或删除条目，版本同样加一，
+逐条变更记录在 catalog_changes 中（保留最近 CHANGE_LOG_VERSIONS 个版本）。带索引的查询不受影响；
+读取整个目录的 tables 在进程内缓存，版本变化时只重放缓存版本之后的变更，不重新读取全部条目。
+"""
+import contextlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from text_normalize import CLEAN_VERSION, clean_sku, clean_text
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.excel_processor', 'reference_catalog.sqlite3')
+
+# 目录名：字母、数字、汉字、下划线、点和短横线
+CATALOG_NAME_RE = re.compile(r'^[\w.-]{1,64}$')
+
+# 单条 IN 查询的参数个数，低于 SQLite 的参数上限
+QUERY_CHUNK = 500
+
+# 保留逐条变更记录的版本数，缓存落后更多版本时重新读取整个目录
+CHANGE_LOG_VERSIONS = 100
+
+# 变更表中的操作列：删除和插入/更新的写法（不区分大小写），空白按插入/更新处理
+DELETE_ACTIONS = {'delete', 'del', 'd', 'remove', '删除'}
+UPSERT_ACTIONS = {'', 'upsert', 'update', 'insert', 'add', 'u', '更新', '新增', '修改'}
+
+# 变更的两类条目：标题 → SKU 和 SKU → 成本
+CHANGE_KINDS = ('sku', 'cost')
+
+# 值列不声明类型，按原样保存 None、数字和文本，与工作表构建的字典一致
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalogs (
+    catalog_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    version INTEGER NOT NULL,
+    clean_version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sku_map (
+    catalog_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    sku,
+    PRIMARY KEY (catalog_id, title)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sku_map_sku ON sku_map (catalog_id, sku);
+CREATE TABLE IF NOT EXISTS cost_map (
+    catalog_id INTEGER NOT NULL,
+    sku TEXT NOT NULL,
+    cost,
+    PRIMARY KEY (catalog_id, sku)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    catalog_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    sku_upserts INTEGER NOT NULL,
+    sku_deletes INTEGER NOT NULL,
+    cost_upserts INTEGER NOT NULL,
+    cost_deletes INTEGER NOT NULL,
+    PRIMARY KEY (catalog_id, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    catalog_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value,
+    deleted INTEGER NOT NULL,
+    PRIMARY KEY (catalog_id, version, seq)
+) WITHOUT ROWID;
+"""
+
+# 条目类型 → (表名, 键列, 值列)
+_MAP_TABLES = {'sku': ('sku_map', 'title', 'sku'), 'cost': ('cost_map', 'sku', 'cost')}
+
+
+class CatalogError(ValueError):
+    """目录名无效或目录不可用"""
+
+
+class CatalogNotFound(CatalogError):
+    """目录不存在"""
+
+
+class CatalogConflict(CatalogError):
+    """变更基于的版本不是目录的当前版本"""
+
+
+def _chunks(values, size=QUERY_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _clean_value(value):
+    # 与 build_lookup_table 相同：非空值清理后保存，空值原样保存
+    return clean_sku(str(value)) if value else value
+
+
+def _clean_key(key):
+    """清理后的键，空键返回 None"""
+    if not key or not str(key).strip():
+        return None
+    return clean_text(str(key))
+
+
+def clean_changes(changes):
+    """清理原始变更 {"sku"|"cost": {"upsert": {键: 值}, "delete": [键, ...]}}，返回相同结构
+
+    键和值的清理规则与导入时相同，空键被忽略；同一个键既插入又删除时按删除处理。
+    """
+    if not isinstance(changes, dict) or not changes:
+        raise CatalogError("变更为空")
+    cleaned = {}
+    for kind, change in changes.items():
+        if kind not in CHANGE_KINDS:
+            raise CatalogError(f"未知的变更类型: {kind}，应为 sku 或 cost")
+        if not isinstance(change, dict) or set(change) - {'upsert', 'delete'}:
+            raise CatalogError(f"{kind} 变更应为 {{\"upsert\": {{...}}, \"delete\": [...]}}")
+        upserts = change.get('upsert') or {}
+        deletes = change.get('delete') or []
+        if not isinstance(upserts, dict) or not isinstance(deletes, list):
+            raise CatalogError(f"{kind} 变更中 upsert 应为对象，delete 应为列表")
+        delete_keys = {key for key in map(_clean_key, deletes) if key is not None}
+        upsert_map = {}
+        for key, value in upserts.items():
+            key = _clean_key(key)
+            if key is not None and key not in delete_keys:
+                upsert_map[key] = _clean_value(value)
+        cleaned[kind] = {'upsert': upsert_map, 'delete': sorted(delete_keys)}
+    return cleaned
+
+
+def read_delta(reader, config, skip_rows=0, first_row=1):
+    """按列读取变更表，返回 clean_changes 格式的变更
+
+    reader 为 WorkbookReader 或 ReferenceFileReader；config 包含 table（sku 或 cost）、
+    key_col、value_col（默认 A、B）、可选的 action_col 和 sheet；skip_rows 为跳过的表头行数，
+    first_row 为读出的第一个值在文件中的行号（用于错误信息）。同一个键出现多次时以最后一行为准。
+    """
+    kind = config.get('table')
+    if kind not in CHANGE_KINDS:
+        raise CatalogError("变更表的 table 应为 sku（标题→SKU）或 cost（SKU→成本）")
+    cols = [config.get('key_col') or 'A', config.get('value_col') or 'B']
+    if config.get('action_col'):
+        cols.append(config['action_col'])
+    columns = reader.columns(config.get('sheet'), cols)
+    keys, values = columns[0], columns[1]
+    actions = columns[2] if len(columns) > 2 else [None] * len(keys)
+
+    latest = {}
+    for row, (key, value, action) in enumerate(zip(keys, values, actions), start=first_row):
+        if row < first_row + skip_rows:
+            continue
+        key = _clean_key(key)
+        if key is None:
+            continue
+        action = str(action).strip().lower() if action is not None else ''
+        if action in DELETE_ACTIONS:
+            latest[key] = None
+        elif action in UPSERT_ACTIONS:
+            latest[key] = (_clean_value(value),)
+        else:
+            raise CatalogError(f"变更表第{row}行的操作无法识别: {action}")
+    return {kind: {
+        'upsert': {key: entry[0] for key, entry in latest.items() if entry is not None},
+        'delete': [key for key, entry in latest.items() if entry is None],
+    }}
+
+
+class ReferenceCatalog:
+    """保存在一个 SQLite 文件中的多个参考表目录（线程安全，可由多个进程共享）"""
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_CATALOG_PATH
+        self._ready = False
+        self._lock = threading.Lock()
+        # 目录名 → (catalog_id, 版本, {标题: SKU}, {SKU: 成本})，缓存的字典不会被原地修改
+        self._tables_cache = {}
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def validate_name(name):
+        if not isinstance(name, str) or not CATALOG_NAME_RE.match(name):
+            raise CatalogError("目录名只能包含字母、数字、汉字、下划线、点和短横线，最长64个字符")
+        return name
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # 自动提交模式，事务由调用方用 BEGIN 显式开始
+        with self._lock:
+            if not self._ready:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+                try:
+                    # WAL 模式下读取不会被导入阻塞，多个工作进程可以同时查询
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.executescript(SCHEMA)
+                finally:
+                    conn.close()
+                self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self, conn, mode=''):
+        conn.execute(f'BEGIN {mode}')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _catalog_row(self, conn, name):
+        """返回 (catalog_id, version)，目录不存在时抛出 CatalogNotFound"""
+        row = conn.execute('SELECT catalog_id, version, clean_version FROM catalogs WHERE name = ?',
+                           (self.validate_name(name),)).fetchone()
+        if row is None:
+            raise CatalogNotFound(f"参考表目录不存在: {name}")
+        catalog_id, version, clean_version = row
+        if clean_version != CLEAN_VERSION:
+            raise CatalogError(f"参考表目录 {name} 使用旧的清理规则导入，请重新导入")
+        return catalog_id, version
+
+    # ---- 导入和管理 ----
+
+    def import_tables(self, name, sku_data, cost_data):
+        """用清理后的 {标题: SKU} 和 {SKU: 成本} 替换目录内容（不存在时创建），返回目录信息"""
+        self.validate_name(name)
+        now = time.time()
+        with self._connect() as conn, self._transaction(conn, 'IMMEDIATE'):
+            row = conn.execute('SELECT catalog_id, version FROM catalogs WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                catalog_id = conn.execute(
+                    'INSERT INTO catalogs (name, version, clean_version, created_at, updated_at) '
+                    'VALUES (?, 1, ?, ?, ?)', (name, CLEAN_VERSION, now, now)).lastrowid
+            else:
+                catalog_id = row[0]
+                conn.execute('UPDATE catalogs SET version = version + 1, clean_version = ?, updated_at = ? '
+                             'WHERE catalog_id = ?', (CLEAN_VERSION, now, catalog_id))
+                conn.execute('DELETE FROM sku_map WHERE catalog_id = ?', (catalog_id,))
+                conn.execute('DELETE FROM cost_map WHERE catalog_id = ?', (catalog_id,))
+            conn.executemany('INSERT INTO sku_map (catalog_id, title, sku) VALUES (?, ?, ?)',
+                             ((catalog_id, title, sku) for title, sku in sku_data.items()))
+            conn.executemany('INSERT INTO cost_map (catalog_id, sku, cost) VALUES (?, ?, ?)',
+                             ((catalog_id, sku, cost) for sku, cost in cost_data.items()))
+            # 整体替换后之前的逐条变更不能再用于更新缓存
+            conn.execute('DELETE FROM catalog_changes WHERE catalog_id = ?', (catalog_id,))
+            info = self._info(conn, name)
+            conn.execute('INSERT INTO catalog_versions VALUES (?, ?, ?, ?, ?, 0, ?, 0)',
+                         (catalog_id, info['version'], 'import', now, len(sku_data), len(cost_data)))
+            return info
+
+    def apply_changes(self, name, changes, base_version=None):
+        """在一个事务中应用 clean_changes 格式的变更，版本加一，返回 (目录信息, 变更统计)
+
+        base_version 不为 None 时目录的当前版本必须与之相同，否则抛出 CatalogConflict，
+        用于防止两个客户端基于同一版本的变更互相覆盖。
+        """
+        if not any(change['upsert'] or change['delete'] for change in changes.values()):
+            raise CatalogError("变更为空")
+        now = time.time()
+        with self._connect() as conn, self._transaction(conn, 'IMMEDIATE'):
+            catalog_id, version = self._catalog_row(conn, name)
+            if base_version is not None and base_version != version:
+                raise CatalogConflict(f"参考表目录 {name} 的当前版本为 {version}，不是 {base_version}")
+            version += 1
+
+            counts = {}
+            log = []
+            for kind in CHANGE_KINDS:
+                change = changes.get(kind) or {'upsert': {}, 'delete': []}
+                table, key_col, value_col = _MAP_TABLES[kind]
+                deleted = 0
+                for chunk in _chunks(change['delete']):
+                    placeholders = ','.join('?' * len(chunk))
+                    deleted += conn.execute(
+                        f'DELETE FROM {table} WHERE catalog_id = ? AND {key_col} IN ({placeholders})',
+                        (catalog_id, *chunk)).rowcount
+                conn.executemany(f'INSERT OR REPLACE INTO {table} (catalog_id, {key_col}, {value_col}) VALUES (?, ?, ?)',
+                                 ((catalog_id, key, value) for key, value in change['upsert'].items()))
+                counts[kind] = {"upserted": len(change['upsert']), "deleted": deleted}
+                log.extend((kind, key, None, 1) for key in change['delete'])
+                log.extend((kind, key, value, 0) for key, value in change['upsert'].items())
+
+            conn.executemany('INSERT INTO catalog_changes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             ((catalog_id, version, seq, *entry) for seq, entry in enumerate(log)))
+            conn.execute('DELETE FROM catalog_changes WHERE catalog_id = ? AND version <= ?',
+                         (catalog_id, version - CHANGE_LOG_VERSIONS))
+            conn.execute('INSERT INTO catalog_versions VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (catalog_id, version, 'changes', now, counts['sku']['upserted'], counts['sku']['deleted'],
+                          counts['cost']['upserted'], counts['cost']['deleted']))
+            conn.execute('UPDATE catalogs SET version = ?, updated_at = ? WHERE catalog_id = ?',
+                         (version, now, catalog_id))
+            return self._info(conn, name), counts
+
+    def versions(self, name):
+        """返回目录的版本历史（新版本在前），每项包含版本、类型（import / changes）、时间和条目数"""
+        with self._connect() as conn, self._transaction(conn):
+            row = conn.execute('SELECT catalog_id FROM catalogs WHERE name = ?', (self.validate_name(name),)).fetchone()
+            if row is None:
+                raise CatalogNotFound(f"参考表目录不存在: {name}")
+            columns = ('version', 'kind', 'created_at', 'sku_upserts', 'sku_deletes', 'cost_upserts', 'cost_deletes')
+            return [dict(zip(columns, values)) for values in conn.execute(
+                f'SELECT {", ".join(columns)} FROM catalog_versions WHERE catalog_id = ? ORDER BY version DESC', row)]
+
+    def _info(self, conn, name):
+        row = conn.execute('SELECT catalog_id, version, clean_version, created_at, updated_at FROM catalogs '
+                           'WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        catalog_id, version, clean_version, created_at, updated_at = row
+        sku_entries = conn.execute('SELECT COUNT(*) FROM sku_map WHERE catalog_id = ?', (catalog_id,)).fetchone()[0]
+        cost_entries = conn.execute('SELECT COUNT(*) FROM cost_map WHERE catalog_id = ?', (catalog_id,)).fetchone()[0]
+        return {
+            "name": name,
+            "version": version,
+            "sku_entries": sku_entries,
+            "cost_entries": cost_entries,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "stale": clean_version != CLEAN_VERSION,
+        }
+
+    def info(self, name):
+        """返回目录信息字典，不存在时返回 None"""
+        self.validate_name(name)
+        with self._connect() as conn, self._transaction(conn):
+            return self._info(conn, name)
+
+    def list(self):
+        """返回全部目录的信息，按名称排序"""
+        with self._connect() as conn, self._transaction(conn):
+            names = [row[0] for row in conn.execute('SELECT name FROM catalogs ORDER BY name')]
+            return [self._info(conn, name) for name in names]
+
+    def delete(self, name):
+        """删除目录，不存在时返回 False"""
+        self.validate_name(name)
+        with self._connect() as conn, self._transaction(conn, 'IMMEDIATE'):
+            row = conn.execute('SELECT catalog_id FROM catalogs WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                return False
+            for table in ('sku_map', 'cost_map', 'catalog_changes', 'catalog_versions', 'catalogs'):
+                conn.execute(f'DELETE FROM {table} WHERE catalog_id = ?', row)
+        with self._cache_lock:
+            self._tables_cache.pop(name, None)
+        return True
+
+    # ---- 查找 ----
+
+    def lookup(self, name, titles):
+        """按原始标题查询，返回 (版本, {标题: SKU}, {SKU: 成本})
+
+        只包含 titles 中出现的标题和这些标题对应SKU的成本，标题和SKU的清理规则与 lookup_rows 相同，
+        用这两个字典查找的结果与使用完整参考表相同。两次查询在同一个读事务中，看到的是同一版本。
+        """
+        keys = {clean_text(str(title)) for title in titles if title and str(title).strip()}
+        with self._connect() as conn, self._transaction(conn):
+            catalog_id, version = self._catalog_row(conn, name)
+            sku_data = {}
+            for chunk in _chunks(keys):
+                placeholders = ','.join('?' * len(chunk))
+                sku_data.update(conn.execute(
+                    f'SELECT title, sku FROM sku_map WHERE catalog_id = ? AND title IN ({placeholders})',
+                    (catalog_id, *chunk)))
+            cost_data = {}
+            for chunk in _chunks({clean_sku(str(sku)) for sku in sku_data.values()}):
+                placeholders = ','.join('?' * len(chunk))
+                cost_data.update(conn.execute(
+                    f'SELECT sku, cost FROM cost_map WHERE catalog_id = ? AND sku IN ({placeholders})',
+                    (catalog_id, *chunk)))
+        return version, sku_data, cost_data
+
+    def tables(self, name, stats=None):
+        """读取整个目录，返回 (版本, {标题: SKU}, {SKU: 成本})
+
+        结果在进程内缓存，调用方不能修改返回的字典。目录版本变化时，变更记录完整的话只把缓存版本之后的
+        变更应用到缓存的副本上，否则重新读取。stats 为字典时写入 refresh：cached / delta / full。
+        """
+        with self._connect() as conn, self._transaction(conn):
+            catalog_id, version = self._catalog_row(conn, name)
+            with self._cache_lock:
+                cached = self._tables_cache.get(name)
+            refresh = 'full'
+            if cached is not None and cached[0] == catalog_id and cached[1] == version:
+                refresh = 'cached'
+                sku_data, cost_data = cached[2], cached[3]
+            elif cached is not None and cached[0] == catalog_id and cached[1] < version:
+                rows = conn.execute('SELECT version, kind, key, value, deleted FROM catalog_changes '
+                                    'WHERE catalog_id = ? AND version > ? ORDER BY version, seq',
+                                    (catalog_id, cached[1])).fetchall()
+                # 每个变更版本至少有一条记录；中间有整体导入或记录已被清理时版本数对不上
+                if len({row[0] for row in rows}) == version - cached[1]:
+                    refresh = 'delta'
+                    data = {'sku': dict(cached[2]), 'cost': dict(cached[3])}
+                    for _, kind, key, value, deleted in rows:
+                        if deleted:
+                            data[kind].pop(key, None)
+                        else:
+                            data[kind][key] = value
+                    sku_data, cost_data = data['sku'], data['cost']
+            if refresh == 'full':
+                sku_data = dict(conn.execute('SELECT title, sku FROM sku_map WHERE catalog_id = ?', (catalog_id,)))
+                cost_data = dict(conn.execute('SELECT sku, cost FROM cost_map WHERE catalog_id = ?', (catalog_id,)))
+        if refresh != 'cached':
+            with self._cache_lock:
+                current = self._tables_cache.get(name)
+                # 并发读取时不让旧版本覆盖新版本
+                if current is None or current[0] != catalog_id or current[1] <= version:
+                    self._tables_cache[name] = (catalog_id, version, sku_data, cost_data)
+        if stats is not None:
+            stats['refresh'] = refresh
+        return version, sku_data, cost_data
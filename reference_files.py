@@ -0,0 +1,173 @@
+"""CSV / Parquet / Arrow 参考表
+
+SKU表和成本表可以不放在目标工作簿中，而是单独提供 ERP 导出的 CSV、Parquet 或 Arrow（Feather / IPC）文件。
+这些文件按列读取：CSV 由 pandas 的 C 解析器只解析配置的两列，Parquet 和 Arrow 由 pyarrow 只读取需要的列，
+读出的两列直接构建查找表，不再转换成 xlsx。目标工作簿仍然是 xlsx。
+
+列可以用表头名（如 "SKU"）或列字母（A 为第一列）指定，表头中有同名的列时按表头名。
+CSV 的值一律按文本读取，保留 SKU 的前导零；Parquet 和 Arrow 需要安装 pyarrow。
+"""
+import os
+import time
+
+import openpyxl
+import pandas as pd
+
+from sheet_reader import build_lookup_table
+
+# 文件扩展名 → 格式
+REFERENCE_FORMATS = {
+    '.csv': 'csv',
+    '.txt': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+# CSV 依次尝试的编码：UTF-8（可带 BOM），Windows 中文系统导出的 GBK
+CSV_ENCODINGS = ('utf-8-sig', 'gbk')
+
+
+class ReferenceFileError(ValueError):
+    """参考表文件无法读取或列配置无效"""
+
+
+def reference_format(filename, fmt=None):
+    """返回参考表文件的格式（csv / parquet / arrow），fmt 为显式指定的格式；无法识别时抛出 ReferenceFileError"""
+    if fmt:
+        if fmt not in set(REFERENCE_FORMATS.values()):
+            raise ReferenceFileError(f"不支持的参考表格式: {fmt}")
+        return fmt
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext not in REFERENCE_FORMATS:
+        raise ReferenceFileError(f"无法识别参考表文件格式: {filename}，支持 CSV、Parquet、Arrow")
+    return REFERENCE_FORMATS[ext]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ReferenceFileError("读取 Parquet / Arrow 参考表需要安装 pyarrow")
+    return pyarrow
+
+
+def _plain(value):
+    # 与 openpyxl 读取 xlsx 一致：整数值的浮点数按整数处理，空值为 None
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+class ReferenceFileReader:
+    """按列读取一个参考表文件，接口与 WorkbookReader 相同（sheet_name 参数被忽略）
+
+    source 为路径或可 seek 的二进制文件对象，fmt 为 reference_format 的返回值。
+    """
+
+    def __init__(self, source, fmt, filename=None):
+        self.source = source
+        self.fmt = fmt
+        self.filename = filename
+        self._header = None
+        self._encoding = None
+
+    def _rewind(self):
+        if hasattr(self.source, 'seek'):
+            self.source.seek(0)
+        return self.source
+
+    def _read_csv(self, **kwargs):
+        encodings = (self._encoding,) if self._encoding else CSV_ENCODINGS
+        for encoding in encodings:
+            try:
+                frame = pd.read_csv(self._rewind(), encoding=encoding, **kwargs)
+            except UnicodeDecodeError:
+                continue
+            self._encoding = encoding
+            return frame
+        raise ReferenceFileError(f"CSV 编码无法识别，请使用 UTF-8 或 GBK: {self.filename}")
+
+    @property
+    def header(self):
+        """表头列名列表"""
+        if self._header is None:
+            try:
+                if self.fmt == 'csv':
+                    self._header = [str(name) for name in self._read_csv(nrows=0).columns]
+                else:
+                    pa = _import_pyarrow()
+                    if self.fmt == 'parquet':
+                        schema = pa.parquet.ParquetFile(self._rewind()).schema_arrow
+                    else:
+                        schema = pa.ipc.open_file(self._rewind()).schema
+                    self._header = list(schema.names)
+            except ReferenceFileError:
+                raise
+            except Exception as e:
+                raise ReferenceFileError(f"无法读取参考表文件 {self.filename}: {str(e)}")
+        return self._header
+
+    def _resolve(self, col):
+        """列名或列字母 → 列下标"""
+        header = self.header
+        if col in header:
+            return header.index(col)
+        try:
+            index = openpyxl.utils.column_index_from_string(col) - 1
+        except (ValueError, TypeError):
+            index = None
+        if index is None or index >= len(header):
+            raise ReferenceFileError(f"参考表文件 {self.filename} 中没有列: {col}")
+        return index
+
+    def columns(self, sheet_name, cols):
+        """只读取指定的列，返回与 cols 对应的原始值列表元组"""
+        indices = [self._resolve(col) for col in cols]
+        try:
+            if self.fmt == 'csv':
+                wanted = sorted(set(indices))
+                frame = self._read_csv(usecols=wanted, dtype=str, keep_default_na=False)
+                return tuple([value if value != '' else None for value in frame.iloc[:, wanted.index(i)].tolist()]
+                             for i in indices)
+
+            pa = _import_pyarrow()
+            names = [self.header[i] for i in indices]
+            if self.fmt == 'parquet':
+                table = pa.parquet.read_table(self._rewind(), columns=list(dict.fromkeys(names)))
+            else:
+                table = pa.feather.read_table(self._rewind(), columns=list(dict.fromkeys(names)))
+            return tuple([_plain(value) for value in table.column(name).to_pylist()] for name in names)
+        except ReferenceFileError:
+            raise
+        except Exception as e:
+            raise ReferenceFileError(f"无法读取参考表文件 {self.filename}: {str(e)}")
+
+    def column_values(self, sheet_name, col):
+        return self.columns(sheet_name, (col,))[0]
+
+    def lookup_table(self, sheet_name, key_col, value_col, clean_key, clean_value, min_row=2):
+        """返回 (清理后的字典, 统计信息)，清理规则与工作簿中的参考表相同
+
+        行号与工作表相同：第1行为表头（不在数据中），数据从第2行开始，min_row 为开始读取的行号。
+        """
+        start = time.perf_counter()
+        keys, values = self.columns(sheet_name, (key_col, value_col))
+        skip = max(min_row - 2, 0)
+        data, stats = build_lookup_table(zip(keys[skip:], values[skip:]), clean_key, clean_value)
+        # 耗时包含读取文件的时间
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = round(elapsed, 4)
+        stats['rows_per_sec'] = int(stats['rows'] / elapsed) if elapsed > 0 else stats['rows']
+        stats['source'] = self.fmt
+        return data, stats
+
+    def close(self):
+        pass
@@ -0,0 +1,164 @@
+"""处理结果的本地存储
+
+处理后的工作簿保存到本地目录，用随机且不可猜测的结果ID下载，代替在 JSON 中返回 base64 内容。
+每个结果对应 <结果ID>.bin（文件内容）和 <结果ID>.json（文件名、大小、创建时间）两个文件，
+同一台机器上的所有工作进程共享同一目录。
+
+存储有总容量和单个文件大小上限，超过 TTL 的结果会被删除；总容量不足时从最早的结果开始淘汰。
+存储目录与查找表缓存一样必须属于当前用户且其他用户不可写（默认 excel_results-<uid>，权限 0700），
+否则不保存也不读取结果。
+"""
+import io
+import json
+import os
+import secrets
+import shutil
+import threading
+import time
+
+from lookup_cache import _private_dir, _user_temp_dir
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ZIP_MIMETYPE = 'application/zip'
+
+
+class ResultStoreFull(Exception):
+    """结果超过大小上限，无法保存"""
+
+
+class ResultStore:
+    """带容量上限和 TTL 的结果文件存储"""
+
+    def __init__(self, store_dir=None, max_bytes=1024 * 1024 * 1024, max_file_bytes=100 * 1024 * 1024,
+                 ttl_seconds=3600):
+        self.store_dir = store_dir or _user_temp_dir('excel_results')
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_id(result_id):
+        return bool(result_id) and len(result_id) == 32 and all(c in '0123456789abcdef' for c in result_id)
+
+    def _ensure_dir(self):
+        if not _private_dir(self.store_dir):
+            raise PermissionError(f"结果存储目录不可安全使用: {self.store_dir}")
+
+    def _path(self, result_id, suffix):
+        return os.path.join(self.store_dir, f"{result_id}{suffix}")
+
+    def _read_meta(self, result_id):
+        try:
+            with open(self._path(result_id, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, result_id):
+        for suffix in ('.json', '.bin'):
+            try:
+                os.remove(self._path(result_id, suffix))
+            except OSError:
+                pass
+
+    def _entries(self):
+        """返回 [(创建时间, 结果ID, 大小)]，按创建时间升序"""
+        entries = []
+        if not _private_dir(self.store_dir):
+            return entries
+        try:
+            names = os.listdir(self.store_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            result_id = name[:-len('.json')]
+            meta = self._read_meta(result_id)
+            if meta is None:
+                continue
+            entries.append((meta['created_at'], result_id, meta['size']))
+        entries.sort()
+        return entries
+
+    def _make_room(self, size, now):
+        # 删除过期结果，再从最早的结果开始淘汰直到放得下
+        entries = []
+        for created_at, result_id, entry_size in self._entries():
+            if now - created_at > self.ttl_seconds:
+                self._remove(result_id)
+            else:
+                entries.append((created_at, result_id, entry_size))
+        total = sum(entry_size for _, _, entry_size in entries)
+        for _, result_id, entry_size in entries:
+            if total + size <= self.max_bytes:
+                break
+            self._remove(result_id)
+            total -= entry_size
+
+    def _check_size(self, size):
+        if size > self.max_file_bytes or size > self.max_bytes:
+            raise ResultStoreFull(f"结果文件过大（{size}字节），超过存储上限")
+
+    def _commit(self, result_id, filename, size, now, mimetype):
+        meta = {"filename": filename, "size": size, "created_at": now, "mimetype": mimetype}
+        temp_path = self._path(result_id, '.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp_path, self._path(result_id, '.json'))
+        return result_id
+
+    def put(self, content, filename, mimetype=XLSX_MIMETYPE):
+        """保存 bytes 内容，返回结果ID"""
+        return self.put_stream(io.BytesIO(content), filename, mimetype)
+
+    def put_stream(self, stream, filename, mimetype=XLSX_MIMETYPE):
+        """保存可 seek 的二进制文件对象的全部内容，返回结果ID"""
+        size = stream.seek(0, os.SEEK_END)
+        self._check_size(size)
+        stream.seek(0)
+        result_id = secrets.token_hex(16)
+        now = time.time()
+        with self._lock:
+            self._ensure_dir()
+            self._make_room(size, now)
+            with open(self._path(result_id, '.bin'), 'wb') as f:
+                shutil.copyfileobj(stream, f)
+            return self._commit(result_id, filename, size, now, mimetype)
+
+    def put_file(self, path, filename, mimetype=XLSX_MIMETYPE):
+        """把已有文件移入存储，返回结果ID"""
+        size = os.path.getsize(path)
+        self._check_size(size)
+        result_id = secrets.token_hex(16)
+        now = time.time()
+        with self._lock:
+            self._ensure_dir()
+            self._make_room(size, now)
+            shutil.move(path, self._path(result_id, '.bin'))
+            return self._commit(result_id, filename, size, now, mimetype)
+
+    def get(self, result_id):
+        """返回 (文件路径, 元数据)，不存在或已过期时返回 None"""
+        if not self.is_valid_id(result_id) or not _private_dir(self.store_dir):
+            return None
+        meta = self._read_meta(result_id)
+        if meta is None:
+            return None
+        if time.time() - meta['created_at'] > self.ttl_seconds:
+            self._remove(result_id)
+            return None
+        path = self._path(result_id, '.bin')
+        if not os.path.exists(path):
+            return None
+        return path, meta
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "results": len(entries),
+            "total_bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
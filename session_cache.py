@@ -0,0 +1,297 @@
+"""已上传工作簿的会话缓存
+
+/api/upload 按文件内容的 SHA-256 生成会话ID，后续请求只需传会话ID，
+服务端复用缓存中的文件内容以及已经解析过的查找表，避免重复上传和解析。
+缓存有总内存预算，超出时按最近最少使用 (LRU) 淘汰，超过 TTL 未访问的会话自动过期。
+
+文件内容同时保存在本地目录中（<会话ID>.xlsx，修改时间即最近访问时间），同一台机器上的其他
+gunicorn 工作进程在内存中找不到会话时从该目录载入，因此请求落到哪个工作进程都能使用同一个会话ID。
+解析结果一般只缓存在各进程的内存中，载入会话后按需重新解析；remember_shared 的结果另以 JSON
+保存在该目录中（<会话ID>-<键摘要>.json），其他进程直接读取，例如一致性检查结果的分页。
+
+共享目录与查找表缓存一样必须属于当前用户且其他用户不可写（默认 excel_sessions-<uid>，权限 0700），
+否则不读写磁盘、只使用各进程的内存缓存，避免其他本地用户替换会话内容或伪造共享结果。
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from lookup_cache import _private_dir, _user_temp_dir
+
+
+def estimate_size(value):
+    """粗略估算对象占用的内存字节数（只展开常见容器）"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class WorkbookSession:
+    """缓存中的一个已上传工作簿"""
+
+    def __init__(self, session_id, content, filename=None):
+        self.session_id = session_id
+        self.content = content
+        self.filename = filename
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        # 解析结果缓存 {key: value}
+        self.memo = {}
+        self.size = len(content)
+
+    def open(self):
+        """返回工作簿内容的只读二进制文件对象"""
+        return io.BytesIO(self.content)
+
+
+class WorkbookSessionCache:
+    """带内存预算、LRU淘汰和TTL过期的会话缓存（线程安全），文件内容在 store_dir 中跨进程共享
+
+    store_dir 中的文件总大小不超过 max_store_bytes，超出时从最久未访问的会话开始删除。
+    """
+
+    def __init__(self, max_bytes, ttl_seconds, store_dir=None, max_store_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.store_dir = store_dir or _user_temp_dir('excel_sessions')
+        self.max_store_bytes = max_store_bytes
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._usable = None
+        self.hits = 0
+        self.misses = 0
+
+    def usable(self):
+        """共享目录是否可以安全使用；不可用时会话只缓存在本进程的内存中"""
+        if self._usable is None:
+            self._usable = _private_dir(self.store_dir)
+        return self._usable
+
+    @staticmethod
+    def session_id_for(content):
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def is_valid_id(session_id):
+        return (isinstance(session_id, str) and len(session_id) == 64
+                and all(c in '0123456789abcdef' for c in session_id))
+
+    def _store_path(self, session_id):
+        return os.path.join(self.store_dir, f"{session_id}.xlsx")
+
+    def _shared_path(self, session_id, key):
+        digest = hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.store_dir, f"{session_id}-{digest}.json")
+
+    def _persist(self, session):
+        """把会话内容写入共享目录，已存在时只更新访问时间；写入失败时会话仍保留在内存中"""
+        if not self.usable():
+            return
+        path = self._store_path(session.session_id)
+        try:
+            try:
+                os.utime(path)
+                return
+            except FileNotFoundError:
+                pass
+            fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(session.content)
+            os.replace(temp_path, path)
+            self._prune_store(time.time())
+        except OSError:
+            pass
+
+    def _prune_store(self, now):
+        # 删除过期的会话文件和写入中断留下的临时文件，再从最久未访问的开始删除直到总大小不超过上限
+        entries = []
+        names = os.listdir(self.store_dir)
+        for name in names:
+            if not name.endswith(('.xlsx', '.tmp')):
+                continue
+            path = os.path.join(self.store_dir, name)
+            try:
+                st = os.stat(path)
+                if name.endswith('.tmp'):
+                    if now - st.st_mtime > self.ttl_seconds:
+                        os.remove(path)
+                    continue
+                if now - st.st_mtime > self.ttl_seconds:
+                    os.remove(path)
+                else:
+                    entries.append((st.st_mtime, path, st.st_size))
+            except OSError:
+                continue
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_store_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        # 会话文件已删除的共享解析结果一并删除
+        for name in names:
+            if name.endswith('.json') and not os.path.exists(self._store_path(name.split('-', 1)[0])):
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass
+
+    def _load(self, session_id):
+        """从共享目录读取其他进程保存的会话内容，不存在、已过期或内容与会话ID不符时返回 None"""
+        if not self.usable():
+            return None
+        path = self._store_path(session_id)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl_seconds:
+                return None
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        if self.session_id_for(content) != session_id:
+            return None
+        return content
+
+    def _expire(self, now):
+        expired = [sid for sid, session in self._sessions.items()
+                   if now - session.last_access > self.ttl_seconds]
+        for sid in expired:
+            self._drop(sid)
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._total_bytes -= session.size
+
+    def _evict(self, keep=None):
+        # 从最久未使用的会话开始淘汰，正在使用的会话保留
+        while self._total_bytes > self.max_bytes and self._sessions:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(oldest)
+                oldest = next(iter(self._sessions))
+            self._drop(oldest)
+
+    def _insert(self, session_id, content, filename):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = WorkbookSession(session_id, content, filename)
+                self._sessions[session_id] = session
+                self._total_bytes += session.size
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return session
+
+    def add(self, content, filename=None):
+        """缓存上传的工作簿内容，返回会话（相同内容复用已有会话）"""
+        session = self._insert(self.session_id_for(content), content, filename)
+        self._persist(session)
+        return session
+
+    def get(self, session_id):
+        """按会话ID取出会话，内存中没有时从共享目录载入，不存在或已过期时返回 None"""
+        if not self.is_valid_id(session_id):
+            return None
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+        if session is None:
+            # 在锁外读取文件，其他进程上传的会话载入后放入本进程的内存缓存
+            content = self._load(session_id)
+            if content is None:
+                return None
+            session = self._insert(session_id, content, None)
+        # 更新共享目录中的访问时间，其他进程不会把仍在使用的会话当作过期删除
+        self._persist(session)
+        return session
+
+    def remember(self, session, key, builder):
+        """返回会话中缓存的解析结果，未命中时调用 builder 构建并计入内存预算
+
+        返回 (value, 是否命中缓存)。
+        """
+        with self._lock:
+            if key in session.memo:
+                self.hits += 1
+                return session.memo[key], True
+            self.misses += 1
+
+        # 在锁外构建，避免解析大表时阻塞其他请求
+        value = builder()
+        size = estimate_size(value)
+        with self._lock:
+            if key not in session.memo:
+                session.memo[key] = value
+                session.size += size
+                if session.session_id in self._sessions:
+                    self._total_bytes += size
+                    self._evict(keep=session.session_id)
+        return value, False
+
+    def remember_shared(self, session, key, builder):
+        """同 remember，结果还以 JSON 保存在共享目录中，其他工作进程读取后不再调用 builder
+
+        key 和 builder 的返回值只能包含 JSON 类型（tuple 读回后为 list）。从共享目录读取的结果也视为命中缓存。
+        """
+        loaded = False
+
+        def load_or_build():
+            nonlocal loaded
+            if not self.usable():
+                return builder()
+            path = self._shared_path(session.session_id, key)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    value = json.load(f)
+                loaded = True
+                return value
+            except (OSError, ValueError):
+                pass
+            value = builder()
+            try:
+                fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(value, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_path, path)
+            except OSError:
+                pass
+            return value
+
+        value, hit = self.remember(session, key, load_or_build)
+        return value, hit or loaded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
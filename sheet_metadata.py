@@ -0,0 +1,191 @@
+"""不加载工作簿读取工作表信息
+
+/api/upload 只需要每个工作表的行数、列数和表头，这里直接从 zip 中读取：工作表名和顺序来自
+xl/workbook.xml，行列范围来自每个工作表开头的 <dimension ref="A1:K4135"/>，表头来自第一个 <row>。
+读到需要的内容后立即停止解析，耗时与工作表的行数无关。
+
+没有 <dimension>（或只写了单个单元格）的工作表改为逐行扫描，最多扫描 scan_rows 行，
+超过时行数只是下限，结果中 truncated 为 True。
+"""
+import xml.etree.ElementTree as ET
+import zipfile
+
+import openpyxl
+
+from xlsx_patch import NS_MAIN, resolve_sheet_parts, resolve_workbook_part
+
+# 没有 <dimension> 时最多扫描的行数
+METADATA_SCAN_ROWS = 100000
+
+_DIMENSION = f'{{{NS_MAIN}}}dimension'
+_ROW = f'{{{NS_MAIN}}}row'
+_CELL = f'{{{NS_MAIN}}}c'
+_VALUE = f'{{{NS_MAIN}}}v'
+_TEXT = f'{{{NS_MAIN}}}t'
+_RUN = f'{{{NS_MAIN}}}r'
+_SHARED_ITEM = f'{{{NS_MAIN}}}si'
+_SHEET_DATA = f'{{{NS_MAIN}}}sheetData'
+
+
+def _split_ref(ref):
+    """'K4135' -> (4135, 11)"""
+    letters = ref.rstrip('0123456789')
+    digits = ref[len(letters):]
+    row = int(digits) if digits else 0
+    col = openpyxl.utils.column_index_from_string(letters) if letters else 0
+    return row, col
+
+
+def _parse_dimension(ref):
+    """返回 (最大行, 最大列)；只有单个单元格时无法确定范围，返回 None"""
+    if not ref or ':' not in ref:
+        return None
+    return _split_ref(ref.split(':', 1)[1].replace('$', ''))
+
+
+def _inline_text(element):
+    # 富文本由多个 <r><t> 组成；<rPh> 中的注音不属于单元格内容
+    parts = []
+    for child in element:
+        if child.tag == _TEXT:
+            parts.append(child.text or '')
+        elif child.tag == _RUN:
+            text = child.find(_TEXT)
+            if text is not None:
+                parts.append(text.text or '')
+    return ''.join(parts)
+
+
+def _cell_value(cell):
+    """返回 (值, 共享字符串下标)；共享字符串的值在读取 sharedStrings 后再填入"""
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(f'{{{NS_MAIN}}}is')
+        return (_inline_text(inline) if inline is not None else ''), None
+    value = cell.find(_VALUE)
+    text = value.text if value is not None else None
+    if text is None:
+        return None, None
+    if cell_type == 's':
+        return None, int(text)
+    if cell_type == 'b':
+        return text == '1', None
+    if cell_type == 'n':
+        number = float(text)
+        return (int(number) if number.is_integer() else number), None
+    return text, None
+
+
+def _scan_sheet(zf, part, scan_rows):
+    """流式解析工作表 XML，返回 (dimension, 扫描得到的 (最大行, 最大列), 第一行, 是否截断)"""
+    dimension = None
+    max_row = max_col = 0
+    header = None
+    rows = 0
+    truncated = False
+    with zf.open(part) as fp:
+        for event, element in ET.iterparse(fp, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == _DIMENSION:
+                    dimension = _parse_dimension(element.get('ref'))
+                continue
+            if element.tag != _ROW:
+                if element.tag == _SHEET_DATA:
+                    break
+                continue
+
+            rows += 1
+            row_num = int(element.get('r', max_row + 1))
+            cells = {}
+            next_col = 1
+            for cell in element.iter(_CELL):
+                ref = cell.get('r')
+                col = _split_ref(ref)[1] if ref else next_col
+                next_col = col + 1
+                value = _cell_value(cell)
+                if value != (None, None):
+                    cells[col] = value
+            if cells:
+                max_row = max(max_row, row_num)
+                max_col = max(max_col, max(cells))
+                if header is None:
+                    header = (row_num, cells)
+            element.clear()
+
+            # 有 dimension 时只需要第一行；否则扫描到上限为止
+            if dimension is not None and header is not None:
+                break
+            if rows >= scan_rows:
+                truncated = True
+                break
+    return dimension, (max_row, max_col), header, truncated
+
+
+def _shared_strings(zf, indices):
+    """只读取 sharedStrings.xml 中下标不超过 max(indices) 的部分，返回 {下标: 文本}"""
+    if not indices:
+        return {}
+    part = resolve_workbook_part(zf, 'sharedStrings')
+    if part is None:
+        return {}
+    last = max(indices)
+    strings = {}
+    index = 0
+    with zf.open(part) as fp:
+        for _, element in ET.iterparse(fp):
+            if element.tag != _SHARED_ITEM:
+                continue
+            if index in indices:
+                strings[index] = _inline_text(element)
+            element.clear()
+            index += 1
+            if index > last:
+                break
+    return strings
+
+
+def read_sheet_metadata(source, scan_rows=METADATA_SCAN_ROWS):
+    """返回 (工作表名列表, {工作表名: 信息})
+
+    信息包含 max_row、max_column、columns（列字母）、header（表头 {列字母: 值}）、header_row，
+    以及 source（"dimension" 或 "scan"）和 truncated。source 为工作簿路径或二进制文件对象。
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with zipfile.ZipFile(source) as zf:
+        sheet_parts = resolve_sheet_parts(zf)
+        scans = {name: _scan_sheet(zf, part, scan_rows) for name, part in sheet_parts.items()}
+
+        indices = {index for _, _, header, _ in scans.values() if header
+                   for _, index in header[1].values() if index is not None}
+        strings = _shared_strings(zf, indices)
+
+    sheets_info = {}
+    for name, (dimension, scanned, header, truncated) in scans.items():
+        if dimension is not None:
+            max_row, max_col = dimension
+            source_kind = 'dimension'
+        else:
+            max_row, max_col = scanned
+            source_kind = 'scan'
+        # 与 openpyxl 一致，空工作表的行列数为 1
+        max_row = max(max_row, 1)
+        max_col = max(max_col, 1)
+
+        header_values = {}
+        header_row = None
+        if header is not None:
+            header_row, cells = header
+            for col, (value, index) in sorted(cells.items()):
+                header_values[openpyxl.utils.get_column_letter(col)] = strings.get(index) if index is not None else value
+
+        sheets_info[name] = {
+            "max_row": max_row,
+            "max_column": max_col,
+            "columns": [openpyxl.utils.get_column_letter(col) for col in range(1, max_col + 1)],
+            "header_row": header_row,
+            "header": header_values,
+            "source": source_kind,
+            "truncated": truncated and source_kind == 'scan',
+        }
+    return list(sheet_parts), sheets_info
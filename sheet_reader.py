@@ -0,0 +1,136 @@
+"""只读流式读取工作表数据
+
+与 load_workbook 默认模式不同，这里以 read_only=True 打开工作簿，
+按行流式解析，只取出配置的列，避免把整个工作簿的单元格对象加载到内存。
+"""
+import time
+
+import openpyxl
+from openpyxl import load_workbook
+
+
+def open_readonly_workbook(source):
+    """以只读模式打开工作簿，source 可以是文件路径或二进制文件对象"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return load_workbook(source, read_only=True)
+
+
+def iter_column_values(sheet, columns, min_row=1, max_row=None):
+    """流式读取指定列，逐行返回 (行号, (列1值, 列2值, ...))"""
+    col_nums = [openpyxl.utils.column_index_from_string(col) for col in columns]
+    min_col = min(col_nums)
+    max_col = max(col_nums)
+    offsets = [num - min_col for num in col_nums]
+
+    rows = sheet.iter_rows(min_row=min_row, max_row=max_row,
+                           min_col=min_col, max_col=max_col, values_only=True)
+    for row_num, row in enumerate(rows, start=min_row):
+        yield row_num, tuple(row[i] if i < len(row) else None for i in offsets)
+
+
+def build_lookup_table(pairs, clean_key, clean_value):
+    """从 (键, 值) 序列构建与 load_sheet_data 相同的清理后字典
+
+    返回 (data, stats)，stats 中包含读取行数、耗时和每秒行数。
+    """
+    data = {}
+    rows = 0
+    start = time.perf_counter()
+
+    for key, value in pairs:
+        rows += 1
+        if key and str(key).strip():
+            # 清理键值，去除特殊字符
+            key = clean_key(str(key))
+            # 如果是SKU数据，也清理值
+            if value:
+                data[key] = clean_value(str(value))
+            else:
+                data[key] = value
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rows": rows,
+        "entries": len(data),
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": int(rows / elapsed) if elapsed > 0 else rows,
+    }
+    return data, stats
+
+
+def load_sheet_data_streaming(sheet, key_col, value_col, clean_key, clean_value, min_row=1):
+    """单次遍历构建与 load_sheet_data 相同的清理后字典，返回值同 build_lookup_table
+
+    min_row 为开始读取的行号，为 2 时跳过表头行。
+    """
+    return build_lookup_table((pair for _, pair in iter_column_values(sheet, (key_col, value_col), min_row)),
+                              clean_key, clean_value)
+
+
+class WorkbookReader:
+    """按需以只读模式打开工作簿
+
+    remember 为可选的缓存函数 remember(key, builder) -> (value, 是否命中)，
+    提供时查找表和列数据会被缓存，命中缓存时不会再解析工作簿。
+    index_cache 为可选的 LookupIndexCache，未变化的参考表直接从磁盘缓存读取。
+    """
+
+    def __init__(self, source, remember=None, index_cache=None):
+        self.source = source
+        self.index_cache = index_cache
+        self._remember = remember
+        self._workbook = None
+
+    @property
+    def workbook(self):
+        if self._workbook is None:
+            self._workbook = open_readonly_workbook(self.source)
+        return self._workbook
+
+    def _cached(self, key, builder):
+        if self._remember is None:
+            return builder(), False
+        return self._remember(key, builder)
+
+    def lookup_table(self, sheet_name, key_col, value_col, clean_key, clean_value, min_row=1):
+        """返回 (清理后的字典, 统计信息)，min_row 为 2 时跳过表头行"""
+        def parse():
+            return load_sheet_data_streaming(self.workbook[sheet_name], key_col, value_col,
+                                             clean_key, clean_value, min_row)
+
+        def build():
+            if self.index_cache is None:
+                return parse()
+            return self.index_cache.load(self.source, sheet_name, key_col, value_col, parse, min_row)
+
+        key = ('lookup', sheet_name, key_col, value_col)
+        if min_row != 1:
+            key += (min_row,)
+        (data, stats), hit = self._cached(key, build)
+        if hit:
+            stats = dict(stats, cached=True)
+        return data, stats
+
+    def column_values(self, sheet_name, col):
+        """返回整列的原始值列表，下标0对应第1行"""
+        return self.columns(sheet_name, (col,))[0]
+
+    def columns(self, sheet_name, cols):
+        """单次遍历读取多列，返回与 cols 对应的原始值列表元组"""
+        cols = tuple(cols)
+
+        def build():
+            values = tuple([] for _ in cols)
+            for _, row in iter_column_values(self.workbook[sheet_name], cols):
+                for column, value in zip(values, row):
+                    column.append(value)
+            return values
+
+        values, _ = self._cached(('columns', sheet_name, cols), build)
+        return values
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
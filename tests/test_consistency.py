@@ -0,0 +1,58 @@
+"""一致性检查：参考表的表头行不计入SKU"""
+import io
+
+import openpyxl
+
+from consistency import check_workbook
+from lookup_cache import LookupIndexCache
+from sheet_reader import WorkbookReader
+
+SKU_CONFIG = {'sheet': 'Sheet1', 'title_col': 'B', 'sku_col': 'C'}
+COST_CONFIG = {'sheet': 'Sheet2', 'sku_col': 'A', 'cost_col': 'B'}
+
+
+def make_workbook():
+    """与示例工作簿相同的表头：SKU表 C1 和成本表 A1 都是 "SKU" """
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Sheet1'
+    sheet.append(['产品ID', '产品标题', 'SKU'])
+    sheet.append([1, 'Kit A', 'A1001'])
+    sheet.append([2, 'Kit B', 'A1002'])
+    sheet.append([3, 'Kit C', 'A1003'])
+    sheet = workbook.create_sheet('Sheet2')
+    sheet.append(['SKU', '平均成本'])
+    sheet.append(['A1001', 10])
+    sheet.append(['A1002', 20])
+    sheet.append(['A9999', 30])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_header_row_is_not_counted():
+    reader = WorkbookReader(io.BytesIO(make_workbook()))
+    try:
+        analysis = check_workbook(reader, SKU_CONFIG, COST_CONFIG)
+    finally:
+        reader.close()
+
+    assert analysis['matched'] == ['A1001', 'A1002']
+    assert analysis['unmatched'] == ['A1003']
+    assert analysis['unused'] == ['A9999']
+    assert set(analysis['sku_titles']) == {'A1001', 'A1002', 'A1003'}
+
+
+def test_header_exclusion_with_disk_cache(tmp_path):
+    """处理时从第1行读取的查找表与一致性检查分别缓存，互不影响"""
+    content = make_workbook()
+    cache = LookupIndexCache(str(tmp_path / 'cache'))
+    for _ in range(2):
+        reader = WorkbookReader(io.BytesIO(content), index_cache=cache)
+        try:
+            full, _ = reader.lookup_table('Sheet2', 'A', 'B', str, str)
+            analysis = check_workbook(reader, SKU_CONFIG, COST_CONFIG)
+        finally:
+            reader.close()
+        assert 'SKU' in full
+        assert 'SKU' not in analysis['matched'] + analysis['unused']
@@ -0,0 +1,71 @@
+"""任务队列：任务目录必须是当前用户私有的目录，结果在锁外移入结果存储"""
+import io
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from job_queue import JOB_DONE, JOB_FAILED, Job, JobManager
+from result_store import ResultStoreFull
+
+
+class RecordingStore:
+    """记录 put_file 调用时任务锁是否被持有"""
+
+    def __init__(self, manager_ref, error=None):
+        self.manager_ref = manager_ref
+        self.error = error
+        self.lock_held = None
+
+    def put_file(self, path, filename):
+        self.lock_held = self.manager_ref[0]._lock.locked()
+        if self.error is not None:
+            raise self.error
+        return 'f' * 32
+
+
+def make_manager(tmp_path, error=None):
+    ref = []
+    store = RecordingStore(ref, error)
+    manager = JobManager(store, str(tmp_path / 'jobs'))
+    ref.append(manager)
+    os.makedirs(manager.job_dir, mode=0o700)
+    job = Job('a' * 32, 'out.xlsx')
+    manager._jobs[job.job_id] = job
+    return manager, store, job
+
+
+def test_result_moved_outside_lock(tmp_path):
+    manager, store, job = make_manager(tmp_path)
+    future = Future()
+    future.set_result({'processed_rows': 1})
+    manager._finish(job.job_id, future)
+
+    assert store.lock_held is False
+    assert job.state == JOB_DONE
+    assert job.result_id == 'f' * 32
+    assert manager.get(job.job_id)['result'] == {'processed_rows': 1}
+
+
+def test_store_full_marks_job_failed(tmp_path):
+    manager, store, job = make_manager(tmp_path, ResultStoreFull("结果文件过大"))
+    future = Future()
+    future.set_result({'processed_rows': 1})
+    manager._finish(job.job_id, future)
+
+    assert job.state == JOB_FAILED
+    assert job.result_id is None
+    assert job.error == "结果文件过大"
+
+
+def test_unsafe_job_dir_rejected(tmp_path):
+    job_dir = tmp_path / 'jobs'
+    job_dir.mkdir()
+    os.chmod(job_dir, 0o777)
+    manager = JobManager(None, str(job_dir))
+
+    with pytest.raises(PermissionError):
+        manager.submit(io.BytesIO(b'content'), {})
+    assert manager._jobs == {}
+    assert os.listdir(job_dir) == []
+    assert manager.get('a' * 32) is None
@@ -0,0 +1,157 @@
+"""python / pandas 两种查找引擎的结果必须完全相同"""
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from lookup_engine import (NOT_FOUND_COST, NOT_FOUND_SKU, lookup_rows, lookup_rows_pandas, normalize_sku_series,
+                           normalize_text_series)
+from processing import ProcessConfigError, parse_process_options, process_workbook
+from sheet_reader import build_lookup_table
+from text_normalize import clean_sku, clean_text
+
+SKU_COL, COST_COL = 2, 4
+
+# SKU表：脏标题、重复标题（后出现的生效）、空SKU、数字标题、没有成本的SKU
+SKU_ROWS = [
+    ('产品标题', 'SKU'),
+    ('Kit  Conjunto\tGarrafa', ' A1001 '),
+    ('Vestido Feminino', 'A1002'),
+    ('Vestido   Feminino\n', 'A1002-M'),
+    ('Bolsa Couro\x85', 'a1003\x7f'),
+    ('Relógio Digital', None),
+    (12345, 'A1005'),
+    ('Fone Bluetooth', 'A1006'),
+    ('   ', 'A1007'),
+    (None, 'A1008'),
+]
+COST_ROWS = [
+    ('SKU', '平均成本'),
+    ('A1001', 12.5),
+    ('A1002-M', '7.90'),
+    (' a1003 ', 30),
+    ('A1005', 0),
+    ('A1002', 5),
+]
+# 订单表第1行为表头；包含脏标题、未知标题、空行、数字标题和重复订单
+TITLES = [
+    'Product name',
+    'Kit Conjunto Garrafa',
+    '  Vestido Feminino ',
+    'Bolsa\tCouro',
+    'Produto Desconhecido',
+    None,
+    '',
+    'Relógio Digital',
+    12345,
+    'Fone  Bluetooth',
+    'Kit Conjunto Garrafa',
+    '   ',
+    'Vestido Feminino',
+]
+
+
+def python_lookup(titles, start_row, end_row, sku_rows, cost_rows):
+    sku_data, _ = build_lookup_table(sku_rows[1:], clean_text, clean_sku)
+    cost_data, _ = build_lookup_table(cost_rows[1:], clean_text, clean_sku)
+    return lookup_rows(titles, start_row, end_row, sku_data, cost_data, SKU_COL, COST_COL)
+
+
+def pandas_lookup(titles, start_row, end_row, sku_rows, cost_rows):
+    sku_keys, sku_values = zip(*sku_rows[1:])
+    cost_keys, cost_values = zip(*cost_rows[1:])
+    return lookup_rows_pandas(titles, start_row, end_row, list(sku_keys), list(sku_values),
+                              list(cost_keys), list(cost_values), SKU_COL, COST_COL)
+
+
+@pytest.mark.parametrize('start_row, end_row', [(2, len(TITLES)), (1, len(TITLES) + 3), (4, 9), (9, 4)])
+def test_engines_match_on_dirty_duplicate_and_missing_titles(start_row, end_row):
+    expected = python_lookup(TITLES, start_row, end_row, SKU_ROWS, COST_ROWS)
+    actual = pandas_lookup(TITLES, start_row, end_row, SKU_ROWS, COST_ROWS)
+
+    assert actual == expected
+
+
+def test_python_engine_expectations():
+    updates, stats = python_lookup(TITLES, 2, len(TITLES), SKU_ROWS, COST_ROWS)
+
+    # 重复标题取后出现的SKU，其成本来自 A1002-M
+    assert updates[(3, SKU_COL)] == 'A1002-M'
+    assert updates[(3, COST_COL)] == '7.90'
+    assert updates[(4, SKU_COL)] == 'a1003'
+    assert updates[(4, COST_COL)] == '30'
+    # 未知标题写入未找到标记，SKU为空的标题写入空值并标记未找到成本
+    assert updates[(5, SKU_COL)] == NOT_FOUND_SKU
+    assert updates[(5, COST_COL)] == NOT_FOUND_COST
+    assert updates[(8, SKU_COL)] is None
+    assert updates[(8, COST_COL)] == NOT_FOUND_COST
+    # 空行不写入
+    assert (6, SKU_COL) not in updates and (12, SKU_COL) not in updates
+    assert stats == {'processed_rows': len(TITLES) - 1, 'found_sku': 8, 'found_cost': 6}
+
+
+def test_engines_match_with_empty_window():
+    titles = ['Product name', None, '', '  ']
+    assert pandas_lookup(titles, 2, 4, SKU_ROWS, COST_ROWS) == python_lookup(titles, 2, 4, SKU_ROWS, COST_ROWS)
+
+
+def make_workbook():
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Sheet1'
+    for row in SKU_ROWS:
+        workbook['Sheet1'].append(list(row))
+    sheet = workbook.create_sheet('Sheet2')
+    for row in COST_ROWS:
+        sheet.append(list(row))
+    sheet = workbook.create_sheet('Order details')
+    for title in TITLES:
+        sheet.append([title, None, 1, None])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+PROCESS_CONFIG = {
+    'sku_config': {'sheet': 'Sheet1', 'title_col': 'A', 'sku_col': 'B'},
+    'cost_config': {'sheet': 'Sheet2', 'sku_col': 'A', 'cost_col': 'B'},
+    'output_config': {'sheet': 'Order details', 'title_col': 'A', 'sku_col': 'B', 'cost_col': 'D',
+                      'start_row': 2, 'end_row': 'auto'},
+}
+
+
+def process(content, engine):
+    options = parse_process_options(dict(PROCESS_CONFIG, engine=engine))
+    result, output = process_workbook(io.BytesIO(content), options)
+    sheet = openpyxl.load_workbook(io.BytesIO(output))['Order details']
+    cells = [[cell.value for cell in row] for row in sheet.iter_rows(min_col=1, max_col=4)]
+    return result, cells
+
+
+def test_process_workbook_engine_option():
+    content = make_workbook()
+    python_result, python_cells = process(content, 'python')
+    pandas_result, pandas_cells = process(content, 'pandas')
+
+    assert python_result['engine'] == 'python'
+    assert pandas_result['engine'] == 'pandas'
+    assert pandas_cells == python_cells
+    for field in ('processed_rows', 'found_sku', 'found_cost', 'scanned_range'):
+        assert pandas_result[field] == python_result[field]
+    assert python_result['found_sku'] > 0 and python_result['found_cost'] > 0
+
+
+def test_unknown_engine_rejected():
+    assert parse_process_options(PROCESS_CONFIG)['engine'] == 'python'
+    with pytest.raises(ProcessConfigError, match='numpy'):
+        parse_process_options(dict(PROCESS_CONFIG, engine='numpy'))
+
+
+def test_series_normalizers_match_clean_functions():
+    # 覆盖全部 C0/C1 控制字符、各种 Unicode 空白和常见的中文标题
+    specials = [chr(code) for code in range(0x00, 0xa1)] + ['\u1680', '\u2000', '\u2028', '\u3000', '\ufeff']
+    values = [f"{a}Kit{b} 连衣裙{a}{b}A1001 {b}" for a in specials for b in ('', ' ', '\t', '\x85')]
+    series = pd.Series(values, dtype=object)
+
+    assert list(normalize_text_series(series)) == [clean_text(value) for value in values]
+    assert list(normalize_sku_series(series)) == [clean_sku(value) for value in values]
@@ -0,0 +1,49 @@
+"""结果存储：存储目录必须是当前用户私有的目录"""
+import os
+
+import pytest
+
+from result_store import ResultStore
+
+
+def test_results_kept_in_private_dir(tmp_path):
+    store = ResultStore(str(tmp_path / 'results'))
+    result_id = store.put(b'content', 'out.xlsx')
+    assert os.stat(store.store_dir).st_mode & 0o777 == 0o700
+
+    path, meta = store.get(result_id)
+    with open(path, 'rb') as f:
+        assert f.read() == b'content'
+    assert meta['filename'] == 'out.xlsx'
+    assert store.stats()['results'] == 1
+
+
+def test_unsafe_store_dir_is_not_used(tmp_path):
+    store_dir = tmp_path / 'results'
+    store_dir.mkdir()
+    os.chmod(store_dir, 0o777)
+    result_id = 'a' * 32
+    (store_dir / f'{result_id}.bin').write_bytes(b'forged')
+    (store_dir / f'{result_id}.json').write_text(
+        '{"filename": "out.xlsx", "size": 6, "created_at": 9e99, "mimetype": "text/html"}')
+
+    store = ResultStore(str(store_dir))
+    with pytest.raises(PermissionError):
+        store.put(b'content', 'out.xlsx')
+    assert store.get(result_id) is None
+    assert store.stats()['results'] == 0
+
+
+def test_symlinked_store_dir_is_not_used(tmp_path):
+    target = tmp_path / 'target'
+    target.mkdir(mode=0o700)
+    store_dir = tmp_path / 'results'
+    store_dir.symlink_to(target)
+
+    store = ResultStore(str(store_dir))
+    source = tmp_path / 'out.xlsx'
+    source.write_bytes(b'content')
+    with pytest.raises(PermissionError):
+        store.put_file(str(source), 'out.xlsx')
+    assert os.listdir(target) == []
+    assert source.exists()
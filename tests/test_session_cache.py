@@ -0,0 +1,64 @@
+"""会话缓存：共享目录必须是当前用户私有的目录"""
+import os
+import time
+
+from session_cache import WorkbookSessionCache
+
+CONTENT = b'PK fake workbook content'
+
+
+def test_sessions_shared_through_private_dir(tmp_path):
+    store_dir = tmp_path / 'sessions'
+    first = WorkbookSessionCache(1024 * 1024, 60, str(store_dir))
+    session = first.add(CONTENT)
+    assert os.stat(store_dir).st_mode & 0o777 == 0o700
+
+    second = WorkbookSessionCache(1024 * 1024, 60, str(store_dir))
+    assert second.get(session.session_id).content == CONTENT
+    value, hit = second.remember_shared(second.get(session.session_id), ('rows',), lambda: [1, 2])
+    assert (value, hit) == ([1, 2], False)
+    value, hit = first.remember_shared(session, ('rows',), lambda: [3])
+    assert (value, hit) == ([1, 2], True)
+
+
+def test_unsafe_store_dir_is_not_used(tmp_path):
+    store_dir = tmp_path / 'sessions'
+    store_dir.mkdir()
+    os.chmod(store_dir, 0o777)
+    session_id = WorkbookSessionCache.session_id_for(CONTENT)
+    (store_dir / f'{session_id}.xlsx').write_bytes(CONTENT)
+
+    cache = WorkbookSessionCache(1024 * 1024, 60, str(store_dir))
+    assert not cache.usable()
+    assert cache.get(session_id) is None
+    session = cache.add(b'other content')
+    assert cache.get(session.session_id) is session
+    assert sorted(os.listdir(store_dir)) == [f'{session_id}.xlsx']
+
+
+def test_symlinked_store_dir_is_not_used(tmp_path):
+    target = tmp_path / 'target'
+    target.mkdir(mode=0o700)
+    store_dir = tmp_path / 'sessions'
+    store_dir.symlink_to(target)
+
+    cache = WorkbookSessionCache(1024 * 1024, 60, str(store_dir))
+    cache.add(CONTENT)
+    assert not cache.usable()
+    assert os.listdir(target) == []
+
+
+def test_stale_temp_files_pruned(tmp_path):
+    store_dir = tmp_path / 'sessions'
+    cache = WorkbookSessionCache(1024 * 1024, 60, str(store_dir))
+    cache.add(CONTENT)
+    stale = store_dir / 'stale.tmp'
+    fresh = store_dir / 'fresh.tmp'
+    stale.write_bytes(b'x')
+    fresh.write_bytes(b'x')
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+
+    cache.add(b'other content')
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,204 @@
+"""xlsx_patch 原地补丁写入：写回后用 openpyxl 重新打开检查"""
+import io
+import re
+import zipfile
+
+import openpyxl
+import pytest
+
+from xlsx_patch import XlsxPatchError, patch_workbook, save_cell_updates
+
+CALC_CHAIN_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain'
+CALC_CHAIN_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml'
+
+
+def make_workbook():
+    """与示例工作簿相同结构的小工作簿：A 标题、B SKU、C 数量、D 成本、E 总成本公式"""
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Sheet1'
+    sheet = workbook.create_sheet('Order details')
+    sheet.append(['Product name', 'SKU', 'Quantity', '成本', '总成本'])
+    for row, title in enumerate(['Kit A', 'Kit B', 'Kit C'], start=2):
+        sheet.append([title, None, 2, None, f'=C{row}*D{row}'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def rewrite_parts(content, edit):
+    """按 edit({部件名: bytes}) 的结果重新打包 zip，edit 可以增删部件"""
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    edit(parts)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+# Order details 是第二个工作表
+ORDER_SHEET_PART = 'xl/worksheets/sheet2.xml'
+
+
+def add_calc_chain(content):
+    """openpyxl 不写 calcChain，按 Excel 的方式补上部件、关系和内容类型"""
+    def edit(parts):
+        parts['xl/calcChain.xml'] = (
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b'<c r="E2" i="2"/><c r="E3"/><c r="E4"/></calcChain>')
+        rels = parts['xl/_rels/workbook.xml.rels'].decode('utf-8')
+        parts['xl/_rels/workbook.xml.rels'] = rels.replace(
+            '</Relationships>',
+            f'<Relationship Id="rIdCalc" Type="{CALC_CHAIN_TYPE}" Target="calcChain.xml"/></Relationships>'
+        ).encode('utf-8')
+        types = parts['[Content_Types].xml'].decode('utf-8')
+        parts['[Content_Types].xml'] = types.replace(
+            '</Types>',
+            f'<Override PartName="/xl/calcChain.xml" ContentType="{CALC_CHAIN_CONTENT_TYPE}"/></Types>'
+        ).encode('utf-8')
+    return rewrite_parts(content, edit)
+
+
+def make_shared_formula(content):
+    """把 E2:E4 的公式改写成以 E2 为主单元格的共享公式，补丁写入无法覆盖主单元格"""
+    def edit(parts):
+        xml = parts[ORDER_SHEET_PART].decode('utf-8')
+        xml = re.sub(r'<c r="E2"([^>]*)><f>[^<]*</f>',
+                     r'<c r="E2"\1><f t="shared" ref="E2:E4" si="0">C2*D2</f>', xml)
+        for row in (3, 4):
+            xml = re.sub(rf'<c r="E{row}"([^>]*)><f>[^<]*</f>', rf'<c r="E{row}"\1><f t="shared" si="0"/>', xml)
+        parts[ORDER_SHEET_PART] = xml.encode('utf-8')
+    return rewrite_parts(content, edit)
+
+
+def load(content):
+    return openpyxl.load_workbook(io.BytesIO(content))
+
+
+def test_patch_writes_values_readable_by_openpyxl():
+    updates = {'Order details': {(2, 2): 'A1001', (2, 4): 12.5, (3, 2): ' A1002 ', (4, 4): 3, (6, 2): 'new row'}}
+    content, engine = save_cell_updates(make_workbook(), updates)
+
+    assert engine == 'patch'
+    sheet = load(content)['Order details']
+    assert sheet['B2'].value == 'A1001'
+    assert sheet['D2'].value == 12.5
+    assert sheet['B3'].value == ' A1002 '
+    assert sheet['D4'].value == 3
+    assert sheet['B6'].value == 'new row'
+    # 未修改的单元格和公式保留
+    assert sheet['A3'].value == 'Kit B'
+    assert sheet['E2'].value == '=C2*D2'
+    assert sheet.max_row == 6
+
+
+def test_patch_sets_full_calc_on_load():
+    content = patch_workbook(make_workbook(), {'Order details': {(2, 4): 10}})
+
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        workbook_xml = zf.read('xl/workbook.xml').decode('utf-8')
+    assert re.search(r'<calcPr\b[^>]*fullCalcOnLoad="1"', workbook_xml)
+    assert load(content).calculation.fullCalcOnLoad
+
+
+def test_overwriting_formula_removes_calc_chain():
+    source = add_calc_chain(make_workbook())
+    content = patch_workbook(source, {'Order details': {(2, 5): 99}})
+
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        names = zf.namelist()
+        rels = zf.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+        types = zf.read('[Content_Types].xml').decode('utf-8')
+    assert 'xl/calcChain.xml' not in names
+    assert 'calcChain' not in rels
+    assert 'calcChain' not in types
+    sheet = load(content)['Order details']
+    assert sheet['E2'].value == 99
+    assert sheet['E3'].value == '=C3*D3'
+
+
+def test_calc_chain_kept_when_no_formula_overwritten():
+    source = add_calc_chain(make_workbook())
+    content = patch_workbook(source, {'Order details': {(2, 2): 'A1001'}})
+
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert 'xl/calcChain.xml' in zf.namelist()
+    assert load(content)['Order details']['B2'].value == 'A1001'
+
+
+def test_unmodified_parts_are_copied_unchanged():
+    source = make_workbook()
+    content = patch_workbook(source, {'Order details': {(2, 2): 'A1001'}})
+
+    with zipfile.ZipFile(io.BytesIO(source)) as before, zipfile.ZipFile(io.BytesIO(content)) as after:
+        assert after.namelist() == before.namelist()
+        assert after.testzip() is None
+        assert after.read('xl/worksheets/sheet1.xml') == before.read('xl/worksheets/sheet1.xml')
+        assert after.read('xl/styles.xml') == before.read('xl/styles.xml')
+
+
+def test_shared_formula_master_falls_back_to_openpyxl():
+    source = make_shared_formula(make_workbook())
+    updates = {'Order details': {(2, 5): 42, (2, 2): 'A1001'}}
+    with pytest.raises(XlsxPatchError):
+        patch_workbook(source, updates)
+
+    content, engine = save_cell_updates(source, updates)
+
+    assert engine == 'openpyxl'
+    sheet = load(content)['Order details']
+    assert sheet['E2'].value == 42
+    assert sheet['B2'].value == 'A1001'
+
+
+def test_fallback_writes_into_output():
+    source = make_shared_formula(make_workbook())
+    output = io.BytesIO()
+
+    result, engine = save_cell_updates(io.BytesIO(source), {'Order details': {(2, 5): 42}}, output)
+
+    assert engine == 'openpyxl'
+    assert result is output
+    assert load(output.getvalue())['Order details']['E2'].value == 42
+
+
+def test_missing_sheet_raises_key_error():
+    with pytest.raises(KeyError):
+        patch_workbook(make_workbook(), {'Nope': {(1, 1): 'x'}})
+
+
+def move_workbook_part(content):
+    """把工作簿部件从 xl/workbook.xml 移到 xl/main.xml，包关系和内容类型随之更新"""
+    def edit(parts):
+        parts['xl/main.xml'] = parts.pop('xl/workbook.xml')
+        parts['xl/_rels/main.xml.rels'] = parts.pop('xl/_rels/workbook.xml.rels')
+        parts['_rels/.rels'] = parts['_rels/.rels'].replace(b'xl/workbook.xml', b'xl/main.xml')
+        parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(b'/xl/workbook.xml', b'/xl/main.xml')
+    return rewrite_parts(content, edit)
+
+
+def test_workbook_part_resolved_from_package_relationships():
+    source = move_workbook_part(make_workbook())
+    content, engine = save_cell_updates(source, {'Order details': {(2, 2): 'A1001'}})
+
+    assert engine == 'patch'
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert 'xl/workbook.xml' not in zf.namelist()
+        assert b'fullCalcOnLoad="1"' in zf.read('xl/main.xml')
+    assert load(content)['Order details']['B2'].value == 'A1001'
+
+
+def test_missing_office_document_relationship_falls_back_to_openpyxl():
+    def edit(parts):
+        parts['_rels/.rels'] = re.sub(rb'<Relationship [^>]*officeDocument"[^>]*/>', b'', parts['_rels/.rels'])
+    source = rewrite_parts(make_workbook(), edit)
+    updates = {'Order details': {(2, 2): 'A1001'}}
+    with pytest.raises(XlsxPatchError):
+        patch_workbook(source, updates)
+
+    content, engine = save_cell_updates(source, updates)
+
+    assert engine == 'openpyxl'
+    assert load(content)['Order details']['B2'].value == 'A1001'
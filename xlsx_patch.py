@@ -0,0 +1,461 @@
+"""xlsx 原地补丁写入
+
+只重写被修改的工作表 XML，其余 zip 部件按原始压缩字节原样复制，
+保存耗时只与被修改的工作表大小相关，同时保留 openpyxl 会丢弃的图片、绘图等部件。
+字符串统一写成内联字符串 (inlineStr)，因此无需改动 sharedStrings.xml。
+
+遇到无法安全处理的情况（加密、zip64、共享公式主单元格等）时抛出 XlsxPatchError，
+调用方应回退到 openpyxl 的完整保存流程。
+"""
+import io
+import math
+import posixpath
+import re
+import struct
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl import load_workbook
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+ROW_RE = re.compile(r'<row\b[^>]*?(?:/>|>.*?</row>)', re.S)
+CELL_RE = re.compile(r'<c\b[^>]*?(?:/>|>.*?</c>)', re.S)
+ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+CELL_REF_RE = re.compile(r'^([A-Z]+)(\d+)$')
+# XML 1.0 不允许出现的控制字符
+ILLEGAL_XML_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+
+
+class XlsxPatchError(Exception):
+    """无法以补丁方式写入该工作簿"""
+
+
+def _workbook_rels_path(workbook_path):
+    folder, name = posixpath.split(workbook_path)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+def _resolve_target(base_folder, target):
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base_folder, target))
+
+
+def _read_relationships(zf, rels_path, base_folder):
+    """读取关系文件，返回 {rId: (Type, 部件路径)}"""
+    root = ET.fromstring(zf.read(rels_path))
+    rels = {}
+    for rel in root.iter(f'{{{NS_PKG_REL}}}Relationship'):
+        rels[rel.get('Id')] = (rel.get('Type'), _resolve_target(base_folder, rel.get('Target')))
+    return rels
+
+
+def resolve_workbook_path(zf):
+    """按包关系 _rels/.rels 中的 officeDocument 关系返回工作簿部件路径（通常为 xl/workbook.xml）
+
+    关系或部件不存在时抛出 XlsxPatchError。
+    """
+    try:
+        rels = _read_relationships(zf, '_rels/.rels', '')
+    except (KeyError, ET.ParseError) as e:
+        raise XlsxPatchError(f"无法读取包关系 _rels/.rels: {str(e)}")
+    for rel_type, part in rels.values():
+        if rel_type and rel_type.endswith('/officeDocument') and part in zf.NameToInfo:
+            return part
+    raise XlsxPatchError("找不到工作簿部件")
+
+
+def resolve_sheet_parts(zf, workbook_path=None):
+    """按工作簿中的顺序返回 {工作表名: 部件路径}，workbook_path 缺省时按包关系查找"""
+    workbook_path = workbook_path or resolve_workbook_path(zf)
+    rels = _read_relationships(zf, _workbook_rels_path(workbook_path), posixpath.dirname(workbook_path))
+    root = ET.fromstring(zf.read(workbook_path))
+    parts = {}
+    for sheet in root.iter(f'{{{NS_MAIN}}}sheet'):
+        rel = rels.get(sheet.get(f'{{{NS_REL}}}id'))
+        if rel:
+            parts[sheet.get('name')] = rel[1]
+    return parts
+
+
+def resolve_workbook_part(zf, rel_name, workbook_path=None):
+    """按关系类型（如 sharedStrings、styles）返回工作簿部件路径，不存在时返回 None"""
+    workbook_path = workbook_path or resolve_workbook_path(zf)
+    rels = _read_relationships(zf, _workbook_rels_path(workbook_path), posixpath.dirname(workbook_path))
+    for rel_type, part in rels.values():
+        if rel_type.endswith('/' + rel_name) and part in zf.NameToInfo:
+            return part
+    return None
+
+
+def _cell_xml(ref, style, value):
+    """生成单元格 XML，保留原有样式"""
+    attrs = f' r="{ref}"'
+    if style is not None:
+        attrs += f' s="{style}"'
+
+    if value is None:
+        return f'<c{attrs}/>'
+    if isinstance(value, bool):
+        return f'<c{attrs} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and not (isinstance(value, float) and not math.isfinite(value)):
+        return f'<c{attrs}><v>{value!r}</v></c>'
+
+    text = str(value)
+    if ILLEGAL_XML_RE.search(text):
+        raise XlsxPatchError(f"单元格 {ref} 含有XML不允许的字符")
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c{attrs} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _parse_attrs(tag_text):
+    end = tag_text.index('>')
+    return dict(ATTR_RE.findall(tag_text[:end]))
+
+
+def _split_ref(ref):
+    match = CELL_REF_RE.match(ref)
+    if not match:
+        raise XlsxPatchError(f"无法解析单元格引用: {ref}")
+    return openpyxl.utils.column_index_from_string(match.group(1)), int(match.group(2))
+
+
+def _patch_row(row_xml, row_num, cell_updates, state):
+    """合并一行中的单元格更新，cell_updates 为 {列号: 值}"""
+    if row_xml.endswith('/>') and not row_xml.endswith('</row>'):
+        open_tag = row_xml[:-2].rstrip() + '>'
+        body = ''
+        close_tag = '</row>'
+    else:
+        open_end = row_xml.index('>') + 1
+        open_tag = row_xml[:open_end]
+        body = row_xml[open_end:-len('</row>')]
+        close_tag = '</row>'
+
+    pending = sorted(cell_updates.items())
+    out = []
+    pos = 0
+    index = 0
+    for match in CELL_RE.finditer(body):
+        cell_xml = match.group(0)
+        attrs = _parse_attrs(cell_xml)
+        if 'r' not in attrs:
+            raise XlsxPatchError(f"第{row_num}行存在缺少引用的单元格")
+        col, _ = _split_ref(attrs['r'])
+
+        out.append(body[pos:match.start()])
+        pos = match.end()
+
+        # 插入位于当前单元格之前的新单元格
+        while index < len(pending) and pending[index][0] < col:
+            new_col, value = pending[index]
+            out.append(_cell_xml(f"{openpyxl.utils.get_column_letter(new_col)}{row_num}", None, value))
+            index += 1
+
+        if index < len(pending) and pending[index][0] == col:
+            if '<f' in cell_xml:
+                if re.search(r'<f\b[^>]*\bt="shared"[^>]*\bref="', cell_xml):
+                    raise XlsxPatchError(f"单元格 {attrs['r']} 是共享公式的主单元格")
+                state['formulas_removed'] = True
+            out.append(_cell_xml(attrs['r'], attrs.get('s'), pending[index][1]))
+            index += 1
+        else:
+            out.append(cell_xml)
+
+    out.append(body[pos:])
+    while index < len(pending):
+        new_col, value = pending[index]
+        out.append(_cell_xml(f"{openpyxl.utils.get_column_letter(new_col)}{row_num}", None, value))
+        index += 1
+
+    # spans 只是读取提示，新增列超出范围时扩展它
+    spans = re.search(r'\bspans="(\d+):(\d+)"', open_tag)
+    if spans:
+        low = min(int(spans.group(1)), pending[0][0])
+        high = max(int(spans.group(2)), pending[-1][0])
+        open_tag = open_tag[:spans.start()] + f'spans="{low}:{high}"' + open_tag[spans.end():]
+
+    return open_tag + ''.join(out) + close_tag
+
+
+def _new_row(row_num, cell_updates):
+    cells = ''.join(
+        _cell_xml(f"{openpyxl.utils.get_column_letter(col)}{row_num}", None, value)
+        for col, value in sorted(cell_updates.items())
+    )
+    return f'<row r="{row_num}">{cells}</row>'
+
+
+def _update_dimension(xml, max_row, max_col):
+    match = re.search(r'<dimension ref="([A-Z]+\d+)(?::([A-Z]+\d+))?"\s*/>', xml)
+    if not match:
+        return xml
+    first = match.group(1)
+    last = match.group(2) or first
+    last_col, last_row = _split_ref(last)
+    if max_row <= last_row and max_col <= last_col:
+        return xml
+    new_last = f"{openpyxl.utils.get_column_letter(max(last_col, max_col))}{max(last_row, max_row)}"
+    return xml[:match.start()] + f'<dimension ref="{first}:{new_last}"/>' + xml[match.end():]
+
+
+def patch_sheet_xml(xml, updates, state=None):
+    """把 {(行, 列): 值} 写入工作表 XML 文本，返回新的 XML 文本"""
+    if state is None:
+        state = {}
+    by_row = {}
+    for (row, col), value in updates.items():
+        by_row.setdefault(row, {})[col] = value
+    pending_rows = sorted(by_row)
+
+    empty = re.search(r'<sheetData\s*/>', xml)
+    if empty:
+        rows_xml = ''.join(_new_row(row, by_row[row]) for row in pending_rows)
+        xml = xml[:empty.start()] + f'<sheetData>{rows_xml}</sheetData>' + xml[empty.end():]
+    else:
+        start = xml.find('<sheetData')
+        if start < 0:
+            raise XlsxPatchError("工作表缺少 sheetData")
+        start = xml.index('>', start) + 1
+        end = xml.index('</sheetData>', start)
+        data = xml[start:end]
+
+        out = []
+        pos = 0
+        index = 0
+        for match in ROW_RE.finditer(data):
+            attrs = _parse_attrs(match.group(0))
+            if 'r' not in attrs:
+                raise XlsxPatchError("工作表存在缺少行号的行")
+            row_num = int(attrs['r'])
+
+            out.append(data[pos:match.start()])
+            pos = match.end()
+
+            while index < len(pending_rows) and pending_rows[index] < row_num:
+                out.append(_new_row(pending_rows[index], by_row[pending_rows[index]]))
+                index += 1
+
+            if index < len(pending_rows) and pending_rows[index] == row_num:
+                out.append(_patch_row(match.group(0), row_num, by_row[row_num], state))
+                index += 1
+            else:
+                out.append(match.group(0))
+
+        out.append(data[pos:])
+        while index < len(pending_rows):
+            out.append(_new_row(pending_rows[index], by_row[pending_rows[index]]))
+            index += 1
+        xml = xml[:start] + ''.join(out) + xml[end:]
+
+    if pending_rows:
+        xml = _update_dimension(xml, pending_rows[-1], max(col for _, col in updates))
+    return xml
+
+
+def _force_full_calc(workbook_xml):
+    """让 Excel 打开时重新计算公式，避免依赖被修改单元格的公式显示旧的缓存值"""
+    calc = re.search(r'<calcPr\b[^>]*?/?>', workbook_xml)
+    if calc:
+        tag = calc.group(0)
+        if 'fullCalcOnLoad=' in tag:
+            tag = re.sub(r'fullCalcOnLoad="[^"]*"', 'fullCalcOnLoad="1"', tag)
+        else:
+            tag = tag.replace('<calcPr', '<calcPr fullCalcOnLoad="1"', 1)
+        return workbook_xml[:calc.start()] + tag + workbook_xml[calc.end():]
+
+    # calcPr 必须位于 definedNames 等元素之后
+    insert_at = -1
+    for closing in ('</sheets>', '</functionGroups>', '</externalReferences>', '</definedNames>'):
+        found = workbook_xml.find(closing)
+        if found >= 0:
+            insert_at = max(insert_at, found + len(closing))
+    if insert_at < 0:
+        return workbook_xml
+    return workbook_xml[:insert_at] + '<calcPr fullCalcOnLoad="1"/>' + workbook_xml[insert_at:]
+
+
+def _remove_relationship(rels_xml, part_name):
+    pattern = re.compile(r'<Relationship\b[^>]*Target="[^"]*' + re.escape(part_name) + r'"[^>]*/>')
+    return pattern.sub('', rels_xml)
+
+
+def _remove_override(content_types_xml, part_path):
+    pattern = re.compile(r'<Override\b[^>]*PartName="/' + re.escape(part_path) + r'"[^>]*/>')
+    return pattern.sub('', content_types_xml)
+
+
+def _dos_time(info):
+    year, month, day, hour, minute, second = info.date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | (second // 2)
+    return dos_time, dos_date
+
+
+class _RawZipWriter:
+    """按原始压缩字节复制 zip 条目的最小写入器"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.central = []
+
+    def _write_entry(self, name_bytes, flags, method, version, dos_time, dos_date,
+                     crc, compressed, size, local_extra, central_extra, comment,
+                     create_version, internal_attr, external_attr):
+        if len(compressed) >= 0xFFFFFFFF or size >= 0xFFFFFFFF or self.fp.tell() >= 0xFFFFFFFF:
+            raise XlsxPatchError("不支持 zip64 工作簿")
+        offset = self.fp.tell()
+        self.fp.write(LOCAL_HEADER.pack(0x04034b50, version, flags, method, dos_time, dos_date,
+                                        crc, len(compressed), size, len(name_bytes), len(local_extra)))
+        self.fp.write(name_bytes)
+        self.fp.write(local_extra)
+        self.fp.write(compressed)
+        self.central.append(CENTRAL_HEADER.pack(
+            0x02014b50, create_version, version, flags, method, dos_time, dos_date,
+            crc, len(compressed), size, len(name_bytes), len(central_extra), len(comment),
+            0, internal_attr, external_attr, offset) + name_bytes + central_extra + comment)
+
+    def copy_raw(self, src, info):
+        """原样复制一个条目的压缩数据"""
+        if info.flag_bits & 0x1:
+            raise XlsxPatchError("不支持加密的工作簿")
+        if info.file_size >= 0xFFFFFFFF or info.compress_size >= 0xFFFFFFFF:
+            raise XlsxPatchError("不支持 zip64 工作簿")
+        src.seek(info.header_offset)
+        header = LOCAL_HEADER.unpack(src.read(LOCAL_HEADER.size))
+        if header[0] != 0x04034b50:
+            raise XlsxPatchError(f"zip 条目头损坏: {info.filename}")
+        version, flags, method, dos_time, dos_date = header[1:6]
+        name_bytes = src.read(header[9])
+        local_extra = src.read(header[10])
+        compressed = src.read(info.compress_size)
+        # 大小和 CRC 已写入本地头，不再需要数据描述符
+        self._write_entry(name_bytes, flags & ~0x8, method, version, dos_time, dos_date,
+                          info.CRC, compressed, info.file_size, local_extra, info.extra,
+                          info.comment, info.create_version | (info.create_system << 8),
+                          info.internal_attr, info.external_attr)
+
+    def write_deflated(self, info, data):
+        """以 deflate 写入一个新内容的条目，沿用原条目的时间戳"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        dos_time, dos_date = _dos_time(info)
+        name_bytes = info.filename.encode('utf-8')
+        flags = 0 if name_bytes.isascii() else 0x800
+        self._write_entry(name_bytes, flags, zipfile.ZIP_DEFLATED, 20, dos_time, dos_date,
+                          zlib.crc32(data), compressed, len(data), b'', b'', b'',
+                          20, info.internal_attr, info.external_attr)
+
+    def close(self):
+        start = self.fp.tell()
+        for record in self.central:
+            self.fp.write(record)
+        size = self.fp.tell() - start
+        if len(self.central) > 0xFFFF:
+            raise XlsxPatchError("不支持 zip64 工作簿")
+        self.fp.write(END_RECORD.pack(0x06054b50, 0, 0, len(self.central), len(self.central),
+                                      size, start, 0))
+
+
+def patch_workbook(source, sheet_updates, output=None):
+    """把单元格更新写回工作簿
+
+    source: 工作簿的 bytes、路径或可 seek 的二进制文件对象
+    sheet_updates: {工作表名: {(行, 列): 值}}
+    output: 可写的二进制文件对象，缺省时返回 bytes
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif isinstance(source, str):
+        with open(source, 'rb') as fp:
+            return patch_workbook(fp, sheet_updates, output)
+
+    try:
+        zf = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise XlsxPatchError(f"不是有效的xlsx文件: {str(e)}")
+
+    with zf:
+        workbook_path = resolve_workbook_path(zf)
+        sheet_parts = resolve_sheet_parts(zf, workbook_path)
+        replaced = {}
+        state = {'formulas_removed': False}
+        for sheet_name, updates in sheet_updates.items():
+            if sheet_name not in sheet_parts:
+                raise KeyError(f"Worksheet {sheet_name} does not exist.")
+            if not updates:
+                continue
+            part = sheet_parts[sheet_name]
+            xml = zf.read(part).decode('utf-8')
+            replaced[part] = patch_sheet_xml(xml, updates, state).encode('utf-8')
+
+        if replaced:
+            workbook_xml = zf.read(workbook_path).decode('utf-8')
+            replaced[workbook_path] = _force_full_calc(workbook_xml).encode('utf-8')
+
+        removed = set()
+        if state['formulas_removed']:
+            # 被覆盖的公式仍记录在 calcChain 中会导致 Excel 报告文件损坏，直接移除让 Excel 重建
+            rels_path = _workbook_rels_path(workbook_path)
+            rels = _read_relationships(zf, rels_path, posixpath.dirname(workbook_path))
+            for rel_type, part in rels.values():
+                if rel_type.endswith('/calcChain') and part in zf.NameToInfo:
+                    removed.add(part)
+                    replaced[rels_path] = _remove_relationship(
+                        zf.read(rels_path).decode('utf-8'), posixpath.basename(part)).encode('utf-8')
+                    replaced['[Content_Types].xml'] = _remove_override(
+                        zf.read('[Content_Types].xml').decode('utf-8'), part).encode('utf-8')
+
+        target = output if output is not None else io.BytesIO()
+        writer = _RawZipWriter(target)
+        for info in zf.infolist():
+            if info.filename in removed:
+                continue
+            if info.filename in replaced:
+                writer.write_deflated(info, replaced[info.filename])
+            else:
+                writer.copy_raw(source, info)
+        writer.close()
+
+    if output is None:
+        return target.getvalue()
+    return output
+
+
+def save_cell_updates(source, sheet_updates, output=None):
+    """写回单元格更新并返回 (bytes, 写入方式)，source 同 patch_workbook
+
+    output 为可写、可 seek 的二进制文件对象时结果直接写入其中，返回值的第一项为 output。
+    优先使用原地补丁写入，无法处理时回退到 openpyxl 完整加载后保存。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        return patch_workbook(source, sheet_updates, output), 'patch'
+    except XlsxPatchError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        workbook = load_workbook(source)
+        for sheet_name, updates in sheet_updates.items():
+            sheet = workbook[sheet_name]
+            for (row, col), value in updates.items():
+                sheet.cell(row=row, column=col).value = value
+        if output is None:
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            return buffer.getvalue(), 'openpyxl'
+        # 补丁写入可能已经写出一部分内容
+        output.seek(0)
+        output.truncate()
+        workbook.save(output)
+        return output, 'openpyxl'